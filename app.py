@@ -42,6 +42,32 @@ with app.app_context():
             print("Cache de produtos inicializado com sucesso!")
     except Exception as e:
         print(f"Aviso: Erro ao inicializar cache de produtos: {e}")
+    
+    # Inicializar cache de filiais
+    try:
+        from services.utils import obter_filiais_serializadas
+        conteudo, _ = obter_filiais_serializadas()
+        if conteudo is None:
+            print("Aviso: Cache de filiais não pôde ser inicializado")
+        else:
+            print("Cache de filiais inicializado com sucesso!")
+    except Exception as e:
+        print(f"Aviso: Erro ao inicializar cache de filiais: {e}")
+    
+    # Índice full-text da busca global (/api/search)
+    try:
+        from services.busca import inicializar_indice_busca
+        inicializar_indice_busca()
+    except Exception as e:
+        print(f"Aviso: Índice de busca não pôde ser inicializado: {e}")
+    
+    # Monitorar alterações nas planilhas e recarregar o cache sem reiniciar o processo
+    from services.utils import iniciar_monitor_dados_mestres
+    iniciar_monitor_dados_mestres()
+    
+    # Worker único que envia os e-mails da fila (conexão SMTP reaproveitada)
+    from services.email_service import iniciar_worker_email
+    iniciar_worker_email(app)
 
 # Executar a aplicação
 if __name__ == '__main__':
@@ -31,12 +31,50 @@ class Config:
     if not os.path.exists(EXPORT_FOLDER):
         os.makedirs(EXPORT_FOLDER)
     
+    # Máximo de exportações gerando arquivo ao mesmo tempo (por processo)
+    EXPORT_MAX_WORKERS = int(os.environ.get('EXPORT_MAX_WORKERS', 2))
+    
     # Upload settings
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+    # Upload de anexos grandes em partes (/api/uploads): cada parte é uma requisição
+    # abaixo de MAX_CONTENT_LENGTH; o arquivo completo pode chegar a UPLOAD_TAMANHO_MAXIMO
+    UPLOAD_TAMANHO_PARTE = int(os.environ.get('UPLOAD_TAMANHO_PARTE', 4 * 1024 * 1024))
+    UPLOAD_TAMANHO_MAXIMO = int(os.environ.get('UPLOAD_TAMANHO_MAXIMO', 200 * 1024 * 1024))
+    # Uploads sem nenhuma parte recebida nesse período (horas) são descartados pela limpeza
+    UPLOAD_VALIDADE_HORAS = int(os.environ.get('UPLOAD_VALIDADE_HORAS', 24))
     
     if not os.path.exists(UPLOAD_FOLDER):
         os.makedirs(UPLOAD_FOLDER)
+    
+    # Downloads de anexos/exportações entregues pelo servidor web, sem ocupar o worker:
+    # '' (o Flask envia o arquivo), 'x-sendfile' (Apache mod_xsendfile) ou 'x-accel-redirect'
+    # (nginx, com uma location interna apontando para a pasta da aplicação, ex.:
+    # location /arquivos-internos/ { internal; alias /caminho/da/aplicacao/; })
+    DOWNLOAD_ACELERADO = os.environ.get('DOWNLOAD_ACELERADO', '').lower()
+    DOWNLOAD_X_ACCEL_PREFIXO = os.environ.get('DOWNLOAD_X_ACCEL_PREFIXO', '/arquivos-internos/')
+    
+    # Envio de e-mails (SMTP) - sobrescrever por variáveis de ambiente (ver .env.example).
+    # As credenciais vêm apenas do ambiente; o login só é feito quando SMTP_USUARIO e
+    # SMTP_SENHA estão definidos. Para testes locais use SMTP_SERVIDOR=localhost,
+    # SMTP_PORTA=1025, SMTP_STARTTLS=0 e SMTP_REMETENTE. Sem servidor ou remetente o
+    # envio fica desativado e os e-mails permanecem pendentes na fila
+    SMTP_SERVIDOR = os.environ.get('SMTP_SERVIDOR', 'mail.cooxupe.com.br')
+    SMTP_PORTA = int(os.environ.get('SMTP_PORTA', 587))
+    SMTP_STARTTLS = os.environ.get('SMTP_STARTTLS', '1') == '1'
+    SMTP_USUARIO = os.environ.get('SMTP_USUARIO')
+    SMTP_SENHA = os.environ.get('SMTP_SENHA')
+    SMTP_REMETENTE = os.environ.get('SMTP_REMETENTE') or SMTP_USUARIO
+    SMTP_TIMEOUT = int(os.environ.get('SMTP_TIMEOUT', 10))
+    
+    # Notificações do mesmo registro dentro da janela viram um único e-mail (0 desativa)
+    EMAIL_JANELA_AGRUPAMENTO = int(os.environ.get('EMAIL_JANELA_AGRUPAMENTO', 300))
+    # Modo resumo: em vez de um e-mail por registro, cada departamento recebe um resumo periódico
+    EMAIL_RESUMO_DEPARTAMENTOS = os.environ.get('EMAIL_RESUMO_DEPARTAMENTOS', '0') == '1'
+    EMAIL_INTERVALO_RESUMO = int(os.environ.get('EMAIL_INTERVALO_RESUMO', 3600))
+    
+    # Snapshots binários das planilhas de dados mestres (gerados automaticamente)
+    CACHE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'cache')
 
 
 class DevelopmentConfig(Config):
@@ -26,6 +26,14 @@ Comandos disponíveis:
     history     - Mostra o histórico de migrações
     backup      - Faz backup do banco atual
     restore     - Restaura backup (use com cuidado!)
+    snapshot    - Reconstrói o cache binário das planilhas (Contas/Produtos/Filiais)
+    emails      - Envia agora os e-mails pendentes da fila
+    reindexar   - Reconstrói o índice da busca global (/api/search)
+    limpar-anexos - Apaga arquivos de anexo sem referência, temporários e uploads em partes vencidos
+    importar    - Importa cotações ou pesquisas de uma planilha CSV/XLSX
+                  (python manage_db.py importar pesquisas arquivo.xlsx)
+    benchmark   - Compara plano e tempo das consultas principais sem e com índices
+                  (banco SQLite temporário; opcional: quantidade de cotações)
     help        - Mostra esta ajuda
 
 Exemplos:
@@ -33,6 +41,7 @@ Exemplos:
     python manage_db.py migrate -m "Adiciona novo campo"
     python manage_db.py upgrade
     python manage_db.py status
+    python manage_db.py benchmark 100000
 """)
 
 def init_db():
@@ -83,6 +92,171 @@ def restore_db():
     except (ValueError, KeyboardInterrupt):
         print("Operação cancelada.")
 
+def rebuild_snapshots():
+    """Força a reconstrução dos snapshots das planilhas de dados mestres."""
+    from services.utils import reconstruir_snapshots
+    
+    print("Reconstruindo snapshots das planilhas...")
+    for arquivo, erro in reconstruir_snapshots():
+        if erro:
+            print(f"Erro em {arquivo}: {erro}")
+        else:
+            print(f"Snapshot de {arquivo} reconstruído com sucesso!")
+
+def send_emails():
+    """Drena a fila de e-mails pendentes (útil para testar com um servidor SMTP local)."""
+    from services.email_service import processar_fila_emails, processar_resumos, EMAIL_LOTE
+    
+    with app.app_context():
+        processar_resumos()
+        total = 0
+        while True:
+            processados = processar_fila_emails()
+            total += processados
+            if processados < EMAIL_LOTE:
+                break
+        print(f"{total} e-mail(s) processado(s) da fila.")
+
+def rebuild_search_index():
+    """Reconstrói o índice full-text da busca global."""
+    from services.busca import reconstruir_indice_busca
+    
+    with app.app_context():
+        print("Reconstruindo índice de busca...")
+        total = reconstruir_indice_busca()
+        print(f"Índice de busca reconstruído com {total} registros!")
+
+def clean_attachments():
+    """Remove do disco arquivos de anexo órfãos (sem referência no banco)."""
+    from services.anexos import coletar_arquivos_orfaos
+    
+    with app.app_context():
+        print("Procurando arquivos de anexo órfãos...")
+        removidos = coletar_arquivos_orfaos()
+        print(f"{removidos} arquivo(s) removido(s).")
+
+def import_spreadsheet(tipo, caminho):
+    """Importa cotações ou pesquisas de uma planilha e mostra o relatório de erros."""
+    from services.importacao import importar_planilha, EXTENSOES_IMPORTACAO
+    
+    tipos = {'cotacoes': 'cotacao', 'pesquisas': 'pesquisa'}
+    if tipo not in tipos:
+        print("Uso: python manage_db.py importar [cotacoes|pesquisas] arquivo.csv|xlsx")
+        return
+    extensao = caminho.rsplit('.', 1)[-1].lower()
+    if extensao not in EXTENSOES_IMPORTACAO:
+        print("Erro: formato não suportado. Use CSV ou XLSX.")
+        return
+    if not os.path.exists(caminho):
+        print(f"Erro: arquivo {caminho} não encontrado!")
+        return
+    
+    with app.app_context(), open(caminho, 'rb') as arquivo:
+        relatorio = importar_planilha(arquivo, extensao, tipos[tipo])
+    print(f"{relatorio['importados']} registro(s) importado(s) de {relatorio['total_linhas']} linha(s).")
+    for erro in relatorio['erros'][:50]:
+        print(f"  Linha {erro['linha']}: {erro['erro']}")
+    if relatorio['total_erros'] > 50:
+        print(f"  ... e mais {relatorio['total_erros'] - 50} linha(s) com erro.")
+
+def benchmark_indexes(total=50000):
+    """
+    Popula um banco SQLite temporário e mede as consultas das listagens,
+    do dashboard e dos carregamentos em lote antes e depois de criar os
+    índices declarados em models.py.
+    """
+    import random
+    import tempfile
+    import time
+    from datetime import datetime, timedelta
+    from sqlalchemy import create_engine, select, func, text, union_all, literal
+    from models import Anexo
+
+    tabelas = [Cotacao.__table__, ProdutoCotacao.__table__, PesquisaMercado.__table__, Anexo.__table__]
+    # Índices avaliados (os de busca normalizada não entram nestas consultas)
+    indices = [indice for tabela in tabelas for indice in tabela.indexes if not indice.name.endswith('_busca')]
+
+    caminho = os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+    engine = create_engine(f'sqlite:///{caminho}')
+    db.metadata.create_all(engine, tables=tabelas)
+
+    # Distribuição típica: a maior parte dos registros já finalizada
+    status_cotacao = ['Liberado para Venda'] * 80 + ['Cotação Perdida'] * 12 + ['Análise Comercial'] * 5 + ['Análise Suprimentos'] * 3
+    status_pesquisa = ['Liberado para Venda'] * 90 + ['Análise Comercial'] * 10
+    rnd = random.Random(42)
+    agora = datetime.now()
+
+    print(f"Populando {total} cotações, {total * 3} produtos e {total} pesquisas em {caminho}...")
+    with engine.begin() as conn:
+        for inicio in range(0, total, 5000):
+            cotacoes, produtos, pesquisas, anexos = [], [], [], []
+            for i in range(inicio + 1, min(inicio + 5000, total) + 1):
+                quando = agora - timedelta(minutes=rnd.randint(0, 60 * 24 * 720))
+                base = {
+                    'id': i, 'data': quando.date(), 'nome_filial': f'Filial {i % 40}', 'numero_mesorregiao': str(i % 8),
+                    'matricula_cooperado': str(100000 + i % (total // 4 or 1)), 'nome_cooperado': f'Cooperado {i}',
+                    'data_entrada_status': quando, 'data_ultima_modificacao': quando, 'nome_vendedor': 'Vendedor'
+                }
+                cotacoes.append(dict(base, status=rnd.choice(status_cotacao)))
+                pesquisas.append(dict(base, status=rnd.choice(status_pesquisa), nome_produto='Produto',
+                                      quantidade_cotada=1, forma_pagamento='À vista', nome_concorrente='Concorrente',
+                                      valor_concorrente=1))
+                produtos.extend({'cotacao_id': i, 'nome_produto': f'Produto {j}', 'volume': 1, 'unidade_medida': 'TN'}
+                                for j in range(3))
+                if i % 10 == 0:
+                    anexos.append({'filename': 'a.pdf', 'filepath': 'a.pdf', 'data_upload': quando, 'cotacao_id': i})
+            conn.execute(Cotacao.__table__.insert(), cotacoes)
+            conn.execute(PesquisaMercado.__table__.insert(), pesquisas)
+            conn.execute(ProdutoCotacao.__table__.insert(), produtos)
+            conn.execute(Anexo.__table__.insert(), anexos)
+
+    ids_pagina = list(range(total, max(total - 50, 0), -1))
+    consultas = [
+        ('Cotações em andamento por modificação', select(Cotacao.id)
+            .where(Cotacao.status.in_(['Análise Comercial', 'Análise Suprimentos']))
+            .order_by(Cotacao.data_ultima_modificacao.desc(), Cotacao.id.desc()).limit(51)),
+        ('Pesquisas em análise por entrada no status', select(PesquisaMercado.id)
+            .where(PesquisaMercado.status == 'Análise Comercial')
+            .order_by(PesquisaMercado.data_entrada_status.desc(), PesquisaMercado.id.desc()).limit(51)),
+        ('Contagens do dashboard', union_all(
+            select(literal('cotacao'), Cotacao.status, func.count()).group_by(Cotacao.status),
+            select(literal('pesquisa'), PesquisaMercado.status, func.count()).group_by(PesquisaMercado.status))),
+        ('Produtos de uma página (selectinload)', select(ProdutoCotacao.id)
+            .where(ProdutoCotacao.cotacao_id.in_(ids_pagina))),
+        ('Anexos de uma página (selectinload)', select(Anexo.id).where(Anexo.cotacao_id.in_(ids_pagina))),
+        ('Cotações por matrícula', select(Cotacao.id).where(Cotacao.matricula_cooperado == '100123')),
+    ]
+
+    def medir(conn, rotulo):
+        print(f"\n===== {rotulo} =====")
+        for nome, consulta in consultas:
+            sql = str(consulta.compile(engine, compile_kwargs={'literal_binds': True}))
+            plano = [linha[-1] for linha in conn.execute(text(f'EXPLAIN QUERY PLAN {sql}'))]
+            inicio = time.perf_counter()
+            repeticoes = 5
+            for _ in range(repeticoes):
+                conn.execute(text(sql)).all()
+            ms = (time.perf_counter() - inicio) * 1000 / repeticoes
+            print(f"{nome}: {ms:.2f} ms")
+            for passo in plano:
+                print(f"    {passo}")
+
+    with engine.connect() as conn:
+        for indice in indices:
+            indice.drop(conn, checkfirst=True)
+        conn.commit()
+        conn.execute(text('ANALYZE'))
+        medir(conn, 'Sem índices')
+
+        for indice in indices:
+            indice.create(conn)
+        conn.commit()
+        conn.execute(text('ANALYZE'))
+        medir(conn, 'Com índices')
+
+    engine.dispose()
+    os.remove(caminho)
+
 def main():
     """Função principal."""
     if len(sys.argv) < 2:
@@ -99,6 +273,21 @@ def main():
         backup_db()
     elif command == 'restore':
         restore_db()
+    elif command == 'snapshot':
+        rebuild_snapshots()
+    elif command == 'emails':
+        send_emails()
+    elif command == 'reindexar':
+        rebuild_search_index()
+    elif command == 'limpar-anexos':
+        clean_attachments()
+    elif command == 'importar':
+        if len(sys.argv) < 4:
+            print("Uso: python manage_db.py importar [cotacoes|pesquisas] arquivo.csv|xlsx")
+        else:
+            import_spreadsheet(sys.argv[2], sys.argv[3])
+    elif command == 'benchmark':
+        benchmark_indexes(int(sys.argv[2]) if len(sys.argv) > 2 else 50000)
     elif command in ['migrate', 'upgrade', 'downgrade', 'status', 'history']:
         with app.app_context():
             if command == 'migrate':
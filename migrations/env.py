@@ -32,6 +32,14 @@ target_metadata = current_app.extensions['migrate'].db.metadata
 # ... etc.
 
 
+def include_name(name, type_, parent_names):
+    # O índice de busca (FTS5/FULLTEXT) é mantido por services/busca.py,
+    # fora do metadata; não gerar DROP para ele no autogenerate
+    if type_ == 'table':
+        return not name.startswith('indice_busca')
+    return True
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -46,7 +54,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=target_metadata, literal_binds=True
+        url=url, target_metadata=target_metadata, literal_binds=True,
+        include_name=include_name
     )
 
     with context.begin_transaction():
@@ -78,6 +87,7 @@ def run_migrations_online():
             connection=connection,
             target_metadata=target_metadata,
             process_revision_directives=process_revision_directives,
+            include_name=include_name,
             **current_app.extensions['migrate'].configure_args
         )
 
@@ -0,0 +1,44 @@
+"""Cria tabela exportacoes para jobs de exportação assíncrona
+
+Revision ID: 3b7e2c9d4a10
+Revises: 1fc90ce64182
+Create Date: 2026-10-18 10:05:12.418231
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7e2c9d4a10'
+down_revision = '1fc90ce64182'
+branch_labels = None
+depends_on = None
+
+
+# A aplicação roda db.create_all() ao ser importada (inclusive pelo manage_db.py),
+# então as tabelas novas podem já existir quando a migração é aplicada
+def _tabela_existe(nome):
+    return sa.inspect(op.get_bind()).has_table(nome)
+
+
+def upgrade():
+    if _tabela_existe('exportacoes'):
+        return
+    op.create_table('exportacoes',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('tipo', sa.String(length=20), nullable=False),
+        sa.Column('ids', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('total', sa.Integer(), nullable=False),
+        sa.Column('processados', sa.Integer(), nullable=False),
+        sa.Column('filepath', sa.String(length=500), nullable=True),
+        sa.Column('erro', sa.Text(), nullable=True),
+        sa.Column('data_criacao', sa.DateTime(), nullable=False),
+        sa.Column('data_atualizacao', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('exportacoes')
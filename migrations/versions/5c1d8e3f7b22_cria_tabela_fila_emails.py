@@ -0,0 +1,46 @@
+"""Cria tabela fila_emails (outbox de notificações por e-mail)
+
+Revision ID: 5c1d8e3f7b22
+Revises: 3b7e2c9d4a10
+Create Date: 2026-10-18 11:20:37.902114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1d8e3f7b22'
+down_revision = '3b7e2c9d4a10'
+branch_labels = None
+depends_on = None
+
+
+# A aplicação roda db.create_all() ao ser importada (inclusive pelo manage_db.py),
+# então as tabelas novas podem já existir quando a migração é aplicada
+def _tabela_existe(nome):
+    return sa.inspect(op.get_bind()).has_table(nome)
+
+
+def upgrade():
+    if _tabela_existe('fila_emails'):
+        return
+    op.create_table('fila_emails',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('destinatarios', sa.Text(), nullable=False),
+        sa.Column('assunto', sa.String(length=255), nullable=False),
+        sa.Column('corpo_html', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('tentativas', sa.Integer(), nullable=False),
+        sa.Column('proxima_tentativa', sa.DateTime(), nullable=False),
+        sa.Column('ultimo_erro', sa.Text(), nullable=True),
+        sa.Column('data_criacao', sa.DateTime(), nullable=False),
+        sa.Column('data_envio', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_fila_emails_status_proxima_tentativa', 'fila_emails', ['status', 'proxima_tentativa'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_fila_emails_status_proxima_tentativa', table_name='fila_emails')
+    op.drop_table('fila_emails')
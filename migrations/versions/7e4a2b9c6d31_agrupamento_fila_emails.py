@@ -0,0 +1,42 @@
+"""Adiciona campos de agrupamento de notificações na fila_emails
+
+Revision ID: 7e4a2b9c6d31
+Revises: 5c1d8e3f7b22
+Create Date: 2026-10-18 12:02:11.538207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7e4a2b9c6d31'
+down_revision = '5c1d8e3f7b22'
+branch_labels = None
+depends_on = None
+
+
+# A aplicação roda db.create_all() ao ser importada (inclusive pelo manage_db.py),
+# então fila_emails pode já ter sido criada com as colunas novas
+def _colunas(tabela):
+    return {coluna['name'] for coluna in sa.inspect(op.get_bind()).get_columns(tabela)}
+
+
+def _indices(tabela):
+    return {indice['name'] for indice in sa.inspect(op.get_bind()).get_indexes(tabela)}
+
+
+def upgrade():
+    colunas = _colunas('fila_emails')
+    if 'chave_agrupamento' not in colunas:
+        op.add_column('fila_emails', sa.Column('chave_agrupamento', sa.String(length=100), nullable=True))
+    if 'agrupados' not in colunas:
+        op.add_column('fila_emails', sa.Column('agrupados', sa.Integer(), nullable=False, server_default='1'))
+    if 'ix_fila_emails_chave_agrupamento' not in _indices('fila_emails'):
+        op.create_index('ix_fila_emails_chave_agrupamento', 'fila_emails', ['chave_agrupamento'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_fila_emails_chave_agrupamento', table_name='fila_emails')
+    op.drop_column('fila_emails', 'agrupados')
+    op.drop_column('fila_emails', 'chave_agrupamento')
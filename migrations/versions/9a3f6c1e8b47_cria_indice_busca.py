@@ -0,0 +1,46 @@
+"""Cria indice_busca (FTS5 no SQLite, FULLTEXT no MySQL) para a busca global
+
+Revision ID: 9a3f6c1e8b47
+Revises: 7e4a2b9c6d31
+Create Date: 2026-10-18 13:10:45.211690
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '9a3f6c1e8b47'
+down_revision = '7e4a2b9c6d31'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # O conteúdo é populado na inicialização da aplicação quando o índice está
+    # vazio, ou manualmente com: python manage_db.py reindexar
+    conn = op.get_bind()
+    if conn.dialect.name == 'mysql':
+        op.execute("""CREATE TABLE IF NOT EXISTS indice_busca (
+            id BIGINT NOT NULL PRIMARY KEY,
+            tipo VARCHAR(20) NOT NULL,
+            registro_id INT NOT NULL,
+            status VARCHAR(50),
+            conteudo TEXT NOT NULL,
+            FULLTEXT KEY ft_indice_busca_conteudo (conteudo)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""")
+    elif conn.dialect.name == 'sqlite':
+        op.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS indice_busca USING fts5(
+            tipo UNINDEXED, registro_id UNINDEXED, status UNINDEXED, conteudo,
+            tokenize = 'unicode61', prefix = '2 3')""")
+    else:
+        op.execute("""CREATE TABLE IF NOT EXISTS indice_busca (
+            id BIGINT NOT NULL PRIMARY KEY,
+            tipo VARCHAR(20) NOT NULL,
+            registro_id INTEGER NOT NULL,
+            status VARCHAR(50),
+            conteudo TEXT NOT NULL
+        )""")
+
+
+def downgrade():
+    op.execute('DROP TABLE IF EXISTS indice_busca')
@@ -0,0 +1,78 @@
+"""Adiciona colunas normalizadas (*_busca) indexadas para busca sem acentos
+
+Revision ID: b2d4f6a8c913
+Revises: 9a3f6c1e8b47
+Create Date: 2026-10-18 14:05:22.730118
+
+"""
+import re
+import unicodedata
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2d4f6a8c913'
+down_revision = '9a3f6c1e8b47'
+branch_labels = None
+depends_on = None
+
+# tabela -> {coluna original: coluna normalizada}
+COLUNAS = {
+    'cotacoes': {'nome_cooperado': 'nome_cooperado_busca', 'nome_filial': 'nome_filial_busca'},
+    'produtos_cotacao': {'nome_produto': 'nome_produto_busca', 'fornecedor': 'fornecedor_busca'},
+    'pesquisas_mercado': {
+        'nome_cooperado': 'nome_cooperado_busca',
+        'nome_filial': 'nome_filial_busca',
+        'nome_produto': 'nome_produto_busca',
+        'nome_concorrente': 'nome_concorrente_busca'
+    }
+}
+
+TAMANHO_LOTE = 1000
+
+
+def _normalizar(texto):
+    # Mesma regra de services.utils.normalizar_texto na data desta migração
+    if not texto:
+        return None
+    texto = unicodedata.normalize('NFD', str(texto))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+    texto = ' '.join(re.sub(r'[^a-z0-9\s]', '', texto).split())
+    return texto[:100] or None
+
+
+def _preencher(conn, tabela, colunas):
+    t = sa.table(tabela, sa.column('id'), *[sa.column(c) for c in list(colunas) + list(colunas.values())])
+    ultimo_id = 0
+    while True:
+        linhas = conn.execute(
+            sa.select(t.c.id, *[t.c[c] for c in colunas])
+            .where(t.c.id > ultimo_id).order_by(t.c.id).limit(TAMANHO_LOTE)
+        ).all()
+        if not linhas:
+            return
+        for linha in linhas:
+            conn.execute(
+                t.update().where(t.c.id == linha[0]).values(
+                    **{sombra: _normalizar(linha[i + 1]) for i, sombra in enumerate(colunas.values())})
+            )
+        ultimo_id = linhas[-1][0]
+
+
+def upgrade():
+    for tabela, colunas in COLUNAS.items():
+        for sombra in colunas.values():
+            op.add_column(tabela, sa.Column(sombra, sa.String(length=100), nullable=True))
+            op.create_index(op.f(f'ix_{tabela}_{sombra}'), tabela, [sombra], unique=False)
+
+    conn = op.get_bind()
+    for tabela, colunas in COLUNAS.items():
+        _preencher(conn, tabela, colunas)
+
+
+def downgrade():
+    for tabela, colunas in COLUNAS.items():
+        for sombra in colunas.values():
+            op.drop_index(op.f(f'ix_{tabela}_{sombra}'), table_name=tabela)
+            op.drop_column(tabela, sombra)
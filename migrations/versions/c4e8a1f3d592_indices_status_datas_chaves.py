@@ -0,0 +1,39 @@
+"""Índices para status, datas, matrícula e chaves estrangeiras
+
+Revision ID: c4e8a1f3d592
+Revises: b2d4f6a8c913
+Create Date: 2026-10-18 15:12:40.184302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e8a1f3d592'
+down_revision = 'b2d4f6a8c913'
+branch_labels = None
+depends_on = None
+
+# (nome, tabela, colunas) - mesmas definições de models.py
+INDICES = [
+    ('ix_cotacoes_status_data_ultima_modificacao', 'cotacoes', ['status', 'data_ultima_modificacao']),
+    ('ix_cotacoes_status_data_entrada_status', 'cotacoes', ['status', 'data_entrada_status']),
+    ('ix_cotacoes_matricula_cooperado', 'cotacoes', ['matricula_cooperado']),
+    ('ix_pesquisas_mercado_status_data_ultima_modificacao', 'pesquisas_mercado', ['status', 'data_ultima_modificacao']),
+    ('ix_pesquisas_mercado_status_data_entrada_status', 'pesquisas_mercado', ['status', 'data_entrada_status']),
+    ('ix_pesquisas_mercado_matricula_cooperado', 'pesquisas_mercado', ['matricula_cooperado']),
+    ('ix_produtos_cotacao_cotacao_id', 'produtos_cotacao', ['cotacao_id']),
+    ('ix_anexos_cotacao_id', 'anexos', ['cotacao_id']),
+    ('ix_anexos_pesquisa_id', 'anexos', ['pesquisa_id']),
+]
+
+
+def upgrade():
+    for nome, tabela, colunas in INDICES:
+        op.create_index(nome, tabela, colunas, unique=False)
+
+
+def downgrade():
+    for nome, tabela, colunas in reversed(INDICES):
+        op.drop_index(nome, table_name=tabela)
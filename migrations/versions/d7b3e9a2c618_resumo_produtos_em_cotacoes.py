@@ -0,0 +1,49 @@
+"""Colunas valor_total e fornecedor (resumo dos produtos) em cotacoes
+
+Revision ID: d7b3e9a2c618
+Revises: c4e8a1f3d592
+Create Date: 2026-10-18 16:02:11.509347
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7b3e9a2c618'
+down_revision = 'c4e8a1f3d592'
+branch_labels = None
+depends_on = None
+
+TAMANHO_LOTE = 5000
+
+
+def upgrade():
+    op.add_column('cotacoes', sa.Column('valor_total', sa.Float(), nullable=False, server_default='0'))
+    op.add_column('cotacoes', sa.Column('fornecedor', sa.String(length=100), nullable=True))
+    op.create_index('ix_cotacoes_status_valor_total', 'cotacoes', ['status', 'valor_total'], unique=False)
+
+    # Preencher a partir dos produtos existentes, em faixas de id
+    cotacoes = sa.table('cotacoes', sa.column('id'), sa.column('valor_total'), sa.column('fornecedor'))
+    produtos = sa.table('produtos_cotacao', sa.column('id'), sa.column('cotacao_id'),
+                        sa.column('fornecedor'), sa.column('valor_total_com_frete'))
+    soma = (sa.select(sa.func.coalesce(sa.func.sum(produtos.c.valor_total_com_frete), 0))
+            .where(produtos.c.cotacao_id == cotacoes.c.id).scalar_subquery())
+    primeiro_fornecedor = (sa.select(sa.func.nullif(produtos.c.fornecedor, ''))
+                           .where(produtos.c.cotacao_id == cotacoes.c.id)
+                           .order_by(produtos.c.id).limit(1).scalar_subquery())
+
+    conn = op.get_bind()
+    maior_id = conn.execute(sa.select(sa.func.max(cotacoes.c.id))).scalar() or 0
+    for inicio in range(0, maior_id, TAMANHO_LOTE):
+        conn.execute(
+            cotacoes.update()
+            .where(cotacoes.c.id > inicio, cotacoes.c.id <= inicio + TAMANHO_LOTE)
+            .values(valor_total=soma, fornecedor=primeiro_fornecedor)
+        )
+
+
+def downgrade():
+    op.drop_index('ix_cotacoes_status_valor_total', table_name='cotacoes')
+    op.drop_column('cotacoes', 'fornecedor')
+    op.drop_column('cotacoes', 'valor_total')
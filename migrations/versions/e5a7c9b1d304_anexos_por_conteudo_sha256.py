@@ -0,0 +1,119 @@
+"""Anexos armazenados por conteúdo (SHA-256) com contagem de referências
+
+Revision ID: e5a7c9b1d304
+Revises: d7b3e9a2c618
+Create Date: 2026-10-18 18:41:27.203845
+
+"""
+from collections import Counter
+from datetime import datetime
+import hashlib
+import os
+import shutil
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a7c9b1d304'
+down_revision = 'd7b3e9a2c618'
+branch_labels = None
+depends_on = None
+
+DIRETORIO_BLOBS = os.path.join('uploads', 'blobs')
+TAMANHO_BLOCO = 64 * 1024
+
+
+# A aplicação roda db.create_all() ao ser importada (inclusive pelo manage_db.py),
+# então arquivos_anexos pode já existir quando a migração é aplicada
+def _tabela_existe(nome):
+    return sa.inspect(op.get_bind()).has_table(nome)
+
+
+def _colunas(tabela):
+    return {coluna['name'] for coluna in sa.inspect(op.get_bind()).get_columns(tabela)}
+
+
+def _indices(tabela):
+    return {indice['name'] for indice in sa.inspect(op.get_bind()).get_indexes(tabela)}
+
+
+def _hash_arquivo(caminho):
+    sha = hashlib.sha256()
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(TAMANHO_BLOCO), b''):
+            sha.update(bloco)
+    return sha.hexdigest(), os.path.getsize(caminho)
+
+
+def upgrade():
+    if not _tabela_existe('arquivos_anexos'):
+        op.create_table(
+            'arquivos_anexos',
+            sa.Column('sha256', sa.String(length=64), nullable=False),
+            sa.Column('caminho', sa.String(length=500), nullable=False),
+            sa.Column('tamanho', sa.BigInteger(), nullable=False),
+            sa.Column('referencias', sa.Integer(), nullable=False),
+            sa.Column('data_criacao', sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint('sha256')
+        )
+    colunas = _colunas('anexos')
+    if 'sha256' not in colunas:
+        op.add_column('anexos', sa.Column('sha256', sa.String(length=64), nullable=True))
+    if 'tamanho' not in colunas:
+        op.add_column('anexos', sa.Column('tamanho', sa.BigInteger(), nullable=True))
+    if 'ix_anexos_sha256' not in _indices('anexos'):
+        op.create_index('ix_anexos_sha256', 'anexos', ['sha256'], unique=False)
+
+    # Mover os arquivos existentes para o armazenamento por conteúdo. Vários
+    # anexos podiam apontar para o mesmo arquivo (mesmo nome), então cada
+    # caminho é processado uma vez e só é apagado depois de copiado.
+    anexos = sa.table('anexos', sa.column('id'), sa.column('filepath'),
+                      sa.column('sha256'), sa.column('tamanho'))
+    arquivos = sa.table('arquivos_anexos', sa.column('sha256'), sa.column('caminho'),
+                        sa.column('tamanho'), sa.column('referencias'), sa.column('data_criacao'))
+    conn = op.get_bind()
+    por_caminho = {}
+    for id_, filepath in conn.execute(sa.select(anexos.c.id, anexos.c.filepath)):
+        por_caminho.setdefault(filepath, []).append(id_)
+
+    referencias = Counter()
+    tamanhos = {}
+    migrados = []
+    for filepath, ids in por_caminho.items():
+        if not filepath or not os.path.isfile(filepath):
+            print(f"Aviso: arquivo de anexo não encontrado: {filepath} (anexos {ids})")
+            continue
+        sha256, tamanho = _hash_arquivo(filepath)
+        blob = os.path.join(DIRETORIO_BLOBS, sha256[:2], sha256)
+        if not os.path.exists(blob):
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            shutil.copy2(filepath, blob)
+        conn.execute(anexos.update().where(anexos.c.id.in_(ids))
+                     .values(sha256=sha256, tamanho=tamanho, filepath=blob))
+        referencias[sha256] += len(ids)
+        tamanhos[sha256] = tamanho
+        if os.path.normpath(filepath) != blob:
+            migrados.append(filepath)
+
+    if referencias:
+        conn.execute(arquivos.insert(), [
+            {'sha256': sha256, 'caminho': os.path.join(DIRETORIO_BLOBS, sha256[:2], sha256),
+             'tamanho': tamanhos[sha256], 'referencias': total, 'data_criacao': datetime.now()}
+            for sha256, total in referencias.items()
+        ])
+    for filepath in migrados:
+        try:
+            os.remove(filepath)
+        except OSError as e:
+            print(f"Aviso: não foi possível remover {filepath}: {e}")
+
+
+def downgrade():
+    # Os arquivos continuam em uploads/blobs; Anexo.filepath segue apontando para eles
+    op.drop_index('ix_anexos_sha256', table_name='anexos')
+    op.drop_column('anexos', 'tamanho')
+    op.drop_column('anexos', 'sha256')
+
+    op.drop_table('arquivos_anexos')
@@ -0,0 +1,41 @@
+"""Tabela uploads_parciais (upload de anexos em partes)
+
+Revision ID: f8c2d4e6a715
+Revises: e5a7c9b1d304
+Create Date: 2026-10-18 20:12:54.618302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f8c2d4e6a715'
+down_revision = 'e5a7c9b1d304'
+branch_labels = None
+depends_on = None
+
+
+# A aplicação roda db.create_all() ao ser importada (inclusive pelo manage_db.py),
+# então a tabela pode já existir quando a migração é aplicada
+def _tabela_existe(nome):
+    return sa.inspect(op.get_bind()).has_table(nome)
+
+
+def upgrade():
+    if _tabela_existe('uploads_parciais'):
+        return
+    op.create_table(
+        'uploads_parciais',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('filename', sa.String(length=255), nullable=False),
+        sa.Column('tamanho', sa.BigInteger(), nullable=False),
+        sa.Column('cotacao_id', sa.Integer(), nullable=True),
+        sa.Column('pesquisa_id', sa.Integer(), nullable=True),
+        sa.Column('data_criacao', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('uploads_parciais')
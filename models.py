@@ -1,4 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import selectinload
 from datetime import datetime
 
 db = SQLAlchemy()
@@ -15,10 +16,13 @@ class Anexo(db.Model):
     filename = db.Column(db.String(255), nullable=False)  # Nome original do arquivo
     filepath = db.Column(db.String(500), nullable=False)  # Caminho no servidor
     data_upload = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    # Conteúdo armazenado por hash (ver ArquivoAnexo); nulo em anexos antigos sem arquivo
+    sha256 = db.Column(db.String(64), nullable=True, index=True)
+    tamanho = db.Column(db.BigInteger, nullable=True)
     
     # Chaves estrangeiras (apenas um deve ser preenchido)
-    cotacao_id = db.Column(db.Integer, db.ForeignKey('cotacoes.id'), nullable=True)
-    pesquisa_id = db.Column(db.Integer, db.ForeignKey('pesquisas_mercado.id'), nullable=True)
+    cotacao_id = db.Column(db.Integer, db.ForeignKey('cotacoes.id'), nullable=True, index=True)
+    pesquisa_id = db.Column(db.Integer, db.ForeignKey('pesquisas_mercado.id'), nullable=True, index=True)
     
     def __repr__(self):
         return f'<Anexo {self.id}: {self.filename}>'
@@ -28,18 +32,56 @@ class Anexo(db.Model):
             'id': self.id,
             'filename': self.filename,
             'filepath': self.filepath,
+            'tamanho': self.tamanho,
             'data_upload': self.data_upload.strftime('%d/%m/%Y %H:%M')
         }
 
 
+class ArquivoAnexo(db.Model):
+    """Conteúdo de anexo armazenado uma única vez por SHA-256, com contagem de referências"""
+    __tablename__ = 'arquivos_anexos'
+    
+    sha256 = db.Column(db.String(64), primary_key=True)
+    caminho = db.Column(db.String(500), nullable=False)
+    tamanho = db.Column(db.BigInteger, nullable=False, default=0)
+    referencias = db.Column(db.Integer, nullable=False, default=0)
+    data_criacao = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    
+    def __repr__(self):
+        return f'<ArquivoAnexo {self.sha256[:12]}: {self.referencias} ref.>'
+
+
+class UploadParcial(db.Model):
+    """Upload de anexo em partes; o conteúdo recebido fica em uploads/parciais/<id>"""
+    __tablename__ = 'uploads_parciais'
+    
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    filename = db.Column(db.String(255), nullable=False)  # Nome original do arquivo
+    tamanho = db.Column(db.BigInteger, nullable=False)  # Tamanho total informado ao iniciar
+    # Sem chave estrangeira: excluir o registro não depende dos uploads pendentes
+    # (a existência é conferida ao concluir o upload)
+    cotacao_id = db.Column(db.Integer, nullable=True)
+    pesquisa_id = db.Column(db.Integer, nullable=True)
+    data_criacao = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    
+    def __repr__(self):
+        return f'<UploadParcial {self.id}: {self.filename}>'
+
+
 class Cotacao(db.Model):
     __tablename__ = 'cotacoes'
+    # Listagens filtram por status e ordenam por data; o prefixo (status) atende as contagens do dashboard
+    __table_args__ = (
+        db.Index('ix_cotacoes_status_data_ultima_modificacao', 'status', 'data_ultima_modificacao'),
+        db.Index('ix_cotacoes_status_data_entrada_status', 'status', 'data_entrada_status'),
+        db.Index('ix_cotacoes_status_valor_total', 'status', 'valor_total'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     data = db.Column(db.Date, nullable=False, default=datetime.now().date)
     nome_filial = db.Column(db.String(100), nullable=False)
     numero_mesorregiao = db.Column(db.String(20), nullable=False)
-    matricula_cooperado = db.Column(db.String(20), nullable=False)
+    matricula_cooperado = db.Column(db.String(20), nullable=False, index=True)
     nome_cooperado = db.Column(db.String(100), nullable=False)
     status = db.Column(db.String(50), nullable=False, default='Análise Comercial')
     data_entrada_status = db.Column(db.DateTime, nullable=False, default=datetime.now)
@@ -52,6 +94,13 @@ class Cotacao(db.Model):
     cultura = db.Column(db.String(50), nullable=True)
     motivo_venda_perdida = db.Column(db.Text, nullable=True)
     nome_vendedor = db.Column(db.String(100), nullable=False)
+    # Forma normalizada (normalizar_texto) para busca indexada; mantida por services/utils.py
+    nome_cooperado_busca = db.Column(db.String(100), nullable=True, index=True)
+    nome_filial_busca = db.Column(db.String(100), nullable=True, index=True)
+    # Resumo dos produtos (soma de valor_total_com_frete e fornecedor do primeiro produto),
+    # atualizado por atualizar_resumo_produtos sempre que os produtos mudam
+    valor_total = db.Column(db.Float, nullable=False, default=0.0, server_default='0')
+    fornecedor = db.Column(db.String(100), nullable=True)
     
     # Relacionamentos
     produtos = db.relationship('ProdutoCotacao', backref='cotacao', lazy=True, cascade='all, delete-orphan')
@@ -60,11 +109,19 @@ class Cotacao(db.Model):
     def __repr__(self):
         return f'<Cotacao {self.id}>'
     
-    def to_dict(self):
+    def atualizar_resumo_produtos(self, produtos):
+        """
+        Recalcula valor_total e fornecedor a partir da lista de produtos da cotação.
+
+        Args:
+            produtos: Produtos atuais da cotação, na ordem de inclusão
+        """
+        self.valor_total = sum(produto.valor_total_com_frete or 0 for produto in produtos)
+        self.fornecedor = (produtos[0].fornecedor or None) if produtos else None
+    
+    def to_dict(self, incluir_produtos=True):
         dias_no_status = (datetime.now() - self.data_entrada_status).days
-        valor_total = sum([produto.valor_total_com_frete or 0 for produto in self.produtos]) if self.produtos else 0
-        fornecedor = self.produtos[0].fornecedor if self.produtos and self.produtos[0].fornecedor else '-'
-        return {
+        dados = {
             'id': self.id,
             'data': self.data.strftime('%d/%m/%Y'),
             'nome_filial': self.nome_filial,
@@ -82,18 +139,28 @@ class Cotacao(db.Model):
             'cultura': self.cultura,
             'motivo_venda_perdida': self.motivo_venda_perdida,
             'nome_vendedor': self.nome_vendedor,
-            'produtos': [produto.to_dict() for produto in self.produtos],
-            'valor_total': valor_total,
-            'fornecedor': fornecedor,
+            'valor_total': self.valor_total or 0,
+            'fornecedor': self.fornecedor or '-',
             'anexos': [anexo.to_dict() for anexo in self.anexos]
         }
+        if incluir_produtos:
+            # Use selectinload nas listagens para evitar N+1
+            dados['produtos'] = [produto.to_dict() for produto in self.produtos]
+        return dados
+
+
+def carregar_relacionamentos_cotacao(incluir_produtos=True):
+    """Opções de carga em lote (SELECT ... IN) para produtos e anexos das cotações"""
+    if not incluir_produtos:
+        return (selectinload(Cotacao.anexos),)
+    return (selectinload(Cotacao.produtos), selectinload(Cotacao.anexos))
 
 
 class ProdutoCotacao(db.Model):
     __tablename__ = 'produtos_cotacao'
     
     id = db.Column(db.Integer, primary_key=True)
-    cotacao_id = db.Column(db.Integer, db.ForeignKey('cotacoes.id'), nullable=False)
+    cotacao_id = db.Column(db.Integer, db.ForeignKey('cotacoes.id'), nullable=False, index=True)
     sku_produto = db.Column(db.String(20), nullable=True)
     nome_produto = db.Column(db.String(100), nullable=False)
     volume = db.Column(db.Float, nullable=False)
@@ -105,6 +172,9 @@ class ProdutoCotacao(db.Model):
     valor_frete = db.Column(db.Float, nullable=True)
     prazo_entrega_fornecedor = db.Column(db.Date, nullable=True)
     valor_total_com_frete = db.Column(db.Float, nullable=True)
+    # Forma normalizada (normalizar_texto) para busca indexada; mantida por services/utils.py
+    nome_produto_busca = db.Column(db.String(100), nullable=True, index=True)
+    fornecedor_busca = db.Column(db.String(100), nullable=True, index=True)
     
     def to_dict(self):
         return {
@@ -125,12 +195,17 @@ class ProdutoCotacao(db.Model):
 
 class PesquisaMercado(db.Model):
     __tablename__ = 'pesquisas_mercado'
+    # Listagens filtram por status e ordenam por data; o prefixo (status) atende as contagens do dashboard
+    __table_args__ = (
+        db.Index('ix_pesquisas_mercado_status_data_ultima_modificacao', 'status', 'data_ultima_modificacao'),
+        db.Index('ix_pesquisas_mercado_status_data_entrada_status', 'status', 'data_entrada_status'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     data = db.Column(db.Date, nullable=False, default=datetime.now().date)
     nome_filial = db.Column(db.String(100), nullable=False)
     numero_mesorregiao = db.Column(db.String(20), nullable=False)
-    matricula_cooperado = db.Column(db.String(20), nullable=False)
+    matricula_cooperado = db.Column(db.String(20), nullable=False, index=True)
     nome_cooperado = db.Column(db.String(100), nullable=False)
     codigo_produto = db.Column(db.String(20), nullable=True)
     nome_produto = db.Column(db.String(100), nullable=False)
@@ -149,6 +224,11 @@ class PesquisaMercado(db.Model):
     nome_vendedor = db.Column(db.String(100), nullable=True)
     comprador = db.Column(db.String(100), nullable=True)
     prazo_entrega = db.Column(db.Date, nullable=True)
+    # Forma normalizada (normalizar_texto) para busca indexada; mantida por services/utils.py
+    nome_cooperado_busca = db.Column(db.String(100), nullable=True, index=True)
+    nome_filial_busca = db.Column(db.String(100), nullable=True, index=True)
+    nome_produto_busca = db.Column(db.String(100), nullable=True, index=True)
+    nome_concorrente_busca = db.Column(db.String(100), nullable=True, index=True)
     
     # Relacionamento com anexos
     anexos = db.relationship('Anexo', backref='pesquisa', lazy=True, cascade='all, delete-orphan')
@@ -179,4 +259,66 @@ class PesquisaMercado(db.Model):
             'nome_vendedor': self.nome_vendedor,
             'comprador': self.comprador,
             'prazo_entrega': self.prazo_entrega.strftime('%Y-%m-%d') if self.prazo_entrega else None
-        }
\ No newline at end of file
+        }
+
+
+def carregar_relacionamentos_pesquisa():
+    """Opções de carga em lote (SELECT ... IN) para os anexos das pesquisas"""
+    return (selectinload(PesquisaMercado.anexos),)
+
+
+class Exportacao(db.Model):
+    """Job de exportação assíncrona para Excel (persistido para sobreviver a recargas da página)"""
+    __tablename__ = 'exportacoes'
+    
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    tipo = db.Column(db.String(20), nullable=False)  # 'cotacao' ou 'pesquisa'
+    ids = db.Column(db.Text, nullable=False)  # JSON com os ids selecionados, na ordem do usuário
+    status = db.Column(db.String(20), nullable=False, default='pendente')  # pendente, processando, concluido, erro
+    total = db.Column(db.Integer, nullable=False, default=0)
+    processados = db.Column(db.Integer, nullable=False, default=0)
+    filepath = db.Column(db.String(500), nullable=True)
+    erro = db.Column(db.Text, nullable=True)
+    data_criacao = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    data_atualizacao = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    
+    def __repr__(self):
+        return f'<Exportacao {self.id}: {self.status}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'tipo': self.tipo,
+            'status': self.status,
+            'total': self.total,
+            'processados': self.processados,
+            'progresso': round(100 * self.processados / self.total) if self.total else 0,
+            'filepath': self.filepath,
+            'erro': self.erro,
+            'data_criacao': self.data_criacao.strftime('%d/%m/%Y %H:%M:%S')
+        }
+
+
+class EmailFila(db.Model):
+    """E-mail de notificação pendente (outbox), gravado na mesma transação do registro"""
+    __tablename__ = 'fila_emails'
+    __table_args__ = (
+        db.Index('ix_fila_emails_status_proxima_tentativa', 'status', 'proxima_tentativa'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    destinatarios = db.Column(db.Text, nullable=False)  # JSON com a lista de e-mails
+    assunto = db.Column(db.String(255), nullable=False)
+    corpo_html = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pendente')  # pendente, enviado, erro, resumo, agrupado
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    # Registro de origem (ex.: 'cotacao:12'); notificações do mesmo registro e destinatários são agrupadas
+    chave_agrupamento = db.Column(db.String(100), nullable=True, index=True)
+    agrupados = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    proxima_tentativa = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    ultimo_erro = db.Column(db.Text, nullable=True)
+    data_criacao = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    data_envio = db.Column(db.DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f'<EmailFila {self.id}: {self.status}>'
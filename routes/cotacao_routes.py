@@ -1,14 +1,18 @@
-from flask import Blueprint, render_template, request, jsonify, send_file, abort
-from models import db, Cotacao, ProdutoCotacao, Anexo, MAX_ANEXOS
-from services.utils import exportar_para_excel
+from flask import Blueprint, Response, render_template, request, jsonify, send_file, abort, stream_with_context
+from models import db, Cotacao, Anexo, carregar_relacionamentos_cotacao
+from services.utils import exportar_para_excel, criar_filtro_busca_registro
+from services.paginacao import ler_parametros_paginacao, paginar_keyset, CHAVES_ORDENACAO_COTACAO
+from services.exportacao_jobs import criar_job_exportacao
+from services.exportacao import gerar_exportacao_texto, FORMATOS_TEXTO
+from services.exclusao import excluir_cotacoes_em_lote
+from services.importacao import importar_planilha, EXTENSOES_IMPORTACAO
+from services.produtos import ler_produtos_formulario, inserir_produtos, sincronizar_produtos
+from services.anexos import salvar_anexos, EXTENSOES_ANEXO
 from datetime import datetime
-import os
 import pytz
-from werkzeug.utils import secure_filename
-import json
 import traceback
-import threading
-from services.email_service import enviar_email, obter_email_por_status
+from services.email_service import enfileirar_email, notificar_worker_email, obter_email_por_status
+from services.estatisticas import invalidar_estatisticas_dashboard
 from urllib.parse import unquote
 
 cotacao_routes = Blueprint('cotacao_routes', __name__)
@@ -23,24 +27,72 @@ STATUS_OPTIONS = [
 TZ_SP = pytz.timezone('America/Sao_Paulo')
 
 # Extensões de arquivo permitidas
-ALLOWED_EXTENSIONS = {'pdf', 'doc', 'docx', 'xls', 'xlsx', 'csv', 'txt', 'jpg', 'jpeg', 'png'}
+ALLOWED_EXTENSIONS = EXTENSOES_ANEXO
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-@cotacao_routes.route('/api/cotacoes')
-def get_cotacoes():
-    tipo = request.args.get('tipo', 'andamento')
+def filtrar_cotacoes_por_tipo(query, tipo):
+    """Aplica o filtro de status de cada aba do dashboard; retorna None para tipo desconhecido"""
     if tipo == 'andamento':
-        cotacoes = Cotacao.query.filter(Cotacao.status.in_([
-            'Análise Comercial', 'Análise Suprimentos'])).all()
+        return query.filter(Cotacao.status.in_([
+            'Análise Comercial', 'Análise Suprimentos']))
     elif tipo == 'finalizadas':
-        cotacoes = Cotacao.query.filter(Cotacao.status.in_(['Liberado para Venda'])).all()
+        return query.filter(Cotacao.status.in_(['Liberado para Venda']))
     elif tipo == 'perdidas':
-        cotacoes = Cotacao.query.filter(Cotacao.status == 'Cotação Perdida').all()
-    else:
-        cotacoes = []
-    return jsonify([cotacao.to_dict() for cotacao in cotacoes])
+        return query.filter(Cotacao.status == 'Cotação Perdida')
+    return None
+
+@cotacao_routes.route('/api/cotacoes')
+def get_cotacoes():
+    tipo = request.args.get('tipo', 'andamento')
+    # ?produtos=0 omite a lista de produtos: valor_total e fornecedor já estão na cotação
+    incluir_produtos = request.args.get('produtos', '1') != '0'
+    # Produtos e anexos carregados em lote: número fixo de consultas por listagem
+    query = filtrar_cotacoes_por_tipo(
+        Cotacao.query.options(*carregar_relacionamentos_cotacao(incluir_produtos)), tipo)
+    # Busca opcional por id, matrícula ou início do nome do cooperado (?busca=&busca_por=)
+    filtro_busca = criar_filtro_busca_registro(Cotacao, request.args.get('busca'), request.args.get('busca_por'))
+    if query is not None and filtro_busca is not None:
+        query = query.filter(filtro_busca)
+
+    # Paginação por cursor: ?limite=50&cursor=...&ordenar_por=id&ordem=desc
+    # (sem parâmetros, a primeira página com o tamanho padrão)
+    try:
+        paginacao = ler_parametros_paginacao(request.args, CHAVES_ORDENACAO_COTACAO)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    if query is None:
+        return jsonify({'itens': [], 'proximo_cursor': None, 'limite': paginacao['limite']})
+    try:
+        cotacoes, proximo_cursor = paginar_keyset(query, Cotacao, **paginacao)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({
+        'itens': [cotacao.to_dict(incluir_produtos) for cotacao in cotacoes],
+        'proximo_cursor': proximo_cursor,
+        'limite': paginacao['limite']
+    })
+
+@cotacao_routes.route('/api/cotacoes/exportar/<formato>')
+def exportar_cotacoes_texto(formato):
+    """Exporta as cotações da aba (?tipo=) em CSV ou NDJSON, uma linha por produto, em streaming"""
+    if formato not in FORMATOS_TEXTO:
+        return jsonify({'success': False, 'error': 'Formato deve ser csv ou ndjson'}), 400
+    tipo = request.args.get('tipo', 'andamento')
+    query = filtrar_cotacoes_por_tipo(Cotacao.query, tipo)
+    if query is None:
+        return jsonify({'success': False, 'error': f'Tipo inválido: {tipo}'}), 400
+    filtro_busca = criar_filtro_busca_registro(Cotacao, request.args.get('busca'), request.args.get('busca_por'))
+    if filtro_busca is not None:
+        query = query.filter(filtro_busca)
+    filename = f"Cotacoes_{tipo}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{formato}"
+    return Response(
+        stream_with_context(gerar_exportacao_texto(query, Cotacao, formato)),
+        content_type=FORMATOS_TEXTO[formato],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
 
 @cotacao_routes.route('/nova-cotacao', methods=['GET'], endpoint='nova_cotacao')
 def nova_cotacao():
@@ -151,108 +203,24 @@ def criar_cotacao():
         
         # Processar anexos (múltiplos arquivos)
         arquivos = request.files.getlist('anexos[]') or request.files.getlist('anexo')
-        if arquivos:
-            anexos_count = 0
-            for arquivo in arquivos:
-                if arquivo and arquivo.filename and allowed_file(arquivo.filename):
-                    if anexos_count >= MAX_ANEXOS:
-                        break
-                    
-                    filename = secure_filename(arquivo.filename)
-                    uploads_dir = os.path.join(os.getcwd(), 'uploads')
-                    os.makedirs(uploads_dir, exist_ok=True)
-                    filepath = os.path.join('uploads', filename)
-                    arquivo.save(os.path.join(uploads_dir, filename))
-                    
-                    # Criar registro de anexo
-                    anexo = Anexo(
-                        filename=filename,
-                        filepath=filepath,
-                        cotacao_id=cotacao.id
-                    )
-                    db.session.add(anexo)
-                    anexos_count += 1
-        
-        # Processar produtos
-        produtos_json = data.get('produtos_json')
-        produtos_data = []
-        if produtos_json:
-            produtos_data = json.loads(produtos_json)
-        else:
-            produtos_dict = {}
-            for key in data.keys():
-                if key.startswith('produtos['):
-                    import re
-                    m = re.match(r'produtos\[(\d+)\]\[(.+)\]', key)
-                    if m:
-                        idx = int(m.group(1))
-                        campo = m.group(2)
-                        if idx not in produtos_dict:
-                            produtos_dict[idx] = {}
-                        produtos_dict[idx][campo] = data[key]
-            for idx in sorted(produtos_dict.keys()):
-                produtos_data.append(produtos_dict[idx])
-        
-        def parse_money(value):
-            if not value or value == '':
-                return 0.0
-            try:
-                clean_value = str(value).replace('R$', '').replace(' ', '').replace('.', '').replace(',', '.')
-                return float(clean_value) if clean_value else 0.0
-            except:
-                return 0.0
-        
-        for produto_data in produtos_data:
-            # Tratar campo prazo_entrega_fornecedor corretamente
-            prazo_entrega_fornecedor = produto_data.get('prazo_entrega_fornecedor', '')
-            if prazo_entrega_fornecedor == 'null' or prazo_entrega_fornecedor == '' or prazo_entrega_fornecedor is None:
-                prazo_entrega_fornecedor = None
-            else:
-                try:
-                    prazo_entrega_fornecedor = datetime.strptime(prazo_entrega_fornecedor, '%Y-%m-%d').date()
-                except (ValueError, TypeError):
-                    prazo_entrega_fornecedor = None
-            
-            produto = ProdutoCotacao(
-                cotacao_id=cotacao.id,
-                sku_produto=produto_data.get('sku_produto', ''),
-                nome_produto=produto_data.get('nome_produto', ''),
-                volume=float(produto_data.get('volume', 0)) if produto_data.get('volume') else 0.0,
-                unidade_medida=produto_data.get('unidade_medida', ''),
-                preco_unitario=parse_money(produto_data.get('preco_unitario', '')),
-                valor_total=parse_money(produto_data.get('valor_total', '')),
-                fornecedor=produto_data.get('fornecedor', ''),
-                preco_custo=parse_money(produto_data.get('preco_custo', '')),
-                valor_frete=parse_money(produto_data.get('valor_frete', '')),
-                prazo_entrega_fornecedor=prazo_entrega_fornecedor,
-                valor_total_com_frete=parse_money(produto_data.get('valor_total_com_frete', ''))
-            )
-            db.session.add(produto)
-        
+        salvar_anexos(arquivos, 0, allowed_file, cotacao_id=cotacao.id)
+        
+        # Processar produtos: todas as linhas convertidas e gravadas em um único INSERT
+        inserir_produtos(cotacao, ler_produtos_formulario(data))
+        
+        # E-mail para o departamento correto: gravado na fila na mesma transação
+        # e enviado pelo worker de e-mails após o commit
+        enfileirar_email(
+            obter_email_por_status(cotacao.status),
+            assunto='Nova Cotação Criada',
+            corpo_html=f'<p>Uma nova cotação foi criada para o cooperado {cotacao.nome_cooperado} (ID {cotacao.id}). Status: {cotacao.status}.</p>',
+            chave=f'cotacao:{cotacao.id}'
+        )
         db.session.commit()
+        invalidar_estatisticas_dashboard()
+        notificar_worker_email()
         
-        # Enviar e-mail para o departamento correto (em background para não bloquear)
-        # Capturar valores antes de iniciar a thread para evitar erro de contexto
-        email_status = cotacao.status
-        email_nome_cooperado = cotacao.nome_cooperado
-        email_cotacao_id = cotacao.id
-        
-        def enviar_email_background(status, nome_cooperado, cid):
-            try:
-                destinatario = obter_email_por_status(status)
-                destinatarios = destinatario if isinstance(destinatario, list) else [destinatario]
-                enviar_email(
-                    destinatarios=destinatarios,
-                    assunto='Nova Cotação Criada',
-                    corpo_html=f'<p>Uma nova cotação foi criada para o cooperado {nome_cooperado} (ID {cid}). Status: {status}.</p>'
-                )
-            except Exception as e:
-                print('Erro ao enviar e-mail automático:', e)
-        
-        # Executar envio de e-mail em thread separada
-        threading.Thread(target=enviar_email_background, args=(email_status, email_nome_cooperado, email_cotacao_id), daemon=True).start()
-        
-        return jsonify({'success': True, 'message': 'Cotação criada com sucesso!'})
+        return jsonify({'success': True, 'id': cotacao.id, 'message': 'Cotação criada com sucesso!'})
     except Exception as e:
         db.session.rollback()
         print('ERRO:', str(e))
@@ -294,101 +262,26 @@ def atualizar_cotacao(id):
         
         # Processar anexos (múltiplos arquivos)
         arquivos = request.files.getlist('anexos[]') or request.files.getlist('anexo')
-        if arquivos:
-            anexos_existentes = len(cotacao.anexos)
-            
-            for arquivo in arquivos:
-                if arquivo and arquivo.filename and allowed_file(arquivo.filename):
-                    # Verificar limite
-                    if anexos_existentes >= MAX_ANEXOS:
-                        break
-                    
-                    filename = secure_filename(arquivo.filename)
-                    uploads_dir = os.path.join(os.getcwd(), 'uploads')
-                    os.makedirs(uploads_dir, exist_ok=True)
-                    filepath = os.path.join('uploads', filename)
-                    arquivo.save(os.path.join(uploads_dir, filename))
-                    
-                    # Adicionar novo anexo ao banco
-                    anexo = Anexo(
-                        filename=filename,
-                        filepath=filepath,
-                        cotacao_id=cotacao.id
-                    )
-                    db.session.add(anexo)
-                    anexos_existentes += 1
-        
-        # Atualizar produtos
-        for produto in cotacao.produtos:
-            db.session.delete(produto)
-        
-        produtos_json = data.get('produtos_json')
-        if produtos_json:
-            produtos_data = json.loads(produtos_json)
-        else:
-            produtos_data = []
-        
-        def parse_money(value):
-            if not value or value == '':
-                return 0.0
-            try:
-                clean_value = str(value).replace('R$', '').replace(' ', '').replace('.', '').replace(',', '.')
-                return float(clean_value) if clean_value else 0.0
-            except:
-                return 0.0
+        salvar_anexos(arquivos, len(cotacao.anexos), allowed_file, cotacao_id=cotacao.id)
         
-        for produto_data in produtos_data:
-            # Tratar campo prazo_entrega_fornecedor corretamente
-            prazo_entrega_fornecedor = produto_data.get('prazo_entrega_fornecedor', '')
-            if prazo_entrega_fornecedor == 'null' or prazo_entrega_fornecedor == '' or prazo_entrega_fornecedor is None:
-                prazo_entrega_fornecedor = None
-            else:
-                try:
-                    prazo_entrega_fornecedor = datetime.strptime(prazo_entrega_fornecedor, '%Y-%m-%d').date()
-                except (ValueError, TypeError):
-                    prazo_entrega_fornecedor = None
-            
-            produto = ProdutoCotacao(
-                cotacao_id=cotacao.id,
-                sku_produto=produto_data.get('sku_produto', ''),
-                nome_produto=produto_data.get('nome_produto', ''),
-                volume=float(produto_data.get('volume', 0)) if produto_data.get('volume') else 0.0,
-                unidade_medida=produto_data.get('unidade_medida', ''),
-                preco_unitario=parse_money(produto_data.get('preco_unitario', '')),
-                valor_total=parse_money(produto_data.get('valor_total', '')),
-                fornecedor=produto_data.get('fornecedor', ''),
-                preco_custo=parse_money(produto_data.get('preco_custo', '')),
-                valor_frete=parse_money(produto_data.get('valor_frete', '')),
-                prazo_entrega_fornecedor=prazo_entrega_fornecedor,
-                valor_total_com_frete=parse_money(produto_data.get('valor_total_com_frete', ''))
-            )
-            db.session.add(produto)
+        # Atualizar produtos: só as linhas alteradas, novas ou removidas são gravadas
+        produtos = sincronizar_produtos(cotacao, ler_produtos_formulario(data))
+        cotacao.atualizar_resumo_produtos(produtos)
         
         cotacao.data_ultima_modificacao = datetime.now(TZ_SP)
+        # E-mail para o departamento correto: gravado na fila na mesma transação
+        # e enviado pelo worker de e-mails após o commit
+        enfileirar_email(
+            obter_email_por_status(cotacao.status),
+            assunto='Cotação Atualizada',
+            corpo_html=f'<p>A cotação de ID {cotacao.id} do cooperado {cotacao.nome_cooperado} foi atualizada. Status: {cotacao.status}.</p>',
+            chave=f'cotacao:{cotacao.id}'
+        )
         db.session.commit()
+        invalidar_estatisticas_dashboard()
+        notificar_worker_email()
         
-        # Enviar e-mail para o departamento correto (em background para não bloquear)
-        # Capturar valores antes de iniciar a thread para evitar erro de contexto
-        email_status = cotacao.status
-        email_nome_cooperado = cotacao.nome_cooperado
-        email_cotacao_id = cotacao.id
-        
-        def enviar_email_background(status, nome_cooperado, cid):
-            try:
-                destinatario = obter_email_por_status(status)
-                destinatarios = destinatario if isinstance(destinatario, list) else [destinatario]
-                enviar_email(
-                    destinatarios=destinatarios,
-                    assunto='Cotação Atualizada',
-                    corpo_html=f'<p>A cotação de ID {cid} do cooperado {nome_cooperado} foi atualizada. Status: {status}.</p>'
-                )
-            except Exception as e:
-                print('Erro ao enviar e-mail automático:', e)
-        
-        # Executar envio de e-mail em thread separada
-        threading.Thread(target=enviar_email_background, args=(email_status, email_nome_cooperado, email_cotacao_id), daemon=True).start()
-        
-        return jsonify({'success': True, 'message': 'Cotação atualizada com sucesso!'})
+        return jsonify({'success': True, 'id': cotacao.id, 'message': 'Cotação atualizada com sucesso!'})
     except Exception as e:
         db.session.rollback()
         traceback.print_exc()
@@ -399,17 +292,39 @@ def excluir_cotacao(id):
     cotacao = Cotacao.query.get_or_404(id)
     db.session.delete(cotacao)
     db.session.commit()
+    invalidar_estatisticas_dashboard()
     return jsonify({'success': True})
 
 @cotacao_routes.route('/api/cotacoes/excluir', methods=['POST'])
 def excluir_multiplas():
     ids = request.json.get('ids', [])
-    for id in ids:
-        cotacao = Cotacao.query.get(id)
-        if cotacao:
-            db.session.delete(cotacao)
-    db.session.commit()
-    return jsonify({'success': True})
+    if not isinstance(ids, list):
+        return jsonify({'success': False, 'error': 'Lista de ids inválida'}), 400
+    try:
+        excluidas = excluir_cotacoes_em_lote(ids)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    invalidar_estatisticas_dashboard()
+    return jsonify({'success': True, 'excluidas': excluidas})
+
+@cotacao_routes.route('/api/cotacoes/importar', methods=['POST'])
+def importar_cotacoes():
+    """
+    Importa cotações de uma planilha CSV/XLSX (campo arquivo), uma linha por
+    produto; linhas seguidas com o mesmo id formam uma cotação.
+    """
+    arquivo = request.files.get('arquivo')
+    if not arquivo or not arquivo.filename:
+        return jsonify({'success': False, 'error': 'Nenhum arquivo enviado'}), 400
+    extensao = arquivo.filename.rsplit('.', 1)[-1].lower()
+    if extensao not in EXTENSOES_IMPORTACAO:
+        return jsonify({'success': False, 'error': 'Formato não suportado. Use CSV ou XLSX.'}), 400
+    try:
+        relatorio = importar_planilha(arquivo.stream, extensao, 'cotacao')
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': f'Erro ao ler a planilha: {str(e)}'}), 400
+    return jsonify(dict(relatorio, success=True))
 
 @cotacao_routes.route('/api/cotacao/<int:id>/exportar')
 def exportar_cotacao(id):
@@ -424,14 +339,16 @@ def exportar_cotacao(id):
 
 @cotacao_routes.route('/api/cotacoes/exportar', methods=['POST'])
 def exportar_multiplas():
+    """Agenda a exportação das cotações selecionadas; acompanhar em /api/exportacoes/<job_id>"""
     try:
         ids = request.json.get('ids', [])
-        cotacoes = [Cotacao.query.get(id) for id in ids if Cotacao.query.get(id)]
-        if not cotacoes:
+        if not isinstance(ids, list) or not ids:
             return jsonify({'success': False, 'error': 'Nenhuma cotação selecionada'}), 400
-        filepath = exportar_para_excel(cotacoes)
-        print(f"Exportação de múltiplas cotações ({len(ids)} itens) bem-sucedida. Caminho: {filepath}")
-        return jsonify({'success': True, 'filepath': filepath})
+        job = criar_job_exportacao('cotacao', ids)
+        print(f"Exportação de múltiplas cotações ({len(ids)} itens) agendada. Job: {job.id}")
+        return jsonify({'success': True, 'job_id': job.id, 'status': job.status}), 202
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         print(f"Erro na exportação de múltiplas cotações: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -446,14 +363,8 @@ def excluir_anexo(id):
     """Excluir um anexo específico"""
     try:
         anexo = Anexo.query.get_or_404(id)
-        
-        # Remover arquivo físico se existir
-        if anexo.filepath and os.path.exists(anexo.filepath):
-            try:
-                os.remove(anexo.filepath)
-            except OSError:
-                pass  # Ignorar erro ao remover arquivo
-        
+        # O arquivo é compartilhado por conteúdo: só sai do disco (após o commit)
+        # quando nenhum outro anexo aponta para ele
         db.session.delete(anexo)
         db.session.commit()
         return '', 204
@@ -1,13 +1,42 @@
-from flask import Blueprint, render_template, request, jsonify, send_file, abort
-from services.utils import carregar_filiais_mesoregioes, carregar_contas_cache, carregar_produtos_cache
-from urllib.parse import unquote
+from flask import Blueprint, Response, current_app, render_template, request, jsonify, abort
+from werkzeug.exceptions import NotFound
+from werkzeug.utils import send_file
+from services.utils import (
+    carregar_filiais_mesoregioes,
+    carregar_contas_cache,
+    carregar_produtos_cache,
+    buscar_conta_por_matricula,
+    buscar_produto_por_codigo,
+    buscar_contas_por_nome,
+    buscar_produtos_por_nome,
+    obter_versao_dados_mestres,
+    obter_filiais_serializadas
+)
+from services.estatisticas import obter_estatisticas_dashboard, STATS_VAZIAS
+from services.exportacao_jobs import obter_job_exportacao
+from services.busca import buscar_registros, LIMITE_BUSCA_PADRAO, LIMITE_BUSCA_MAXIMO
+from services.anexos import (
+    ErroUpload,
+    iniciar_upload,
+    receber_parte,
+    concluir_upload,
+    cancelar_upload,
+    dados_upload
+)
+from urllib.parse import quote, unquote
 import os
 import pandas as pd
-from models import db, Cotacao, PesquisaMercado
+from models import db, Cotacao, PesquisaMercado, Anexo, UploadParcial
 
 # Blueprint com nome 'routes' para manter compatibilidade com templates
 main_routes = Blueprint('routes', __name__)
 
+# Tempo (segundos) que o navegador pode reutilizar /api/filiais sem revalidar
+FILIAIS_CACHE_MAX_AGE = 3600
+# O conteúdo de um anexo nunca muda (o id aponta sempre para o mesmo hash)
+ANEXOS_CACHE_MAX_AGE = 86400
+MODOS_DOWNLOAD_ACELERADO = ('x-sendfile', 'x-accel-redirect')
+
 @main_routes.route('/', endpoint='index')
 def index():
     return render_template('index.html')
@@ -16,41 +45,218 @@ def index():
 def dashboard_stats():
     """Retorna contadores para os cards do dashboard"""
     try:
-        stats = {
-            'andamento': Cotacao.query.filter(Cotacao.status.in_(['Análise Comercial', 'Análise Suprimentos'])).count(),
-            'pesquisas': PesquisaMercado.query.filter_by(status='Análise Comercial').count(),
-            'finalizadas': Cotacao.query.filter_by(status='Liberado para Venda').count(),
-            'pesquisas_finalizadas': PesquisaMercado.query.filter_by(status='Liberado para Venda').count(),
-            'perdidas': Cotacao.query.filter_by(status='Cotação Perdida').count()
-        }
+        stats = obter_estatisticas_dashboard()
         return jsonify(stats)
     except Exception as e:
         print(f"Erro ao carregar stats: {e}")
+        return jsonify(STATS_VAZIAS)
+
+@main_routes.route('/api/search', methods=['POST'])
+def busca_global():
+    """Busca full-text em cotações (inclusive produtos e fornecedores) e pesquisas, por relevância"""
+    data = request.get_json(silent=True) or {}
+    termo = (data.get('query') or '').strip()
+    tipo = data.get('tipo') or None
+    status = data.get('status') or None
+    if tipo in ('todos', 'all'):
+        tipo = None
+    if status in ('todos', 'all'):
+        status = None
+    if tipo not in (None, 'cotacao', 'pesquisa'):
+        return jsonify({'success': False, 'error': f'Tipo inválido: {tipo}'}), 400
+    try:
+        limite = max(1, min(int(data.get('limite', LIMITE_BUSCA_PADRAO)), LIMITE_BUSCA_MAXIMO))
+        pagina = max(1, int(data.get('pagina', 1)))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'Parâmetros de paginação inválidos'}), 400
+    if not termo:
+        return jsonify({'success': True, 'results': [], 'pagina': pagina, 'proxima_pagina': None})
+
+    try:
+        encontrados, tem_mais = buscar_registros(termo, tipo, status, limite, pagina)
+        # Carregar os registros da página com uma consulta por tipo
+        ids_por_tipo = {'cotacao': [], 'pesquisa': []}
+        for tipo_registro, registro_id, _ in encontrados:
+            ids_por_tipo[tipo_registro].append(registro_id)
+        registros = {}
+        for tipo_registro, modelo in (('cotacao', Cotacao), ('pesquisa', PesquisaMercado)):
+            if ids_por_tipo[tipo_registro]:
+                for registro in modelo.query.filter(modelo.id.in_(ids_por_tipo[tipo_registro])):
+                    registros[(tipo_registro, registro.id)] = registro
+
+        resultados = []
+        for tipo_registro, registro_id, score in encontrados:
+            registro = registros.get((tipo_registro, registro_id))
+            if registro is None:
+                continue
+            resultados.append({
+                'tipo': tipo_registro,
+                'id': registro.id,
+                'data': registro.data.strftime('%d/%m/%Y') if registro.data else None,
+                'filial': registro.nome_filial,
+                'nome_cooperado': registro.nome_cooperado,
+                'matricula_cooperado': registro.matricula_cooperado,
+                'status': registro.status,
+                'score': score
+            })
         return jsonify({
-            'andamento': 0,
-            'pesquisas': 0,
-            'finalizadas': 0,
-            'pesquisas_finalizadas': 0,
-            'perdidas': 0
+            'success': True,
+            'results': resultados,
+            'pagina': pagina,
+            'proxima_pagina': pagina + 1 if tem_mais else None
         })
+    except Exception as e:
+        print(f"Erro na busca: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def enviar_arquivo(caminho, download_name=None, etag=True, max_age=None):
+    """
+    Resposta de download com ETag/Last-Modified (304 Not Modified) e Range
+    (206 Partial Content). Com DOWNLOAD_ACELERADO configurado, o corpo é
+    entregue pelo servidor web (X-Sendfile/X-Accel-Redirect), que também
+    atende o Range; a aplicação responde apenas os cabeçalhos e o 304.
+
+    Args:
+        caminho: Caminho do arquivo (relativo à pasta da aplicação ou absoluto)
+        download_name: Nome sugerido ao navegador (padrão: nome do arquivo)
+        etag: ETag a usar ou True para gerar pelo tamanho/data do arquivo
+        max_age: Segundos de cache privado no navegador (None: sempre revalidar)
+
+    Returns:
+        Response; 404 se o arquivo não existir
+    """
+    modo = current_app.config.get('DOWNLOAD_ACELERADO')
+    acelerado = modo in MODOS_DOWNLOAD_ACELERADO
+    caminho = os.path.abspath(caminho)
+    try:
+        resposta = send_file(
+            caminho, request.environ, download_name=download_name, as_attachment=True,
+            conditional=not acelerado, etag=etag, max_age=max_age,
+            use_x_sendfile=acelerado, response_class=current_app.response_class
+        )
+    except (FileNotFoundError, IsADirectoryError):
+        abort(404, description='Arquivo não encontrado.')
+
+    if acelerado:
+        resposta = resposta.make_conditional(request)
+        if resposta.status_code == 304:
+            resposta.headers.pop('X-Sendfile', None)
+        elif modo == 'x-accel-redirect':
+            interno = os.path.relpath(caminho, os.getcwd()).replace(os.sep, '/')
+            prefixo = current_app.config.get('DOWNLOAD_X_ACCEL_PREFIXO', '/arquivos-internos/')
+            resposta.headers['X-Accel-Redirect'] = prefixo.rstrip('/') + '/' + quote(interno)
+            resposta.headers.pop('X-Sendfile', None)
+    if max_age:
+        # Anexos são documentos internos: cache só no navegador, nunca em proxies
+        resposta.cache_control.public = False
+        resposta.cache_control.private = True
+    return resposta
 
 @main_routes.route('/download/<path:filename>')
 def download_file(filename):
     filename = unquote(filename)
     filename = filename.replace('\\', '/').replace('..', '')
-    uploads_path = os.path.join('uploads', filename)
-    cotacoes_path = os.path.join('exports', filename)
-    if os.path.isfile(uploads_path):
-        return send_file(uploads_path, as_attachment=True)
-    elif os.path.isfile(cotacoes_path):
-        return send_file(cotacoes_path, as_attachment=True)
-    else:
+    # Um único stat por pasta: o próprio envio detecta o arquivo inexistente
+    for pasta in ('uploads', 'exports'):
+        try:
+            return enviar_arquivo(os.path.join(pasta, filename))
+        except NotFound:
+            continue
+    abort(404, description='Arquivo não encontrado.')
+
+@main_routes.route('/anexos/<int:id>')
+def download_anexo(id):
+    """Conteúdo do anexo (armazenado pelo hash) com o nome original do arquivo"""
+    anexo = db.session.get(Anexo, id)
+    if anexo is None:
         abort(404, description='Arquivo não encontrado.')
+    # O hash do conteúdo é um ETag forte que não depende da data do arquivo
+    return enviar_arquivo(anexo.filepath, download_name=anexo.filename,
+                          etag=anexo.sha256 or True, max_age=ANEXOS_CACHE_MAX_AGE)
+
+# ===== UPLOAD DE ANEXOS EM PARTES =====
+# POST /api/uploads {filename, tamanho, cotacao_id|pesquisa_id} inicia; cada parte
+# vai no corpo de PUT /api/uploads/<id>?posicao=<byte inicial>; GET informa quantos
+# bytes já chegaram (para retomar) e POST /api/uploads/<id>/concluir cria o anexo.
+
+def _erro_upload(e):
+    return jsonify({'success': False, 'error': str(e), **e.detalhes}), e.status
+
+def _obter_upload(upload_id):
+    upload = db.session.get(UploadParcial, upload_id)
+    if upload is None:
+        abort(404, description='Upload não encontrado.')
+    return upload
+
+@main_routes.route('/api/uploads', methods=['POST'])
+def iniciar_upload_parcial():
+    dados = request.get_json(silent=True) or {}
+    try:
+        upload = iniciar_upload(dados.get('filename'), dados.get('tamanho'),
+                                cotacao_id=dados.get('cotacao_id'), pesquisa_id=dados.get('pesquisa_id'))
+    except ErroUpload as e:
+        return _erro_upload(e)
+    return jsonify({'success': True, **dados_upload(upload)}), 201
+
+@main_routes.route('/api/uploads/<upload_id>', methods=['GET'])
+def status_upload_parcial(upload_id):
+    return jsonify({'success': True, **dados_upload(_obter_upload(upload_id))})
+
+@main_routes.route('/api/uploads/<upload_id>', methods=['PUT'])
+def enviar_parte_upload(upload_id):
+    upload = _obter_upload(upload_id)
+    posicao = request.args.get('posicao', type=int)
+    if posicao is None or posicao < 0:
+        return jsonify({'success': False, 'error': 'Informe a posição da parte (?posicao=)'}), 400
+    try:
+        recebido = receber_parte(upload, posicao, request.stream, request.content_length)
+    except ErroUpload as e:
+        return _erro_upload(e)
+    return jsonify({'success': True, 'recebido': recebido, 'completo': recebido == upload.tamanho})
+
+@main_routes.route('/api/uploads/<upload_id>/concluir', methods=['POST'])
+def concluir_upload_parcial(upload_id):
+    upload = _obter_upload(upload_id)
+    try:
+        anexo = concluir_upload(upload)
+    except ErroUpload as e:
+        db.session.rollback()
+        return _erro_upload(e)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Erro ao concluir upload {upload_id}: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+    return jsonify({'success': True, 'anexo': anexo.to_dict()}), 201
+
+@main_routes.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def cancelar_upload_parcial(upload_id):
+    cancelar_upload(_obter_upload(upload_id))
+    return '', 204
+
+@main_routes.route('/api/exportacoes/<job_id>')
+def status_exportacao(job_id):
+    """Progresso de uma exportação assíncrona; quando concluída, traz o caminho para /download"""
+    job = obter_job_exportacao(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Exportação não encontrada'}), 404
+    return jsonify({'success': True, **job.to_dict()})
 
 @main_routes.route('/api/filiais', methods=['GET'])
 def get_filiais():
-    opcoes = carregar_filiais_mesoregioes()
-    return jsonify(opcoes)
+    # JSON pré-serializado no cache; o navegador revalida com If-None-Match e recebe 304
+    conteudo, etag = obter_filiais_serializadas()
+    if conteudo is None:
+        return jsonify({'error': 'Não foi possível carregar as filiais'}), 500
+    resposta = Response(conteudo, mimetype='application/json')
+    resposta.set_etag(etag)
+    resposta.cache_control.public = True
+    resposta.cache_control.max_age = FILIAIS_CACHE_MAX_AGE
+    return resposta.make_conditional(request)
+
+@main_routes.route('/api/dados-mestres/versao')
+def versao_dados_mestres():
+    """Retorna a versão das planilhas de dados mestres carregadas neste processo"""
+    return jsonify(obter_versao_dados_mestres())
 
 @main_routes.route('/api/produtos/buscar')
 def buscar_produto():
@@ -64,33 +270,28 @@ def buscar_produto():
     try:
         # Busca por código
         if codigo:
-            # Buscar exato primeiro (convertendo para string para garantir)
-            resultado = df[df['Código do produto'].astype(str) == str(codigo)]
-            if not resultado.empty:
-                prod = resultado.iloc[0]
+            # Busca exata no índice em memória (sem varrer o DataFrame)
+            nome_produto = buscar_produto_por_codigo(codigo)
+            if nome_produto is not None:
                 return jsonify({
                     'success': True,
                     'tipo_busca': 'codigo',
-                    'nome': prod['Nome do produto'],
-                    'codigo': prod['Código do produto']
+                    'nome': nome_produto,
+                    'codigo': str(codigo).strip()
                 })
             else:
                 return jsonify({'success': False, 'error': 'Produto não encontrado'})
                 
         # Busca por nome
         elif nome:
-            # Filtrar (case insensitive)
-            mask = df['Nome do produto'].astype(str).str.contains(nome, case=False, regex=False, na=False)
-            resultados = df[mask]
+            # Índice de prefixos sem acentos: retorna os 10 mais relevantes sem varrer a planilha
+            resultados = buscar_produtos_por_nome(nome, limite=10)
             
-            if not resultados.empty:
-                # Limitar a 10 resultados para performance
-                lista_resultados = []
-                for _, row in resultados.head(10).iterrows():
-                    lista_resultados.append({
-                        'nome': row['Nome do produto'],
-                        'codigo': row['Código do produto']
-                    })
+            if resultados:
+                lista_resultados = [
+                    {'nome': nome_produto, 'codigo': codigo_produto}
+                    for nome_produto, codigo_produto in resultados
+                ]
                     
                 return jsonify({
                     'success': True,
@@ -121,30 +322,28 @@ def buscar_cooperado():
     try:
         # Busca por matrícula
         if matricula:
-            resultado = df[df['Matricula'].astype(str) == str(matricula)]
-            if not resultado.empty:
-                conta = resultado.iloc[0]
+            # Busca exata no índice em memória (sem varrer o DataFrame)
+            nome_conta = buscar_conta_por_matricula(matricula)
+            if nome_conta is not None:
                 return jsonify({
                     'success': True,
                     'tipo_busca': 'matricula',
-                    'nome': conta['Nome da conta'],
-                    'matricula': conta['Matricula']
+                    'nome': nome_conta,
+                    'matricula': str(matricula).strip()
                 })
             else:
                 return jsonify({'success': False, 'error': 'Cooperado não encontrado'})
                 
         # Busca por nome
         elif nome:
-            mask = df['Nome da conta'].astype(str).str.contains(nome, case=False, regex=False, na=False)
-            resultados = df[mask]
+            # Índice de prefixos sem acentos: retorna os 10 mais relevantes sem varrer a planilha
+            resultados = buscar_contas_por_nome(nome, limite=10)
             
-            if not resultados.empty:
-                lista_resultados = []
-                for _, row in resultados.head(10).iterrows():
-                    lista_resultados.append({
-                        'nome': row['Nome da conta'],
-                        'matricula': row['Matricula']
-                    })
+            if resultados:
+                lista_resultados = [
+                    {'nome': nome_conta, 'matricula': matricula_conta}
+                    for nome_conta, matricula_conta in resultados
+                ]
                     
                 return jsonify({
                     'success': True,
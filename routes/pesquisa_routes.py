@@ -1,14 +1,18 @@
-from flask import Blueprint, render_template, request, jsonify
-from models import db, PesquisaMercado, Anexo, MAX_ANEXOS
-from services.utils import exportar_para_excel
+from flask import Blueprint, Response, render_template, request, jsonify, stream_with_context
+from models import db, PesquisaMercado, Anexo, carregar_relacionamentos_pesquisa
+from services.utils import exportar_para_excel, criar_filtro_busca_registro
+from services.paginacao import ler_parametros_paginacao, paginar_keyset
+from services.exportacao_jobs import criar_job_exportacao
+from services.exportacao import gerar_exportacao_texto, FORMATOS_TEXTO
+from services.exclusao import excluir_pesquisas_em_lote
+from services.importacao import importar_planilha, EXTENSOES_IMPORTACAO
+from services.anexos import salvar_anexos, EXTENSOES_ANEXO
 from datetime import datetime
-import os
 import pytz
-from werkzeug.utils import secure_filename
 import json
 import traceback
-import threading
-from services.email_service import enviar_email, obter_email_por_status
+from services.email_service import enfileirar_email, notificar_worker_email, obter_email_por_status
+from services.estatisticas import invalidar_estatisticas_dashboard
 
 pesquisa_routes = Blueprint('pesquisa_routes', __name__)
 
@@ -20,7 +24,7 @@ PESQUISA_STATUS_OPTIONS = [
 TZ_SP = pytz.timezone('America/Sao_Paulo')
 
 # Extensões de arquivo permitidas
-ALLOWED_EXTENSIONS = {'pdf', 'doc', 'docx', 'xls', 'xlsx', 'csv', 'txt', 'jpg', 'jpeg', 'png'}
+ALLOWED_EXTENSIONS = EXTENSOES_ANEXO
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -152,53 +156,20 @@ def criar_pesquisa():
         
         # Processar anexos (múltiplos arquivos)
         arquivos = request.files.getlist('anexos[]') or request.files.getlist('anexo')
-        if arquivos:
-            anexos_existentes = len(pesquisa.anexos) if pesquisa_id else 0
-            
-            for arquivo in arquivos:
-                if arquivo and arquivo.filename and allowed_file(arquivo.filename):
-                    # Verificar limite
-                    if anexos_existentes >= MAX_ANEXOS:
-                        break
-                    
-                    filename = secure_filename(arquivo.filename)
-                    uploads_dir = os.path.join(os.getcwd(), 'uploads')
-                    os.makedirs(uploads_dir, exist_ok=True)
-                    filepath = os.path.join('uploads', filename)
-                    arquivo.save(os.path.join(uploads_dir, filename))
-                    
-                    # Criar registro de anexo
-                    anexo = Anexo(
-                        filename=filename,
-                        filepath=filepath,
-                        pesquisa_id=pesquisa.id
-                    )
-                    db.session.add(anexo)
-                    anexos_existentes += 1
+        salvar_anexos(arquivos, len(pesquisa.anexos) if pesquisa_id else 0, allowed_file, pesquisa_id=pesquisa.id)
         
+        # E-mail para o departamento correto: gravado na fila na mesma transação
+        # e enviado pelo worker de e-mails após o commit
+        is_new = not pesquisa_id
+        enfileirar_email(
+            obter_email_por_status(pesquisa.status),
+            assunto='Nova Pesquisa Criada' if is_new else 'Pesquisa Atualizada',
+            corpo_html=f'<p>Uma pesquisa foi {"criada" if is_new else "atualizada"} para o cooperado {pesquisa.nome_cooperado} (ID {pesquisa.id}). Status: {pesquisa.status}.</p>',
+            chave=f'pesquisa:{pesquisa.id}'
+        )
         db.session.commit()
-        
-        # Enviar e-mail para o departamento correto (em background para não bloquear)
-        # Capturar valores antes de iniciar a thread para evitar erro de contexto
-        email_status = pesquisa.status
-        email_nome_cooperado = pesquisa.nome_cooperado
-        email_pesquisa_id = pesquisa.id
-        email_is_new = not pesquisa_id
-        
-        def enviar_email_background(status, nome_cooperado, pid, is_new):
-            try:
-                destinatario = obter_email_por_status(status)
-                destinatarios = destinatario if isinstance(destinatario, list) else [destinatario]
-                enviar_email(
-                    destinatarios=destinatarios,
-                    assunto='Nova Pesquisa Criada' if is_new else 'Pesquisa Atualizada',
-                    corpo_html=f'<p>Uma pesquisa foi {"criada" if is_new else "atualizada"} para o cooperado {nome_cooperado} (ID {pid}). Status: {status}.</p>'
-                )
-            except Exception as e:
-                print('Erro ao enviar e-mail automático:', e)
-        
-        # Executar envio de e-mail em thread separada
-        threading.Thread(target=enviar_email_background, args=(email_status, email_nome_cooperado, email_pesquisa_id, email_is_new), daemon=True).start()
+        invalidar_estatisticas_dashboard()
+        notificar_worker_email()
         
         return jsonify({'id': pesquisa.id})
     except Exception as e:
@@ -206,22 +177,66 @@ def criar_pesquisa():
         traceback.print_exc()
         return jsonify({'error': f'Erro ao salvar pesquisa: {str(e)}'}), 400
 
+def filtrar_pesquisas_por_status(query, status):
+    """Aplica o filtro de status de cada aba do dashboard; retorna None para status desconhecido"""
+    if status == 'pesquisa':
+        return query.filter_by(status='Análise Comercial')
+    elif status == 'finalizadas':
+        return query.filter_by(status='Liberado para Venda')
+    return None
+
+@pesquisa_routes.route('/api/pesquisas/<status>/exportar/<formato>')
+def exportar_pesquisas_texto(status, formato):
+    """Exporta as pesquisas da aba em CSV ou NDJSON, em streaming"""
+    if formato not in FORMATOS_TEXTO:
+        return jsonify({'success': False, 'error': 'Formato deve ser csv ou ndjson'}), 400
+    query = filtrar_pesquisas_por_status(PesquisaMercado.query, status)
+    if query is None:
+        return jsonify({'success': False, 'error': f'Status inválido: {status}'}), 400
+    filtro_busca = criar_filtro_busca_registro(PesquisaMercado, request.args.get('busca'), request.args.get('busca_por'))
+    if filtro_busca is not None:
+        query = query.filter(filtro_busca)
+    filename = f"Pesquisas_{status}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{formato}"
+    return Response(
+        stream_with_context(gerar_exportacao_texto(query, PesquisaMercado, formato)),
+        content_type=FORMATOS_TEXTO[formato],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
 @pesquisa_routes.route('/api/pesquisas/<status>', methods=['GET'])
 def listar_pesquisas(status):
+    # Paginação por cursor: ?limite=50&cursor=...&ordenar_por=id&ordem=desc
+    # (sem parâmetros, a primeira página com o tamanho padrão)
     try:
-        if status == 'pesquisa':
-            pesquisas = PesquisaMercado.query.filter_by(status='Análise Comercial').all()
-        elif status == 'finalizadas':
-            pesquisas = PesquisaMercado.query.filter_by(status='Liberado para Venda').all()
-        else:
-            return jsonify([])
+        paginacao = ler_parametros_paginacao(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        # Anexos carregados em lote: número fixo de consultas por listagem
+        query = filtrar_pesquisas_por_status(PesquisaMercado.query.options(*carregar_relacionamentos_pesquisa()), status)
+        if query is None:
+            return jsonify({'itens': [], 'proximo_cursor': None, 'limite': paginacao['limite']})
+        # Busca opcional por id, matrícula ou início do nome do cooperado (?busca=&busca_por=)
+        filtro_busca = criar_filtro_busca_registro(PesquisaMercado, request.args.get('busca'), request.args.get('busca_por'))
+        if filtro_busca is not None:
+            query = query.filter(filtro_busca)
+
+        pesquisas, proximo_cursor = paginar_keyset(query, PesquisaMercado, **paginacao)
+
         for pesquisa in pesquisas:
             if not hasattr(pesquisa, 'data_ultima_modificacao'):
                 pesquisa.data_ultima_modificacao = pesquisa.data_entrada_status
-        return jsonify([pesquisa.to_dict() for pesquisa in pesquisas])
+        return jsonify({
+            'itens': [pesquisa.to_dict() for pesquisa in pesquisas],
+            'proximo_cursor': proximo_cursor,
+            'limite': paginacao['limite']
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Erro ao listar pesquisas: {str(e)}")
-        return jsonify([])
+        return jsonify({'itens': [], 'proximo_cursor': None, 'limite': paginacao['limite']})
 
 @pesquisa_routes.route('/api/pesquisas/<int:id>', methods=['PUT'])
 def atualizar_pesquisa(id):
@@ -305,53 +320,20 @@ def atualizar_pesquisa(id):
         
         # Processar anexos (múltiplos arquivos)
         arquivos = request.files.getlist('anexos[]') or request.files.getlist('anexo')
-        if arquivos:
-            anexos_existentes = len(pesquisa.anexos)
-            
-            for arquivo in arquivos:
-                if arquivo and arquivo.filename and allowed_file(arquivo.filename):
-                    # Verificar limite
-                    if anexos_existentes >= MAX_ANEXOS:
-                        break
-                    
-                    filename = secure_filename(arquivo.filename)
-                    uploads_dir = os.path.join(os.getcwd(), 'uploads')
-                    os.makedirs(uploads_dir, exist_ok=True)
-                    filepath = os.path.join('uploads', filename)
-                    arquivo.save(os.path.join(uploads_dir, filename))
-                    
-                    # Criar registro de anexo
-                    anexo = Anexo(
-                        filename=filename,
-                        filepath=filepath,
-                        pesquisa_id=pesquisa.id
-                    )
-                    db.session.add(anexo)
-                    anexos_existentes += 1
+        salvar_anexos(arquivos, len(pesquisa.anexos), allowed_file, pesquisa_id=pesquisa.id)
         
         pesquisa.data_ultima_modificacao = datetime.now(TZ_SP)
+        # E-mail para o departamento correto: gravado na fila na mesma transação
+        # e enviado pelo worker de e-mails após o commit
+        enfileirar_email(
+            obter_email_por_status(pesquisa.status),
+            assunto='Pesquisa Atualizada',
+            corpo_html=f'<p>A pesquisa de ID {pesquisa.id} do cooperado {pesquisa.nome_cooperado} foi atualizada. Status: {pesquisa.status}.</p>',
+            chave=f'pesquisa:{pesquisa.id}'
+        )
         db.session.commit()
-        
-        # Enviar e-mail para o departamento correto (em background para não bloquear)
-        # Capturar valores antes de iniciar a thread para evitar erro de contexto
-        email_status = pesquisa.status
-        email_nome_cooperado = pesquisa.nome_cooperado
-        email_pesquisa_id = pesquisa.id
-        
-        def enviar_email_background(status, nome_cooperado, pid):
-            try:
-                destinatario = obter_email_por_status(status)
-                destinatarios = destinatario if isinstance(destinatario, list) else [destinatario]
-                enviar_email(
-                    destinatarios=destinatarios,
-                    assunto='Pesquisa Atualizada',
-                    corpo_html=f'<p>A pesquisa de ID {pid} do cooperado {nome_cooperado} foi atualizada. Status: {status}.</p>'
-                )
-            except Exception as e:
-                print('Erro ao enviar e-mail automático:', e)
-        
-        # Executar envio de e-mail em thread separada
-        threading.Thread(target=enviar_email_background, args=(email_status, email_nome_cooperado, email_pesquisa_id), daemon=True).start()
+        invalidar_estatisticas_dashboard()
+        notificar_worker_email()
         
         return jsonify(pesquisa.to_dict())
     except Exception as e:
@@ -364,8 +346,37 @@ def excluir_pesquisa(id):
     pesquisa = PesquisaMercado.query.get_or_404(id)
     db.session.delete(pesquisa)
     db.session.commit()
+    invalidar_estatisticas_dashboard()
     return '', 204
 
+@pesquisa_routes.route('/api/pesquisas/excluir', methods=['POST'])
+def excluir_multiplas_pesquisas():
+    ids = request.json.get('ids', [])
+    if not isinstance(ids, list):
+        return jsonify({'success': False, 'error': 'Lista de ids inválida'}), 400
+    try:
+        excluidas = excluir_pesquisas_em_lote(ids)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    invalidar_estatisticas_dashboard()
+    return jsonify({'success': True, 'excluidas': excluidas})
+
+@pesquisa_routes.route('/api/pesquisas/importar', methods=['POST'])
+def importar_pesquisas():
+    """Importa pesquisas de uma planilha CSV/XLSX (campo arquivo) e devolve o relatório por linha"""
+    arquivo = request.files.get('arquivo')
+    if not arquivo or not arquivo.filename:
+        return jsonify({'success': False, 'error': 'Nenhum arquivo enviado'}), 400
+    extensao = arquivo.filename.rsplit('.', 1)[-1].lower()
+    if extensao not in EXTENSOES_IMPORTACAO:
+        return jsonify({'success': False, 'error': 'Formato não suportado. Use CSV ou XLSX.'}), 400
+    try:
+        relatorio = importar_planilha(arquivo.stream, extensao, 'pesquisa')
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': f'Erro ao ler a planilha: {str(e)}'}), 400
+    return jsonify(dict(relatorio, success=True))
+
 @pesquisa_routes.route('/pesquisa/<int:id>')
 def editar_pesquisa(id):
     pesquisa = PesquisaMercado.query.get_or_404(id)
@@ -384,16 +395,15 @@ def exportar_pesquisa(id):
 
 @pesquisa_routes.route('/api/pesquisas/exportar', methods=['POST'])
 def exportar_multiplas_pesquisas():
+    """Agenda a exportação das pesquisas selecionadas; acompanhar em /api/exportacoes/<job_id>"""
     try:
         ids = request.json.get('ids', [])
         if not isinstance(ids, list) or not ids:
             return jsonify({'success': False, 'error': 'Nenhuma pesquisa selecionada'}), 400
-        pesquisas = [PesquisaMercado.query.get(pid) for pid in ids]
-        pesquisas = [p for p in pesquisas if p]
-        if not pesquisas:
-            return jsonify({'success': False, 'error': 'Pesquisas não encontradas'}), 404
-        filepath = exportar_para_excel(pesquisas)
-        return jsonify({'success': True, 'filepath': filepath})
+        job = criar_job_exportacao('pesquisa', ids)
+        return jsonify({'success': True, 'job_id': job.id, 'status': job.status}), 202
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         print(f"Erro na exportação de múltiplas pesquisas: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -403,14 +413,8 @@ def excluir_anexo(id):
     """Excluir um anexo específico"""
     try:
         anexo = Anexo.query.get_or_404(id)
-        
-        # Remover arquivo físico se existir
-        if anexo.filepath and os.path.exists(anexo.filepath):
-            try:
-                os.remove(anexo.filepath)
-            except OSError:
-                pass  # Ignorar erro ao remover arquivo
-        
+        # O arquivo é compartilhado por conteúdo: só sai do disco (após o commit)
+        # quando nenhum outro anexo aponta para ele
         db.session.delete(anexo)
         db.session.commit()
         return '', 204
@@ -3,6 +3,19 @@ from services.utils import (
     carregar_contas_cache,
     carregar_produtos_cache,
     carregar_filiais_mesoregioes,
-    exportar_para_excel
+    exportar_para_excel,
+    buscar_conta_por_matricula,
+    buscar_produto_por_codigo,
+    buscar_contas_por_nome,
+    buscar_produtos_por_nome,
+    recarregar_dados_mestres,
+    iniciar_monitor_dados_mestres,
+    obter_versao_dados_mestres,
+    obter_filiais_serializadas
 )
-from services.email_service import enviar_email, obter_email_por_status
+from services.email_service import enviar_email, obter_email_por_status, enfileirar_email, processar_fila_emails
+from services.paginacao import ler_parametros_paginacao, paginar_keyset
+from services.estatisticas import obter_estatisticas_dashboard, invalidar_estatisticas_dashboard
+from services.exportacao import exportar_query_para_excel
+from services.exclusao import excluir_cotacoes_em_lote, excluir_pesquisas_em_lote
+from services.busca import buscar_registros, indexar_registros, reconstruir_indice_busca
@@ -0,0 +1,527 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import delete, event, func, insert, select, update
+from sqlalchemy.orm import Session
+from config import Config
+from models import db, Anexo, ArquivoAnexo, Cotacao, PesquisaMercado, UploadParcial, MAX_ANEXOS
+
+try:
+    import fcntl
+except ImportError:  # Windows: vale apenas a trava dentro do processo
+    fcntl = None
+
+# ===== ARMAZENAMENTO DE ANEXOS POR CONTEÚDO =====
+# O arquivo enviado é gravado em uploads/tmp enquanto o SHA-256 é calculado
+# e depois guardado uma única vez em uploads/blobs/<2 primeiros>/<sha256>;
+# o nome original fica apenas em Anexo.filename. A tabela arquivos_anexos
+# conta quantos anexos apontam para cada conteúdo: o after_flush da sessão
+# soma os anexos novos e subtrai os excluídos (inclusive por cascade), e o
+# conteúdo sem referências é apagado na mesma transação. As operações em
+# disco acontecem com a linha de arquivos_anexos já bloqueada pela transação:
+#   - o blob novo só é movido para o lugar depois do UPDATE/INSERT da contagem
+#   - o blob liberado é renomeado para .removido e só é apagado após o commit
+#     (no rollback ele volta ao lugar)
+# Sobras de falhas (temporários, blobs sem linha) são removidas por
+# coletar_arquivos_orfaos, após um prazo de carência.
+#
+# Arquivos grandes podem ser enviados em partes (upload parcial): cada parte
+# é anexada a uploads/parciais/<id> sem abrir transação, o tamanho do arquivo
+# no disco indica de onde retomar após uma queda de conexão, e ao concluir o
+# arquivo vira um Anexo pelo mesmo caminho dos uploads comuns. Uma parte só
+# é gravada com o arquivo parcial travado (flock), então uma nova tentativa
+# que chega enquanto a requisição original ainda grava não anexa em dobro.
+
+DIRETORIO_BLOBS = os.path.join('uploads', 'blobs')
+DIRETORIO_TEMPORARIO = os.path.join('uploads', 'tmp')
+DIRETORIO_UPLOADS_PARCIAIS = os.path.join('uploads', 'parciais')
+TAMANHO_BLOCO_UPLOAD = 64 * 1024
+# Arquivos órfãos mais novos que isso podem pertencer a uma gravação em andamento
+CARENCIA_ARQUIVOS_ORFAOS = 3600
+
+SUFIXO_REMOVIDO = '.removido'
+
+EXTENSOES_ANEXO = {'pdf', 'doc', 'docx', 'xls', 'xlsx', 'csv', 'txt', 'jpg', 'jpeg', 'png'}
+
+# Chaves em session.info
+_PENDENTES = 'anexos_pendentes'   # sha256 -> [caminhos temporários]
+_REMOVIDOS = 'anexos_removidos'   # [(blob, caminho renomeado)]
+
+
+def caminho_blob(sha256):
+    """Caminho do conteúdo no disco a partir do hash"""
+    return os.path.join(DIRETORIO_BLOBS, sha256[:2], sha256)
+
+
+def extensao_permitida(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in EXTENSOES_ANEXO
+
+
+def nome_original(filename):
+    """Nome enviado pelo navegador sem diretórios (alguns enviam o caminho completo)"""
+    return os.path.basename((filename or '').replace('\\', '/')).strip()[:255]
+
+
+def novo_temporario():
+    """Caminho livre em uploads/tmp para receber um upload"""
+    os.makedirs(DIRETORIO_TEMPORARIO, exist_ok=True)
+    return os.path.join(DIRETORIO_TEMPORARIO, uuid.uuid4().hex)
+
+
+def gravar_temporario(stream):
+    """
+    Copia o stream para um arquivo temporário em blocos, calculando o SHA-256
+    durante a cópia (o arquivo nunca é lido inteiro em memória).
+
+    Args:
+        stream: Objeto com read() (ex.: FileStorage.stream)
+
+    Returns:
+        Tupla (sha256, tamanho, caminho temporário)
+    """
+    temporario = novo_temporario()
+    sha = hashlib.sha256()
+    tamanho = 0
+    try:
+        with open(temporario, 'wb') as destino:
+            while True:
+                bloco = stream.read(TAMANHO_BLOCO_UPLOAD)
+                if not bloco:
+                    break
+                sha.update(bloco)
+                destino.write(bloco)
+                tamanho += len(bloco)
+    except Exception:
+        _remover_arquivo(temporario)
+        raise
+    return sha.hexdigest(), tamanho, temporario
+
+
+def _hash_arquivo(caminho):
+    sha = hashlib.sha256()
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(TAMANHO_BLOCO_UPLOAD), b''):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+def criar_anexo(filename, sha256, tamanho, temporario, **dono):
+    """
+    Cria o Anexo para um conteúdo já gravado em arquivo temporário. O
+    temporário vira o blob (ou é descartado, se o conteúdo já existe) no flush.
+
+    Args:
+        filename: Nome original do arquivo
+        sha256, tamanho, temporario: Retorno de gravar_temporario
+        **dono: cotacao_id ou pesquisa_id
+
+    Returns:
+        Anexo adicionado à sessão
+    """
+    db.session.info.setdefault(_PENDENTES, {}).setdefault(sha256, []).append(temporario)
+    anexo = Anexo(filename=nome_original(filename), filepath=caminho_blob(sha256),
+                  sha256=sha256, tamanho=tamanho, **dono)
+    db.session.add(anexo)
+    return anexo
+
+
+def salvar_anexos(arquivos, existentes, permitido, **dono):
+    """
+    Grava os arquivos enviados como anexos, respeitando MAX_ANEXOS.
+
+    Args:
+        arquivos: Lista de FileStorage do request
+        existentes: Quantidade de anexos que o registro já possui
+        permitido: Função que valida o nome do arquivo (extensão)
+        **dono: cotacao_id ou pesquisa_id
+
+    Returns:
+        Lista dos Anexos criados
+    """
+    criados = []
+    for arquivo in arquivos:
+        if not (arquivo and arquivo.filename and permitido(arquivo.filename)):
+            continue
+        if existentes + len(criados) >= MAX_ANEXOS:
+            break
+        sha256, tamanho, temporario = gravar_temporario(arquivo.stream)
+        criados.append(criar_anexo(arquivo.filename, sha256, tamanho, temporario, **dono))
+    return criados
+
+
+def _remover_arquivo(caminho):
+    try:
+        os.remove(caminho)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"Aviso: não foi possível remover {caminho}: {e}")
+
+
+def _guardar_blob(session, sha256):
+    """Move o temporário pendente para o lugar do blob, se ele ainda não existir"""
+    temporarios = session.info.get(_PENDENTES, {}).pop(sha256, [])
+    destino = caminho_blob(sha256)
+    if temporarios and not os.path.exists(destino):
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        os.replace(temporarios.pop(), destino)
+    for temporario in temporarios:
+        _remover_arquivo(temporario)
+
+
+def _liberar_blob(session, sha256):
+    """Tira o blob do lugar; ele só é apagado de fato depois do commit"""
+    blob = caminho_blob(sha256)
+    if os.path.exists(blob):
+        removido = f'{blob}{SUFIXO_REMOVIDO}'
+        os.replace(blob, removido)
+        session.info.setdefault(_REMOVIDOS, []).append((blob, removido))
+
+
+def ajustar_referencias(session, deltas, tamanhos=None):
+    """
+    Aplica variações na contagem de referências dos conteúdos, na transação
+    da sessão. Conteúdos que chegam a zero referências são excluídos.
+    Necessário apenas em exclusões fora do ORM (DELETE em lote); as demais
+    são contadas automaticamente no flush.
+
+    Args:
+        session: Sessão com a transação em andamento
+        deltas: dict/Counter {sha256: variação}
+        tamanhos: dict {sha256: tamanho} para conteúdos novos
+    """
+    conn = session.connection()
+    tabela = ArquivoAnexo.__table__
+    for sha256, delta in sorted(deltas.items()):
+        if delta == 0:
+            continue
+        resultado = conn.execute(
+            update(tabela).where(tabela.c.sha256 == sha256)
+            .values(referencias=tabela.c.referencias + delta)
+        )
+        if delta > 0:
+            if resultado.rowcount == 0:
+                conn.execute(insert(tabela).values(
+                    sha256=sha256, caminho=caminho_blob(sha256),
+                    tamanho=(tamanhos or {}).get(sha256) or 0, referencias=delta))
+            _guardar_blob(session, sha256)
+        elif resultado.rowcount:
+            restantes = conn.execute(
+                select(tabela.c.referencias).where(tabela.c.sha256 == sha256)).scalar()
+            if restantes is not None and restantes <= 0:
+                conn.execute(delete(tabela).where(tabela.c.sha256 == sha256))
+                _liberar_blob(session, sha256)
+
+
+@event.listens_for(Session, 'after_flush')
+def _contar_referencias(session, flush_context):
+    deltas = Counter()
+    tamanhos = {}
+    for obj in session.new:
+        if isinstance(obj, Anexo) and obj.sha256:
+            deltas[obj.sha256] += 1
+            tamanhos[obj.sha256] = obj.tamanho
+    for obj in session.deleted:
+        if isinstance(obj, Anexo) and obj.sha256:
+            deltas[obj.sha256] -= 1
+    if deltas:
+        ajustar_referencias(session, deltas, tamanhos)
+
+
+@event.listens_for(Session, 'after_commit')
+def _concluir_arquivos(session):
+    for _blob, removido in session.info.pop(_REMOVIDOS, []):
+        _remover_arquivo(removido)
+    # Temporários de anexos que não chegaram a ser gravados
+    for temporarios in session.info.pop(_PENDENTES, {}).values():
+        for temporario in temporarios:
+            _remover_arquivo(temporario)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _desfazer_arquivos(session):
+    for blob, removido in reversed(session.info.pop(_REMOVIDOS, [])):
+        try:
+            if not os.path.exists(blob):
+                os.replace(removido, blob)
+            else:
+                _remover_arquivo(removido)
+        except OSError as e:
+            print(f"Aviso: não foi possível restaurar {blob}: {e}")
+    for temporarios in session.info.pop(_PENDENTES, {}).values():
+        for temporario in temporarios:
+            _remover_arquivo(temporario)
+
+
+def coletar_arquivos_orfaos(carencia=CARENCIA_ARQUIVOS_ORFAOS):
+    """
+    Apaga do disco blobs sem linha em arquivos_anexos e temporários
+    abandonados, ignorando arquivos modificados há menos de `carencia`
+    segundos (podem pertencer a uma gravação em andamento). Também
+    descarta os uploads parciais vencidos.
+
+    Returns:
+        Quantidade de arquivos removidos
+    """
+    removidos = descartar_uploads_expirados()
+    limite = time.time() - carencia
+    candidatos = {}
+    for diretorio in (DIRETORIO_BLOBS, DIRETORIO_TEMPORARIO):
+        for raiz, _dirs, arquivos in os.walk(diretorio):
+            for nome in arquivos:
+                caminho = os.path.join(raiz, nome)
+                try:
+                    if os.path.getmtime(caminho) < limite:
+                        candidatos[caminho] = nome
+                except OSError:
+                    continue
+
+    conhecidos = set()
+    shas = [nome for caminho, nome in candidatos.items()
+            if os.path.dirname(caminho) != DIRETORIO_TEMPORARIO and len(nome) == 64]
+    for inicio in range(0, len(shas), 500):
+        conhecidos.update(db.session.scalars(
+            select(ArquivoAnexo.sha256).where(ArquivoAnexo.sha256.in_(shas[inicio:inicio + 500]))))
+    db.session.rollback()
+
+    for caminho, nome in candidatos.items():
+        if nome not in conhecidos:
+            _remover_arquivo(caminho)
+            removidos += 1
+    return removidos
+
+
+# ===== UPLOAD EM PARTES =====
+
+class ErroUpload(ValueError):
+    """Requisição de upload parcial inválida; status é o código HTTP da resposta"""
+
+    def __init__(self, mensagem, status=400, **detalhes):
+        super().__init__(mensagem)
+        self.status = status
+        self.detalhes = detalhes
+
+
+def caminho_upload_parcial(upload_id):
+    return os.path.join(DIRETORIO_UPLOADS_PARCIAIS, upload_id)
+
+
+def bytes_recebidos(upload):
+    """Tamanho já gravado no disco: é a posição de onde o envio continua"""
+    try:
+        return os.path.getsize(caminho_upload_parcial(upload.id))
+    except OSError:
+        return 0
+
+
+_uploads_em_gravacao = set()
+_uploads_em_gravacao_lock = threading.Lock()
+
+
+@contextmanager
+def _travar_upload(caminho):
+    """
+    Abre o arquivo parcial para anexar com trava exclusiva (entre threads e,
+    com flock, entre processos). Se outra requisição estiver gravando neste
+    upload, levanta ErroUpload 409 em vez de esperar por ela.
+    """
+    chave = os.path.abspath(caminho)
+    with _uploads_em_gravacao_lock:
+        ocupado = chave in _uploads_em_gravacao
+        if not ocupado:
+            _uploads_em_gravacao.add(chave)
+    if ocupado:
+        raise ErroUpload('Outra requisição está gravando este upload', status=409)
+    try:
+        with open(caminho, 'ab') as destino:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(destino.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    raise ErroUpload('Outra requisição está gravando este upload', status=409)
+            yield destino  # A trava do flock é liberada ao fechar o arquivo
+    finally:
+        with _uploads_em_gravacao_lock:
+            _uploads_em_gravacao.discard(chave)
+
+
+def dados_upload(upload):
+    recebido = bytes_recebidos(upload)
+    return {
+        'upload_id': upload.id,
+        'filename': upload.filename,
+        'tamanho': upload.tamanho,
+        'recebido': recebido,
+        'tamanho_parte': Config.UPLOAD_TAMANHO_PARTE,
+        'completo': recebido == upload.tamanho,
+        'cotacao_id': upload.cotacao_id,
+        'pesquisa_id': upload.pesquisa_id
+    }
+
+
+def _conferir_limite_anexos(cotacao_id, pesquisa_id):
+    """Confere se o registro existe e ainda aceita anexos (MAX_ANEXOS)"""
+    if bool(cotacao_id) == bool(pesquisa_id):
+        raise ErroUpload('Informe cotacao_id ou pesquisa_id')
+    modelo, coluna, id_ = ((Cotacao, Anexo.cotacao_id, cotacao_id) if cotacao_id
+                           else (PesquisaMercado, Anexo.pesquisa_id, pesquisa_id))
+    if db.session.get(modelo, id_) is None:
+        raise ErroUpload('Registro não encontrado', status=404)
+    existentes = db.session.scalar(select(func.count()).select_from(Anexo).where(coluna == id_))
+    if existentes >= MAX_ANEXOS:
+        raise ErroUpload(f'Limite de {MAX_ANEXOS} anexos atingido', status=409)
+
+
+def iniciar_upload(filename, tamanho, cotacao_id=None, pesquisa_id=None):
+    """
+    Registra um upload em partes para uma cotação ou pesquisa.
+
+    Args:
+        filename: Nome original do arquivo
+        tamanho: Tamanho total em bytes
+        cotacao_id, pesquisa_id: Registro dono do anexo (apenas um)
+
+    Returns:
+        UploadParcial criado
+    """
+    filename = nome_original(filename)
+    if not filename or not extensao_permitida(filename):
+        raise ErroUpload('Tipo de arquivo não permitido')
+    try:
+        tamanho = int(tamanho)
+    except (TypeError, ValueError):
+        raise ErroUpload('Tamanho do arquivo inválido')
+    if tamanho <= 0:
+        raise ErroUpload('Tamanho do arquivo inválido')
+    if tamanho > Config.UPLOAD_TAMANHO_MAXIMO:
+        raise ErroUpload(f'Arquivo maior que o limite de {Config.UPLOAD_TAMANHO_MAXIMO // (1024 * 1024)} MB',
+                         status=413)
+    _conferir_limite_anexos(cotacao_id, pesquisa_id)
+
+    upload = UploadParcial(id=uuid.uuid4().hex, filename=filename, tamanho=tamanho,
+                           cotacao_id=cotacao_id or None, pesquisa_id=pesquisa_id or None)
+    os.makedirs(DIRETORIO_UPLOADS_PARCIAIS, exist_ok=True)
+    open(caminho_upload_parcial(upload.id), 'wb').close()
+    db.session.add(upload)
+    db.session.commit()
+    return upload
+
+
+def receber_parte(upload, posicao, stream, tamanho_parte):
+    """
+    Anexa uma parte ao arquivo do upload, lendo o corpo da requisição em
+    blocos (memória limitada a TAMANHO_BLOCO_UPLOAD por requisição). A parte
+    precisa começar exatamente onde o arquivo no disco termina; reenviar uma
+    parte já gravada por inteiro é aceito e ignorado. A posição é conferida
+    com o arquivo travado: duas requisições para o mesmo upload nunca gravam
+    ao mesmo tempo (a segunda recebe 409 e consulta de onde continuar).
+
+    Args:
+        upload: UploadParcial
+        posicao: Byte inicial da parte
+        stream: Corpo da requisição
+        tamanho_parte: Content-Length da parte
+
+    Returns:
+        Bytes recebidos até agora
+    """
+    caminho = caminho_upload_parcial(upload.id)
+    if not os.path.exists(caminho):
+        raise ErroUpload('Upload não encontrado', status=404)
+    if tamanho_parte is None:
+        raise ErroUpload('Informe o Content-Length da parte', status=411)
+    if tamanho_parte > Config.UPLOAD_TAMANHO_PARTE:
+        raise ErroUpload(f'Parte maior que {Config.UPLOAD_TAMANHO_PARTE} bytes', status=413)
+    with _travar_upload(caminho) as destino:
+        recebido = os.fstat(destino.fileno()).st_size
+        if posicao < recebido and posicao + tamanho_parte <= recebido:
+            return recebido  # Parte repetida (resposta anterior perdida)
+        if posicao != recebido:
+            raise ErroUpload('Posição fora de ordem', status=409, recebido=recebido)
+        if recebido + tamanho_parte > upload.tamanho:
+            raise ErroUpload('A parte ultrapassa o tamanho informado do arquivo', status=413)
+
+        restante = tamanho_parte
+        while restante > 0:
+            bloco = stream.read(min(TAMANHO_BLOCO_UPLOAD, restante))
+            if not bloco:
+                break  # Conexão interrompida: o que chegou fica gravado para retomar
+            destino.write(bloco)
+            restante -= len(bloco)
+    return bytes_recebidos(upload)
+
+
+def concluir_upload(upload):
+    """
+    Transforma o upload completo em um Anexo do registro (com deduplicação
+    por SHA-256), conferindo de novo o limite de MAX_ANEXOS.
+
+    Returns:
+        Anexo criado
+    """
+    recebido = bytes_recebidos(upload)
+    if recebido != upload.tamanho:
+        raise ErroUpload('Upload incompleto', status=409, recebido=recebido)
+    _conferir_limite_anexos(upload.cotacao_id, upload.pesquisa_id)
+    caminho = caminho_upload_parcial(upload.id)
+    sha256 = _hash_arquivo(caminho)
+    # O blob é criado a partir de um link para o arquivo parcial: se a
+    # transação falhar, o upload continua completo para uma nova tentativa
+    temporario = novo_temporario()
+    try:
+        os.link(caminho, temporario)
+    except OSError:
+        temporario = caminho  # Sistema de arquivos sem hard link: move o próprio arquivo
+    dono = ({'cotacao_id': upload.cotacao_id} if upload.cotacao_id
+            else {'pesquisa_id': upload.pesquisa_id})
+    anexo = criar_anexo(upload.filename, sha256, recebido, temporario, **dono)
+    db.session.delete(upload)
+    db.session.commit()
+    _remover_arquivo(caminho)
+    return anexo
+
+
+def cancelar_upload(upload):
+    db.session.delete(upload)
+    db.session.commit()
+    _remover_arquivo(caminho_upload_parcial(upload.id))
+
+
+def descartar_uploads_expirados():
+    """
+    Remove uploads parciais sem parte recebida há mais de
+    UPLOAD_VALIDADE_HORAS, e arquivos parciais sem registro.
+
+    Returns:
+        Quantidade de arquivos removidos
+    """
+    limite = datetime.now() - timedelta(hours=Config.UPLOAD_VALIDADE_HORAS)
+    vencidos = []
+    for upload in db.session.scalars(select(UploadParcial).where(UploadParcial.data_criacao < limite)).all():
+        caminho = caminho_upload_parcial(upload.id)
+        try:
+            ativo = datetime.fromtimestamp(os.path.getmtime(caminho)) >= limite
+        except OSError:
+            ativo = False
+        if not ativo:
+            db.session.delete(upload)
+            vencidos.append(caminho)
+    db.session.commit()
+    for caminho in vencidos:
+        _remover_arquivo(caminho)
+    removidos = len(vencidos)
+
+    if os.path.isdir(DIRETORIO_UPLOADS_PARCIAIS):
+        ids = set(db.session.scalars(select(UploadParcial.id)))
+        for nome in os.listdir(DIRETORIO_UPLOADS_PARCIAIS):
+            caminho = os.path.join(DIRETORIO_UPLOADS_PARCIAIS, nome)
+            if nome not in ids and datetime.fromtimestamp(os.path.getmtime(caminho)) < limite:
+                _remover_arquivo(caminho)
+                removidos += 1
+        db.session.rollback()
+    return removidos
@@ -0,0 +1,297 @@
+from itertools import chain
+from sqlalchemy import event, inspect, select, text
+from sqlalchemy.orm import Session
+from models import db, Cotacao, ProdutoCotacao, PesquisaMercado
+from services.utils import normalizar_texto
+
+# ===== ÍNDICE DE BUSCA FULL-TEXT =====
+# Uma única tabela indice_busca guarda, por cotação/pesquisa, o texto
+# normalizado (normalizar_texto) dos campos pesquisáveis:
+#   - SQLite: tabela virtual FTS5, ranqueada por bm25
+#   - MySQL: tabela InnoDB com índice FULLTEXT (MATCH ... AGAINST em modo booleano)
+#   - outros bancos (ou SQLite sem FTS5): tabela comum com LIKE, sem ranking
+# A chave de cada linha é registro_id * 2 + código do tipo, então atualizar ou
+# remover um registro é uma busca pela chave primária (rowid no FTS5).
+# O índice é atualizado no after_flush da sessão, na mesma transação da gravação.
+
+TABELA_BUSCA = 'indice_busca'
+TIPOS_BUSCA = {'cotacao': 0, 'pesquisa': 1}
+LIMITE_BUSCA_PADRAO = 50
+LIMITE_BUSCA_MAXIMO = 200
+# Termos além desse número são ignorados (consultas enormes não melhoram o ranking)
+MAX_TERMOS_BUSCA = 8
+TAMANHO_BLOCO_INDICE = 500
+# FTS5: termos muito comuns casam com quase todo o índice e o bm25 teria de
+# pontuar todas as linhas; só as ocorrências com as maiores chaves (rowid) são
+# ranqueadas e as demais vêm depois delas, por chave decrescente (nenhuma é
+# descartada). A chave é registro_id * 2 + tipo: a janela pega os ids mais altos
+# de cotações e pesquisas misturados pelo id, não pela data do registro, e
+# reindexar um registro não muda a sua posição
+JANELA_RANKING_FTS = 2000
+
+_estado = {'backend': None}  # 'fts5', 'fulltext', 'like' ou None (índice indisponível)
+
+_DDL_BUSCA = {
+    'fts5': f"""CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA_BUSCA} USING fts5(
+        tipo UNINDEXED, registro_id UNINDEXED, status UNINDEXED, conteudo,
+        tokenize = 'unicode61', prefix = '2 3')""",
+    'fulltext': f"""CREATE TABLE IF NOT EXISTS {TABELA_BUSCA} (
+        id BIGINT NOT NULL PRIMARY KEY,
+        tipo VARCHAR(20) NOT NULL,
+        registro_id INT NOT NULL,
+        status VARCHAR(50),
+        conteudo TEXT NOT NULL,
+        FULLTEXT KEY ft_{TABELA_BUSCA}_conteudo (conteudo)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+    'like': f"""CREATE TABLE IF NOT EXISTS {TABELA_BUSCA} (
+        id BIGINT NOT NULL PRIMARY KEY,
+        tipo VARCHAR(20) NOT NULL,
+        registro_id INTEGER NOT NULL,
+        status VARCHAR(50),
+        conteudo TEXT NOT NULL
+    )"""
+}
+
+
+def _detectar_backend(conn):
+    dialeto = conn.dialect.name
+    if dialeto == 'mysql':
+        return 'fulltext'
+    if dialeto == 'sqlite':
+        opcoes = {linha[0] for linha in conn.execute(text('PRAGMA compile_options'))}
+        if 'ENABLE_FTS5' in opcoes:
+            return 'fts5'
+    return 'like'
+
+
+def _coluna_chave():
+    return 'rowid' if _estado['backend'] == 'fts5' else 'id'
+
+
+def _chave(tipo, registro_id):
+    return registro_id * 2 + TIPOS_BUSCA[tipo]
+
+
+def _juntar(*valores):
+    return ' '.join(str(valor) for valor in valores if valor)
+
+
+def _textos_cotacoes(conn, ids):
+    cotacoes = Cotacao.__table__
+    produtos = ProdutoCotacao.__table__
+    linhas = conn.execute(
+        select(cotacoes.c.id, cotacoes.c.status, cotacoes.c.matricula_cooperado,
+               cotacoes.c.nome_cooperado, cotacoes.c.nome_filial, cotacoes.c.nome_vendedor,
+               cotacoes.c.analista_comercial, cotacoes.c.comprador, cotacoes.c.cultura)
+        .where(cotacoes.c.id.in_(ids))
+    ).all()
+    partes = {linha[0]: [_juntar(*linha[2:])] for linha in linhas}
+    status = {linha[0]: linha[1] for linha in linhas}
+    for produto in conn.execute(
+        select(produtos.c.cotacao_id, produtos.c.sku_produto, produtos.c.nome_produto,
+               produtos.c.fornecedor)
+        .where(produtos.c.cotacao_id.in_(ids))
+    ):
+        if produto[0] in partes:
+            partes[produto[0]].append(_juntar(*produto[1:]))
+    return {id_: (status[id_], _juntar(id_, *partes[id_])) for id_ in partes}
+
+
+def _textos_pesquisas(conn, ids):
+    pesquisas = PesquisaMercado.__table__
+    linhas = conn.execute(
+        select(pesquisas.c.id, pesquisas.c.status, pesquisas.c.matricula_cooperado,
+               pesquisas.c.nome_cooperado, pesquisas.c.nome_filial, pesquisas.c.codigo_produto,
+               pesquisas.c.nome_produto, pesquisas.c.nome_concorrente, pesquisas.c.nome_vendedor,
+               pesquisas.c.analista_comercial, pesquisas.c.comprador, pesquisas.c.cultura)
+        .where(pesquisas.c.id.in_(ids))
+    ).all()
+    return {linha[0]: (linha[1], _juntar(linha[0], *linha[2:])) for linha in linhas}
+
+
+_TEXTOS_POR_TIPO = {
+    'cotacao': _textos_cotacoes,
+    'pesquisa': _textos_pesquisas
+}
+
+
+def _reindexar(conn, tipo, ids):
+    """Remove as entradas dos ids e insere de novo as dos registros que ainda existem"""
+    ids = sorted({id_ for id_ in ids if id_ is not None})
+    chave = _coluna_chave()
+    for inicio in range(0, len(ids), TAMANHO_BLOCO_INDICE):
+        bloco = ids[inicio:inicio + TAMANHO_BLOCO_INDICE]
+        chaves = ', '.join(str(_chave(tipo, id_)) for id_ in bloco)
+        conn.execute(text(f'DELETE FROM {TABELA_BUSCA} WHERE {chave} IN ({chaves})'))
+        textos = _TEXTOS_POR_TIPO[tipo](conn, bloco)
+        if not textos:
+            continue
+        conn.execute(
+            text(f'INSERT INTO {TABELA_BUSCA} ({chave}, tipo, registro_id, status, conteudo) '
+                 f'VALUES (:chave, :tipo, :registro_id, :status, :conteudo)'),
+            [{'chave': _chave(tipo, id_), 'tipo': tipo, 'registro_id': id_,
+              'status': status, 'conteudo': normalizar_texto(conteudo)}
+             for id_, (status, conteudo) in textos.items()]
+        )
+
+
+@event.listens_for(Session, 'after_flush')
+def _sincronizar_indice_busca(session, flush_context):
+    if _estado['backend'] is None:
+        return
+    pendentes = {'cotacao': set(), 'pesquisa': set()}
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Cotacao):
+            pendentes['cotacao'].add(obj.id)
+        elif isinstance(obj, ProdutoCotacao):
+            pendentes['cotacao'].add(obj.cotacao_id)
+        elif isinstance(obj, PesquisaMercado):
+            pendentes['pesquisa'].add(obj.id)
+    if not pendentes['cotacao'] and not pendentes['pesquisa']:
+        return
+    conn = session.connection()
+    for tipo, ids in pendentes.items():
+        if ids:
+            _reindexar(conn, tipo, ids)
+
+
+def indexar_registros(tipo, ids):
+    """
+    Atualiza o índice de busca para os registros informados, na transação da
+    sessão atual. Necessário apenas em gravações que não passam pelo ORM
+    (DELETE/INSERT em lote); as demais são sincronizadas automaticamente.
+
+    Args:
+        tipo: 'cotacao' ou 'pesquisa'
+        ids: Ids dos registros alterados, inseridos ou excluídos
+    """
+    if _estado['backend'] is not None and ids:
+        _reindexar(db.session.connection(), tipo, ids)
+
+
+def reconstruir_indice_busca():
+    """
+    Recria o conteúdo do índice a partir das tabelas de cotações e pesquisas.
+
+    Returns:
+        Quantidade de registros indexados
+    """
+    if _estado['backend'] is None:
+        inicializar_indice_busca(reconstruir=False)
+    conn = db.session.connection()
+    conn.execute(text(f'DELETE FROM {TABELA_BUSCA}'))
+    total = 0
+    for tipo, modelo in (('cotacao', Cotacao), ('pesquisa', PesquisaMercado)):
+        ids = db.session.scalars(select(modelo.id).order_by(modelo.id)).all()
+        _reindexar(conn, tipo, ids)
+        total += len(ids)
+    if _estado['backend'] == 'fts5':
+        conn.execute(text(f"INSERT INTO {TABELA_BUSCA}({TABELA_BUSCA}) VALUES ('optimize')"))
+    db.session.commit()
+    return total
+
+
+def inicializar_indice_busca(reconstruir=True):
+    """
+    Cria a tabela do índice se ainda não existir e ativa a sincronização.
+    Se o índice estiver vazio e já houver registros (banco anterior ao índice),
+    ele é populado.
+    """
+    with db.engine.begin() as conn:
+        backend = _detectar_backend(conn)
+        existia = inspect(conn).has_table(TABELA_BUSCA)
+        conn.execute(text(_DDL_BUSCA[backend]))
+    _estado['backend'] = backend
+
+    if reconstruir:
+        vazio = db.session.execute(text(f'SELECT 1 FROM {TABELA_BUSCA} LIMIT 1')).first() is None
+        tem_registros = db.session.execute(select(Cotacao.id).limit(1)).first() is not None or \
+            db.session.execute(select(PesquisaMercado.id).limit(1)).first() is not None
+        db.session.commit()
+        if vazio and tem_registros:
+            total = reconstruir_indice_busca()
+            print(f"Índice de busca {'criado' if not existia else 'reconstruído'} ({total} registros)")
+    return backend
+
+
+def _montar_consulta(termos):
+    backend = _estado['backend']
+    if backend == 'fts5':
+        # Cada termo vira um prefixo entre aspas ("milho"*); todos são obrigatórios
+        consulta = ' '.join(f'"{termo}"*' for termo in termos)
+        return (f'bm25({TABELA_BUSCA})', f'{TABELA_BUSCA} MATCH :consulta',
+                'rank, rowid DESC', {'consulta': consulta})
+    if backend == 'fulltext':
+        # InnoDB ignora termos menores que innodb_ft_min_token_size (3 por padrão)
+        consulta = ' '.join(f'+{termo}*' for termo in termos)
+        match = 'MATCH(conteudo) AGAINST (:consulta IN BOOLEAN MODE)'
+        return (match, match, 'score DESC, id DESC', {'consulta': consulta})
+    parametros = {f'termo{i}': f'%{termo}%' for i, termo in enumerate(termos)}
+    filtro = ' AND '.join(f'conteudo LIKE :termo{i}' for i in range(len(termos)))
+    return ('0', filtro, 'id DESC', parametros)
+
+
+def buscar_registros(termo, tipo=None, status=None, limite=LIMITE_BUSCA_PADRAO, pagina=1):
+    """
+    Busca cotações e pesquisas no índice full-text, ordenadas por relevância.
+
+    Args:
+        termo: Texto digitado (nome, matrícula, produto, fornecedor, id...)
+        tipo: 'cotacao', 'pesquisa' ou None para ambos
+        status: Status exato ou None para todos
+        limite: Resultados por página
+        pagina: Página (começando em 1)
+
+    Returns:
+        (resultados, tem_mais) - resultados é uma lista de (tipo, registro_id, score)
+    """
+    if _estado['backend'] is None:
+        raise RuntimeError('Índice de busca não inicializado')
+    termos = normalizar_texto(termo).split()[:MAX_TERMOS_BUSCA]
+    if not termos:
+        return [], False
+
+    score, filtro, ordenacao, parametros = _montar_consulta(termos)
+    if tipo:
+        filtro += ' AND tipo = :tipo'
+        parametros['tipo'] = tipo
+    if status:
+        filtro += ' AND status = :status'
+        parametros['status'] = status
+    offset = (pagina - 1) * limite
+    if _estado['backend'] == 'fts5':
+        linhas = _buscar_fts_em_janela(score, filtro, ordenacao, parametros, limite + 1, offset)
+    else:
+        linhas = _executar_busca(score, filtro, ordenacao, parametros, limite + 1, offset)
+    return [(linha[0], int(linha[1]), linha[2]) for linha in linhas[:limite]], len(linhas) > limite
+
+
+def _executar_busca(score, filtro, ordenacao, parametros, limite, offset):
+    return db.session.execute(text(
+        f'SELECT tipo, registro_id, {score} AS score FROM {TABELA_BUSCA} '
+        f'WHERE {filtro} ORDER BY {ordenacao} LIMIT :limite OFFSET :offset'
+    ), dict(parametros, limite=limite, offset=offset)).all()
+
+
+def _buscar_fts_em_janela(score, filtro, ordenacao, parametros, limite, offset):
+    """
+    FTS5: as JANELA_RANKING_FTS ocorrências de maior chave (rowid) vêm
+    primeiro, por relevância (bm25); as demais vêm em seguida por rowid
+    decrescente. A janela é por chave e não por data: rowid é a única ordem
+    que o FTS5 percorre sem pontuar todas as linhas.
+    """
+    corte, na_janela = db.session.execute(text(
+        f'SELECT min(rowid), count(*) FROM (SELECT rowid FROM {TABELA_BUSCA} '
+        f'WHERE {filtro} ORDER BY rowid DESC LIMIT {JANELA_RANKING_FTS})'
+    ), parametros).one()
+    if not na_janela:
+        return []
+    parametros = dict(parametros, corte=corte)
+    linhas = []
+    if offset < na_janela:
+        linhas = _executar_busca(score, f'{filtro} AND rowid >= :corte', ordenacao,
+                                 parametros, limite, offset)
+    if len(linhas) < limite and na_janela == JANELA_RANKING_FTS:
+        linhas += _executar_busca(score, f'{filtro} AND rowid < :corte', 'rowid DESC',
+                                  parametros, limite - len(linhas), max(0, offset - na_janela))
+    return linhas
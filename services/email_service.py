@@ -1,5 +1,12 @@
+import json
 import smtplib
+import threading
+import time
+from datetime import datetime, timedelta
 from email.mime.text import MIMEText
+from sqlalchemy import func, select, update
+from config import Config
+from models import db, EmailFila
 
 # Lista de e-mails que receberão as notificações (fallback)
 NOTIFICATION_EMAILS = ['joseduque@cooxupe.com.br']
@@ -27,26 +34,338 @@ def obter_email_por_status(status):
         # Para Análise Comercial e outros status
         return EMAIL_COMERCIAL
 
-def enviar_email(destinatarios, assunto, corpo_html):
-    smtp_server = 'mail.cooxupe.com.br'
-    smtp_port = 587  # Porta STARTTLS
-    usuario = 'joseduque@cooxupe.com.br'
-    senha = 'Tricolor*01'  # Substitua pela sua senha real
+def _normalizar_destinatarios(destinatarios):
+    return destinatarios if isinstance(destinatarios, list) else [destinatarios]
 
+def _montar_mensagem(destinatarios, assunto, corpo_html):
     msg = MIMEText(corpo_html, 'html')
     msg['Subject'] = assunto
-    msg['From'] = usuario
-    msg['To'] = ', '.join(destinatarios) if isinstance(destinatarios, list) else destinatarios
+    msg['From'] = Config.SMTP_REMETENTE
+    msg['To'] = ', '.join(destinatarios)
+    return msg.as_string()
+
+_aviso_smtp = {'emitido': False}
+
+def smtp_configurado():
+    """
+    Verifica se há servidor, porta e remetente para o envio de e-mails.
+    Sem eles o envio fica desativado (um aviso é registrado uma única vez).
+    
+    Returns:
+        True se SMTP_SERVIDOR, SMTP_PORTA e SMTP_REMETENTE estão definidos
+    """
+    if Config.SMTP_SERVIDOR and Config.SMTP_PORTA and Config.SMTP_REMETENTE:
+        return True
+    if not _aviso_smtp['emitido']:
+        _aviso_smtp['emitido'] = True
+        print('Aviso: SMTP_SERVIDOR/SMTP_PORTA/SMTP_REMETENTE não definidos; envio de e-mails desativado '
+              '(os e-mails ficam pendentes na fila)')
+    return False
 
+def _smtp_autenticado():
+    return bool(Config.SMTP_USUARIO and Config.SMTP_SENHA)
+
+def _abrir_conexao_smtp():
+    """Abre uma conexão SMTP (STARTTLS e login apenas quando configurados)"""
+    server = smtplib.SMTP(Config.SMTP_SERVIDOR, Config.SMTP_PORTA, timeout=Config.SMTP_TIMEOUT)
     try:
-        with smtplib.SMTP(smtp_server, smtp_port, timeout=5) as server:
+        if Config.SMTP_STARTTLS:
             server.starttls()
-            server.login(usuario, senha)
-            server.sendmail(usuario, destinatarios if isinstance(destinatarios, list) else [destinatarios], msg.as_string())
+        if _smtp_autenticado():
+            server.login(Config.SMTP_USUARIO, Config.SMTP_SENHA)
+    except Exception:
+        server.close()
+        raise
+    return server
+
+def enviar_email(destinatarios, assunto, corpo_html):
+    """Envio imediato em uma conexão própria. Para notificações use enfileirar_email."""
+    destinatarios = _normalizar_destinatarios(destinatarios)
+    if not smtp_configurado():
+        return
+    try:
+        server = _abrir_conexao_smtp()
+        try:
+            server.sendmail(Config.SMTP_REMETENTE, destinatarios, _montar_mensagem(destinatarios, assunto, corpo_html))
+        finally:
+            server.quit()
         print(f'E-mail enviado com sucesso para: {destinatarios}')
     except Exception as e:
         print('Erro ao enviar e-mail:', e)
 
+# ===== FILA DE E-MAILS (OUTBOX) =====
+# As rotas gravam o e-mail na tabela fila_emails na mesma transação do registro
+# (enfileirar_email + commit), então nenhuma notificação se perde se o processo
+# reiniciar. Um único worker por processo drena a fila reaproveitando a mesma
+# conexão SMTP autenticada, com novas tentativas e backoff exponencial.
+# Notificações de um mesmo registro esperam a janela de agrupamento
+# (Config.EMAIL_JANELA_AGRUPAMENTO) e saem como um único e-mail com o estado final.
+
+EMAIL_LOTE = 50
+EMAIL_MAX_TENTATIVAS = 6
+EMAIL_BACKOFF_BASE = 30  # segundos; dobra a cada falha
+EMAIL_BACKOFF_MAXIMO = 30 * 60
+# Tempo que um e-mail fica reservado por um worker; se o processo morrer no
+# meio do envio, o e-mail volta para a fila depois desse prazo
+EMAIL_RESERVA = timedelta(minutes=5)
+INTERVALO_WORKER_EMAIL = 10
+# Conexão parada por mais tempo que isso é fechada (servidores derrubam conexões ociosas)
+EMAIL_CONEXAO_OCIOSA = 60
+
+_smtp = {'conexao': None, 'ultimo_uso': 0.0}
+_worker = {'thread': None, 'evento': threading.Event()}
+_worker_lock = threading.Lock()
+
+def _adicionar_email(destinatarios, assunto, corpo_html, status, proxima_tentativa, chave=None):
+    email = EmailFila(
+        destinatarios=json.dumps(destinatarios),
+        assunto=assunto,
+        corpo_html=corpo_html,
+        status=status,
+        tentativas=0,
+        proxima_tentativa=proxima_tentativa,
+        chave_agrupamento=chave,
+        agrupados=1
+    )
+    db.session.add(email)
+    return email
+
+def _agrupar_ou_adicionar(destinatarios, assunto, corpo_html, chave, status, proxima_tentativa):
+    # tentativas == 0: o worker ainda não reservou a mensagem, então ela pode ser reescrita.
+    # Mensagens pendentes do registro para outros destinatários (o departamento muda
+    # com o status) também passam a mostrar o estado final.
+    db.session.execute(
+        update(EmailFila)
+        .where(EmailFila.chave_agrupamento == chave,
+               EmailFila.destinatarios != json.dumps(destinatarios),
+               EmailFila.status == status,
+               EmailFila.tentativas == 0)
+        .values(corpo_html=corpo_html),
+        execution_options={'synchronize_session': False}
+    )
+    agrupado = db.session.execute(
+        update(EmailFila)
+        .where(EmailFila.chave_agrupamento == chave,
+               EmailFila.destinatarios == json.dumps(destinatarios),
+               EmailFila.status == status,
+               EmailFila.tentativas == 0)
+        .values(corpo_html=corpo_html, agrupados=EmailFila.agrupados + 1),
+        execution_options={'synchronize_session': False}
+    )
+    if agrupado.rowcount:
+        return None
+    return _adicionar_email(destinatarios, assunto, corpo_html, status, proxima_tentativa, chave)
+
+def enfileirar_email(destinatarios, assunto, corpo_html, chave=None):
+    """
+    Adiciona um e-mail à fila na sessão atual. Ele só é enviado depois do
+    commit da transação que gravou o registro; chame notificar_worker_email()
+    após o commit para não esperar o próximo ciclo do worker.
+    
+    Com chave (ex.: 'cotacao:12'), a mensagem espera a janela de agrupamento
+    e novas notificações do mesmo registro para os mesmos destinatários apenas
+    substituem o corpo (o e-mail sai uma vez, com o status final). No modo
+    resumo, ela entra no resumo periódico de cada departamento.
+    
+    Args:
+        destinatarios: E-mail ou lista de e-mails
+        assunto: Assunto da mensagem
+        corpo_html: Corpo em HTML
+        chave: Identificador do registro de origem (opcional)
+    
+    Returns:
+        Objeto EmailFila adicionado à sessão, ou None se foi agrupado em um existente
+    """
+    destinatarios = _normalizar_destinatarios(destinatarios)
+    agora = datetime.now()
+    if chave is None:
+        return _adicionar_email(destinatarios, assunto, corpo_html, 'pendente', agora)
+    
+    if Config.EMAIL_RESUMO_DEPARTAMENTOS:
+        email = None
+        for destinatario in destinatarios:
+            email = _agrupar_ou_adicionar([destinatario], assunto, corpo_html, chave, 'resumo', agora) or email
+        return email
+    
+    proxima = agora + timedelta(seconds=Config.EMAIL_JANELA_AGRUPAMENTO)
+    return _agrupar_ou_adicionar(destinatarios, assunto, corpo_html, chave, 'pendente', proxima)
+
+def notificar_worker_email():
+    """Acorda o worker para drenar a fila imediatamente"""
+    _worker['evento'].set()
+
+def _fechar_conexao_smtp():
+    conexao = _smtp['conexao']
+    _smtp['conexao'] = None
+    if conexao is None:
+        return
+    try:
+        conexao.quit()
+    except Exception:
+        conexao.close()
+
+def _enviar_pela_conexao(destinatarios, assunto, corpo_html):
+    mensagem = _montar_mensagem(destinatarios, assunto, corpo_html)
+    if _smtp['conexao'] is not None and time.monotonic() - _smtp['ultimo_uso'] > EMAIL_CONEXAO_OCIOSA:
+        _fechar_conexao_smtp()
+    for tentativa in range(2):
+        if _smtp['conexao'] is None:
+            _smtp['conexao'] = _abrir_conexao_smtp()
+        try:
+            _smtp['conexao'].sendmail(Config.SMTP_REMETENTE, destinatarios, mensagem)
+            _smtp['ultimo_uso'] = time.monotonic()
+            return
+        except (smtplib.SMTPServerDisconnected, OSError):
+            # Conexão caiu: reconectar uma vez antes de contar como falha
+            _fechar_conexao_smtp()
+            if tentativa == 1:
+                raise
+
+def _atraso_nova_tentativa(tentativas):
+    return timedelta(seconds=min(EMAIL_BACKOFF_BASE * 2 ** (tentativas - 1), EMAIL_BACKOFF_MAXIMO))
+
+def processar_fila_emails(limite=EMAIL_LOTE):
+    """
+    Envia os e-mails pendentes cuja próxima tentativa já venceu.
+    Cada e-mail é reservado com um UPDATE condicional antes do envio, então
+    dois processos drenando a mesma fila não enviam a mesma mensagem.
+    
+    Returns:
+        Quantidade de e-mails processados (enviados ou com falha)
+    """
+    if not smtp_configurado():
+        # Sem servidor/remetente os e-mails ficam pendentes até o envio ser configurado
+        return 0
+    agora = datetime.now()
+    ids = db.session.scalars(
+        select(EmailFila.id)
+        .where(EmailFila.status == 'pendente', EmailFila.proxima_tentativa <= agora)
+        .order_by(EmailFila.id)
+        .limit(limite)
+    ).all()
+    db.session.commit()
+    
+    processados = 0
+    for email_id in ids:
+        reserva = db.session.execute(
+            update(EmailFila)
+            .where(EmailFila.id == email_id, EmailFila.status == 'pendente',
+                   EmailFila.proxima_tentativa <= agora)
+            .values(proxima_tentativa=datetime.now() + EMAIL_RESERVA,
+                    tentativas=EmailFila.tentativas + 1),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+        if reserva.rowcount != 1:
+            continue
+        
+        email = db.session.get(EmailFila, email_id)
+        corpo_html = email.corpo_html
+        if email.agrupados > 1:
+            corpo_html += f'<p><em>{email.agrupados} alterações deste registro foram agrupadas nesta notificação.</em></p>'
+        try:
+            _enviar_pela_conexao(json.loads(email.destinatarios), email.assunto, corpo_html)
+            email.status = 'enviado'
+            email.data_envio = datetime.now()
+            email.ultimo_erro = None
+            print(f'E-mail {email.id} enviado com sucesso para: {email.destinatarios}')
+        except Exception as e:
+            email.ultimo_erro = str(e)
+            if email.tentativas >= EMAIL_MAX_TENTATIVAS:
+                email.status = 'erro'
+                print(f'Erro definitivo ao enviar e-mail {email.id}: {e}')
+            else:
+                email.proxima_tentativa = datetime.now() + _atraso_nova_tentativa(email.tentativas)
+                print(f'Erro ao enviar e-mail {email.id} (tentativa {email.tentativas}): {e}')
+        db.session.commit()
+        processados += 1
+    return processados
+
+def processar_resumos(agora=None):
+    """
+    Modo resumo: para cada endereço cuja notificação mais antiga acumulada já
+    passou de EMAIL_INTERVALO_RESUMO, junta as notificações em um único e-mail
+    na fila normal de envio.
+    
+    Returns:
+        Quantidade de resumos gerados
+    """
+    agora = agora or datetime.now()
+    limite = agora - timedelta(seconds=Config.EMAIL_INTERVALO_RESUMO)
+    enderecos = db.session.scalars(
+        select(EmailFila.destinatarios)
+        .where(EmailFila.status == 'resumo')
+        .group_by(EmailFila.destinatarios)
+        .having(func.min(EmailFila.data_criacao) <= limite)
+    ).all()
+    
+    gerados = 0
+    for destinatarios in enderecos:
+        itens = db.session.scalars(
+            select(EmailFila)
+            .where(EmailFila.status == 'resumo', EmailFila.destinatarios == destinatarios)
+            .order_by(EmailFila.id)
+        ).all()
+        ids = [item.id for item in itens]
+        marcados = db.session.execute(
+            update(EmailFila)
+            .where(EmailFila.id.in_(ids), EmailFila.status == 'resumo')
+            .values(status='agrupado', data_envio=agora),
+            execution_options={'synchronize_session': False}
+        )
+        if marcados.rowcount != len(ids):
+            # Outro processo gerou este resumo ao mesmo tempo
+            db.session.rollback()
+            continue
+        
+        linhas = ''.join(f'<li><strong>{item.assunto}</strong>{item.corpo_html}</li>' for item in itens)
+        _adicionar_email(
+            json.loads(destinatarios),
+            f'Resumo de notificações ({len(itens)})',
+            f'<h2>Resumo de notificações</h2><ul>{linhas}</ul><p>Acesse o sistema para mais detalhes.</p>',
+            'pendente', agora
+        )
+        db.session.commit()
+        gerados += 1
+    return gerados
+
+def _loop_worker_email(app, intervalo):
+    evento = _worker['evento']
+    while True:
+        evento.wait(intervalo)
+        evento.clear()
+        with app.app_context():
+            try:
+                processar_resumos()
+                while processar_fila_emails() == EMAIL_LOTE:
+                    pass
+            except Exception as e:
+                db.session.rollback()
+                print(f"Erro no worker de e-mails: {e}")
+            finally:
+                db.session.remove()
+        if _smtp['conexao'] is not None and time.monotonic() - _smtp['ultimo_uso'] > EMAIL_CONEXAO_OCIOSA:
+            _fechar_conexao_smtp()
+
+def iniciar_worker_email(app, intervalo=INTERVALO_WORKER_EMAIL):
+    """
+    Inicia (uma única vez por processo) a thread que drena a fila de e-mails.
+    Apenas essa thread usa a conexão SMTP persistente.
+    """
+    with _worker_lock:
+        if _worker['thread'] is not None:
+            return
+        _worker['thread'] = threading.Thread(
+            target=_loop_worker_email, args=(app, intervalo),
+            name='worker-email', daemon=True
+        )
+        _worker['thread'].start()
+    if smtp_configurado() and not _smtp_autenticado():
+        print(f'Aviso: SMTP_USUARIO/SMTP_SENHA não definidos; e-mails serão enviados sem login '
+              f'para {Config.SMTP_SERVIDOR}:{Config.SMTP_PORTA}')
+    # Drenar o que ficou pendente de uma execução anterior
+    notificar_worker_email()
+
 def enviar_notificacao_mudanca_status(cotacao):
     """Envia e-mail de notificação quando há mudança de status na cotação"""
     try:
@@ -60,7 +379,7 @@ def enviar_notificacao_mudanca_status(cotacao):
             nome_produto = cotacao.produtos[0].nome_produto or '-'
             volume = cotacao.produtos[0].volume or '-'
         
-        msg = MIMEText(f"""
+        corpo_html = f"""
         <html>
         <body>
         <h2>Mudança de Status - Cotação #{cotacao.id}</h2>
@@ -79,24 +398,9 @@ def enviar_notificacao_mudanca_status(cotacao):
         <p>Acesse o sistema para mais detalhes.</p>
         </body>
         </html>
-        """, 'html')
+        """
         
-        msg['Subject'] = f'Mudança de Status - Cotação #{cotacao.id}'
-        msg['From'] = 'joseduque@cooxupe.com.br'
-        msg['To'] = destinatario
-
-        smtp_server = 'mail.cooxupe.com.br'
-        smtp_port = 465
-        usuario = 'joseduque@cooxupe.com.br'
-        senha = 'Tricolor*01'
-
-        try:
-            with smtplib.SMTP_SSL(smtp_server, smtp_port, timeout=5) as server:
-                server.login(usuario, senha)
-                server.sendmail(usuario, [destinatario], msg.as_string())
-            print(f'E-mail de notificação enviado para: {destinatario}')
-        except Exception as e:
-            print('Erro ao enviar e-mail:', e)
+        enviar_email(destinatario, f'Mudança de Status - Cotação #{cotacao.id}', corpo_html)
         return True
     except Exception as e:
         print(f"Erro ao enviar e-mail: {str(e)}")
@@ -0,0 +1,72 @@
+import threading
+import time
+from sqlalchemy import func, literal, select, union_all
+from models import db, Cotacao, PesquisaMercado
+
+# ===== CACHE DOS CONTADORES DO DASHBOARD =====
+# Os contadores são calculados com uma única consulta e mantidos em memória
+# até que uma rota de escrita os invalide. O TTL cobre escritas feitas por
+# outros processos (cada worker tem seu próprio cache).
+STATS_TTL_SEGUNDOS = 60
+
+_stats_lock = threading.Lock()
+_stats_cache = {
+    'valores': None,
+    'carregado_em': 0.0,
+    'geracao': 0
+}
+
+STATS_VAZIAS = {
+    'andamento': 0,
+    'pesquisas': 0,
+    'finalizadas': 0,
+    'pesquisas_finalizadas': 0,
+    'perdidas': 0
+}
+
+
+def _calcular_estatisticas():
+    """Conta cotações e pesquisas por status em um único GROUP BY (UNION ALL das duas tabelas)"""
+    consulta = union_all(
+        select(literal('cotacao').label('tabela'), Cotacao.status, func.count().label('total'))
+        .group_by(Cotacao.status),
+        select(literal('pesquisa').label('tabela'), PesquisaMercado.status, func.count().label('total'))
+        .group_by(PesquisaMercado.status)
+    )
+    contagens = {(tabela, status): total for tabela, status, total in db.session.execute(consulta)}
+
+    return {
+        'andamento': contagens.get(('cotacao', 'Análise Comercial'), 0) + contagens.get(('cotacao', 'Análise Suprimentos'), 0),
+        'pesquisas': contagens.get(('pesquisa', 'Análise Comercial'), 0),
+        'finalizadas': contagens.get(('cotacao', 'Liberado para Venda'), 0),
+        'pesquisas_finalizadas': contagens.get(('pesquisa', 'Liberado para Venda'), 0),
+        'perdidas': contagens.get(('cotacao', 'Cotação Perdida'), 0)
+    }
+
+
+def obter_estatisticas_dashboard():
+    """
+    Retorna os contadores do dashboard, consultando o banco apenas quando
+    o cache foi invalidado ou expirou.
+    """
+    with _stats_lock:
+        valores = _stats_cache['valores']
+        if valores is not None and time.monotonic() - _stats_cache['carregado_em'] < STATS_TTL_SEGUNDOS:
+            return dict(valores)
+        geracao = _stats_cache['geracao']
+
+    valores = _calcular_estatisticas()
+    with _stats_lock:
+        # Não guardar o resultado se houve uma escrita durante a consulta
+        if _stats_cache['geracao'] == geracao:
+            _stats_cache['valores'] = valores
+            _stats_cache['carregado_em'] = time.monotonic()
+    return dict(valores)
+
+
+def invalidar_estatisticas_dashboard():
+    """Descarta os contadores em cache; deve ser chamada após criar, alterar ou excluir registros"""
+    with _stats_lock:
+        _stats_cache['valores'] = None
+        _stats_cache['carregado_em'] = 0.0
+        _stats_cache['geracao'] += 1
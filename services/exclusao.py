@@ -0,0 +1,81 @@
+from collections import Counter
+from sqlalchemy import delete, select
+from models import db, Cotacao, ProdutoCotacao, PesquisaMercado, Anexo
+from services.anexos import ajustar_referencias
+from services.busca import indexar_registros
+
+# ===== EXCLUSÃO EM LOTE =====
+# Remove registros e filhos com poucos DELETE ... WHERE id IN (...) em uma
+# única transação, sem carregar os objetos na sessão (o cascade do ORM
+# buscaria cada produto e anexo antes de apagá-los). As referências ao
+# conteúdo dos anexos são descontadas na mesma transação, e os arquivos que
+# ficam sem referência só são apagados do disco depois do commit.
+
+# Quantidade de ids por instrução (abaixo do limite de parâmetros do SQLite)
+TAMANHO_BLOCO_EXCLUSAO = 500
+
+_SEM_SINCRONIZAR = {'synchronize_session': False}
+
+
+def _normalizar_ids(ids):
+    try:
+        return list(dict.fromkeys(int(id_) for id_ in ids))
+    except (TypeError, ValueError):
+        raise ValueError('Lista de ids inválida')
+
+
+def _excluir_em_lote(modelo, tipo, coluna_anexo, filhos, ids):
+    ids = _normalizar_ids(ids)
+    referencias = Counter()
+    excluidos = 0
+    try:
+        for inicio in range(0, len(ids), TAMANHO_BLOCO_EXCLUSAO):
+            bloco = ids[inicio:inicio + TAMANHO_BLOCO_EXCLUSAO]
+            referencias.update(db.session.scalars(
+                select(Anexo.sha256).where(coluna_anexo.in_(bloco), Anexo.sha256.isnot(None))))
+            db.session.execute(delete(Anexo).where(coluna_anexo.in_(bloco)),
+                               execution_options=_SEM_SINCRONIZAR)
+            for filho, coluna_fk in filhos:
+                db.session.execute(delete(filho).where(coluna_fk.in_(bloco)),
+                                   execution_options=_SEM_SINCRONIZAR)
+            resultado = db.session.execute(delete(modelo).where(modelo.id.in_(bloco)),
+                                           execution_options=_SEM_SINCRONIZAR)
+            excluidos += resultado.rowcount
+        # DELETE em lote não passa pelo after_flush: remover do índice de busca aqui
+        indexar_registros(tipo, ids)
+        # Idem para a contagem de referências dos arquivos
+        ajustar_referencias(db.session, {sha256: -total for sha256, total in referencias.items()})
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    # Objetos já carregados nesta sessão não refletem a exclusão
+    db.session.expire_all()
+    return excluidos
+
+
+def excluir_cotacoes_em_lote(ids):
+    """
+    Exclui cotações, seus produtos e anexos em uma transação.
+
+    Args:
+        ids: Lista de ids de cotações
+
+    Returns:
+        Quantidade de cotações excluídas
+    """
+    return _excluir_em_lote(Cotacao, 'cotacao', Anexo.cotacao_id,
+                            [(ProdutoCotacao, ProdutoCotacao.cotacao_id)], ids)
+
+
+def excluir_pesquisas_em_lote(ids):
+    """
+    Exclui pesquisas de mercado e seus anexos em uma transação.
+
+    Args:
+        ids: Lista de ids de pesquisas
+
+    Returns:
+        Quantidade de pesquisas excluídas
+    """
+    return _excluir_em_lote(PesquisaMercado, 'pesquisa', Anexo.pesquisa_id, [], ids)
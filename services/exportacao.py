@@ -0,0 +1,300 @@
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from sqlalchemy.orm import selectinload
+from config import Config
+from models import db, Cotacao, PesquisaMercado
+
+# ===== EXPORTAÇÃO EXCEL EM STREAMING =====
+# As linhas são geradas registro a registro e gravadas direto em um workbook
+# write-only do openpyxl, sem montar DataFrame nem dicionários intermediários.
+# O esquema de colunas é fixo (o mesmo layout de uma linha por produto).
+
+TAMANHO_LOTE_EXPORTACAO = 500
+
+COLUNAS_COTACAO = [
+    'id', 'data', 'nome_filial', 'numero_mesorregiao', 'matricula_cooperado',
+    'nome_cooperado', 'status', 'dias_no_status', 'analista_comercial', 'comprador',
+    'data_ultima_modificacao', 'observacoes', 'forma_pagamento', 'prazo_entrega',
+    'cultura', 'motivo_venda_perdida', 'nome_vendedor', 'valor_total', 'fornecedor',
+    'produto_id', 'produto_sku_produto', 'nome_produto', 'produto_volume',
+    'produto_unidade_medida', 'produto_preco_unitario', 'produto_valor_total',
+    'produto_preco_custo', 'produto_valor_frete', 'produto_prazo_entrega_fornecedor',
+    'produto_valor_total_com_frete'
+]
+
+COLUNAS_PESQUISA = [
+    'id', 'data', 'nome_filial', 'numero_mesorregiao', 'matricula_cooperado',
+    'nome_cooperado', 'codigo_produto', 'nome_produto', 'quantidade_cotada',
+    'forma_pagamento', 'nome_concorrente', 'valor_concorrente', 'valor_cooxupe',
+    'analista_comercial', 'observacoes', 'status', 'data_entrada_status',
+    'data_ultima_modificacao', 'cultura', 'nome_vendedor', 'comprador', 'prazo_entrega'
+]
+
+
+def _data(valor, formato):
+    return valor.strftime(formato) if valor else None
+
+
+def linhas_cotacao(cotacao, agora=None):
+    """Gera as linhas de exportação de uma cotação (uma por produto) no esquema COLUNAS_COTACAO"""
+    agora = agora or datetime.now()
+    produtos = cotacao.produtos
+    base = [
+        cotacao.id,
+        _data(cotacao.data, '%d/%m/%Y'),
+        cotacao.nome_filial,
+        cotacao.numero_mesorregiao,
+        cotacao.matricula_cooperado,
+        cotacao.nome_cooperado,
+        cotacao.status,
+        (agora - cotacao.data_entrada_status).days,
+        cotacao.analista_comercial,
+        cotacao.comprador,
+        _data(cotacao.data_ultima_modificacao, '%d/%m/%Y'),
+        cotacao.observacoes,
+        cotacao.forma_pagamento,
+        _data(cotacao.prazo_entrega, '%Y-%m-%d'),
+        cotacao.cultura,
+        cotacao.motivo_venda_perdida,
+        cotacao.nome_vendedor,
+        cotacao.valor_total or 0
+    ]
+
+    if not produtos:
+        fornecedor = '-'
+        yield base + [fornecedor] + [None] * 11
+        return
+
+    for produto in produtos:
+        yield base + [
+            produto.fornecedor,
+            produto.id,
+            produto.sku_produto,
+            produto.nome_produto,
+            produto.volume,
+            produto.unidade_medida,
+            produto.preco_unitario,
+            produto.valor_total,
+            produto.preco_custo,
+            produto.valor_frete,
+            _data(produto.prazo_entrega_fornecedor, '%Y-%m-%d'),
+            produto.valor_total_com_frete
+        ]
+
+
+def linhas_pesquisa(pesquisa, agora=None):
+    """Gera a linha de exportação de uma pesquisa no esquema COLUNAS_PESQUISA"""
+    yield [
+        pesquisa.id,
+        _data(pesquisa.data, '%d/%m/%Y'),
+        pesquisa.nome_filial,
+        pesquisa.numero_mesorregiao,
+        pesquisa.matricula_cooperado,
+        pesquisa.nome_cooperado,
+        pesquisa.codigo_produto,
+        pesquisa.nome_produto,
+        pesquisa.quantidade_cotada,
+        pesquisa.forma_pagamento,
+        pesquisa.nome_concorrente,
+        pesquisa.valor_concorrente,
+        pesquisa.valor_cooxupe,
+        pesquisa.analista_comercial,
+        pesquisa.observacoes,
+        pesquisa.status,
+        _data(pesquisa.data_entrada_status, '%Y-%m-%d %H:%M:%S'),
+        _data(pesquisa.data_ultima_modificacao, '%d/%m/%Y'),
+        pesquisa.cultura,
+        pesquisa.nome_vendedor,
+        pesquisa.comprador,
+        _data(pesquisa.prazo_entrega, '%Y-%m-%d')
+    ]
+
+
+def esquema_exportacao(modelo):
+    """Retorna (colunas, gerador_de_linhas) do modelo exportado"""
+    if modelo is PesquisaMercado:
+        return COLUNAS_PESQUISA, linhas_pesquisa
+    return COLUNAS_COTACAO, linhas_cotacao
+
+
+def iterar_em_lotes(query, modelo, tamanho_lote=TAMANHO_LOTE_EXPORTACAO):
+    """
+    Percorre a query em lotes ordenados por id (keyset), carregando os
+    produtos de cada lote com SELECT ... IN. Os objetos de um lote são
+    removidos da sessão antes do próximo, então a memória não cresce com
+    o total de registros.
+    """
+    opcoes = [selectinload(Cotacao.produtos)] if modelo is Cotacao else []
+    ultimo_id = None
+    while True:
+        lote_query = query.options(*opcoes).order_by(modelo.id)
+        if ultimo_id is not None:
+            lote_query = lote_query.filter(modelo.id > ultimo_id)
+        lote = lote_query.limit(tamanho_lote).all()
+        if not lote:
+            return
+        for registro in lote:
+            yield registro
+        ultimo_id = lote[-1].id
+        for registro in lote:
+            db.session.expunge(registro)
+
+
+def iterar_por_ids(modelo, ids, tamanho_lote=TAMANHO_LOTE_EXPORTACAO):
+    """
+    Percorre os registros de uma seleção do usuário na ordem em que os ids
+    foram informados. Cada bloco de ids vira um único SELECT ... WHERE id IN (...)
+    com os produtos carregados em lote, em vez de uma consulta por id. Ids
+    repetidos são exportados uma vez e ids inexistentes são ignorados.
+    """
+    opcoes = [selectinload(Cotacao.produtos)] if modelo is Cotacao else []
+    ids = list(dict.fromkeys(ids))
+    for inicio in range(0, len(ids), tamanho_lote):
+        bloco = ids[inicio:inicio + tamanho_lote]
+        lote = modelo.query.options(*opcoes).filter(modelo.id.in_(bloco)).all()
+        por_id = {registro.id: registro for registro in lote}
+        for id_ in bloco:
+            if id_ in por_id:
+                yield por_id[id_]
+        for registro in lote:
+            db.session.expunge(registro)
+
+
+def nome_arquivo_exportacao(modelo, quantidade, primeiro_id=None):
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    if quantidade == 1 and primeiro_id is not None:
+        prefixo = "Pesquisa" if modelo is PesquisaMercado else "Cotacao"
+        return f"{prefixo}_{primeiro_id}_{timestamp}.xlsx"
+    prefixo = "Pesquisas" if modelo is PesquisaMercado else "Cotacoes"
+    return f"{prefixo}_Multiplas_{timestamp}.xlsx"
+
+
+def escrever_excel(registros, modelo, filepath, ao_progredir=None):
+    """
+    Grava os registros em um workbook write-only, linha a linha.
+
+    Args:
+        registros: Iterável de objetos Cotacao/PesquisaMercado
+        modelo: Classe dos registros (define o esquema de colunas)
+        filepath: Caminho do arquivo .xlsx de saída
+        ao_progredir: Callback opcional chamado com o total de registros já gravados
+
+    Returns:
+        Quantidade de registros exportados
+    """
+    colunas, gerar_linhas = esquema_exportacao(modelo)
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Sheet1')
+    negrito = Font(bold=True)
+    cabecalho = []
+    for coluna in colunas:
+        celula = WriteOnlyCell(ws, value=coluna)
+        celula.font = negrito
+        cabecalho.append(celula)
+    ws.append(cabecalho)
+
+    agora = datetime.now()
+    total = 0
+    for registro in registros:
+        for linha in gerar_linhas(registro, agora):
+            ws.append(linha)
+        total += 1
+        if ao_progredir and total % 100 == 0:
+            ao_progredir(total)
+
+    # Gravar em arquivo temporário para nunca expor um .xlsx incompleto em /download
+    tmp = filepath + '.tmp'
+    try:
+        wb.save(tmp)
+        os.replace(tmp, filepath)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    if ao_progredir:
+        ao_progredir(total)
+    return total
+
+
+def exportar_query_para_excel(query, modelo, filename=None, tamanho_lote=TAMANHO_LOTE_EXPORTACAO, ao_progredir=None):
+    """
+    Exporta todos os registros de uma query, buscando-os em lotes do banco
+    e gravando em streaming. Indicado para exportações grandes.
+
+    Returns:
+        Caminho do arquivo Excel gerado
+    """
+    if not filename:
+        filename = nome_arquivo_exportacao(modelo, None)
+    filepath = os.path.join(Config.EXPORT_FOLDER, filename)
+    escrever_excel(iterar_em_lotes(query, modelo, tamanho_lote), modelo, filepath, ao_progredir)
+    return filepath
+
+
+def exportar_ids_para_excel(modelo, ids, filename=None, tamanho_lote=TAMANHO_LOTE_EXPORTACAO, ao_progredir=None):
+    """
+    Exporta os registros selecionados, na ordem da seleção, buscando-os em
+    blocos de IN (...) e gravando em streaming.
+
+    Returns:
+        Caminho do arquivo Excel gerado
+    """
+    if not filename:
+        filename = nome_arquivo_exportacao(modelo, len(ids), ids[0] if ids else None)
+    filepath = os.path.join(Config.EXPORT_FOLDER, filename)
+    escrever_excel(iterar_por_ids(modelo, ids, tamanho_lote), modelo, filepath, ao_progredir)
+    return filepath
+
+
+# ===== EXPORTAÇÃO CSV / NDJSON EM STREAMING =====
+FORMATOS_TEXTO = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8'
+}
+
+
+def gerar_exportacao_texto(query, modelo, formato, tamanho_lote=TAMANHO_LOTE_EXPORTACAO):
+    """
+    Gerador de blocos de texto CSV ou NDJSON para uma Response em streaming.
+    A query é percorrida com yield_per (cursor do lado do servidor no MySQL),
+    então a memória não cresce com o total de linhas; o cabeçalho é enviado
+    antes da primeira consulta para que o primeiro byte saia imediatamente.
+    """
+    colunas, gerar_linhas = esquema_exportacao(modelo)
+    if modelo is Cotacao:
+        query = query.options(selectinload(Cotacao.produtos))
+    query = query.order_by(modelo.id).yield_per(tamanho_lote)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    if formato == 'csv':
+        writer.writerow(colunas)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    agora = datetime.now()
+    pendentes = 0
+    for registro in query:
+        for linha in gerar_linhas(registro, agora):
+            if formato == 'csv':
+                writer.writerow(linha)
+            else:
+                buffer.write(json.dumps(dict(zip(colunas, linha)), ensure_ascii=False))
+                buffer.write('\n')
+        pendentes += 1
+        if pendentes >= 100:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pendentes = 0
+
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,157 @@
+import json
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import update
+from config import Config
+from models import db, Cotacao, PesquisaMercado, Exportacao
+from services.exportacao import exportar_ids_para_excel, nome_arquivo_exportacao
+
+# ===== JOBS DE EXPORTAÇÃO ASSÍNCRONA =====
+# A rota grava o job na tabela exportacoes e devolve o id na hora; um pool
+# limitado de threads gera o arquivo. O estado fica no banco, então qualquer
+# worker consegue responder ao polling e o job sobrevive a um refresh da página.
+
+# Job sem atualização por mais tempo que isso é considerado interrompido (ex.: restart)
+TEMPO_MAXIMO_SEM_PROGRESSO = timedelta(minutes=10)
+# A fila do executor fica em memória: job que não começou nesse prazo (criado
+# antes de um restart) não será mais executado
+TEMPO_MAXIMO_NA_FILA = timedelta(minutes=30)
+
+MODELOS_EXPORTACAO = {
+    'cotacao': Cotacao,
+    'pesquisa': PesquisaMercado
+}
+
+_executor_lock = threading.Lock()
+_executor = {'pool': None}
+
+
+def _obter_executor():
+    with _executor_lock:
+        if _executor['pool'] is None:
+            _executor['pool'] = ThreadPoolExecutor(
+                max_workers=Config.EXPORT_MAX_WORKERS,
+                thread_name_prefix='exportacao'
+            )
+        return _executor['pool']
+
+
+def _atualizar_job(job_id, **campos):
+    """
+    Atualiza o job em uma conexão própria, fora da sessão do worker, para não
+    expirar os registros que estão sendo exportados a cada aviso de progresso.
+    """
+    campos['data_atualizacao'] = datetime.now()
+    tabela = Exportacao.__table__
+    with db.engine.begin() as conn:
+        conn.execute(update(tabela).where(tabela.c.id == job_id).values(**campos))
+
+
+def _reservar_job(job_id):
+    """Passa o job de pendente para processando; False se ele já expirou na fila"""
+    tabela = Exportacao.__table__
+    with db.engine.begin() as conn:
+        resultado = conn.execute(
+            update(tabela)
+            .where(tabela.c.id == job_id, tabela.c.status == 'pendente')
+            .values(status='processando', data_atualizacao=datetime.now())
+        )
+    return resultado.rowcount == 1
+
+
+def _executar_job(app, job_id):
+    with app.app_context():
+        try:
+            job = db.session.get(Exportacao, job_id)
+            if job is None:
+                return
+            modelo = MODELOS_EXPORTACAO[job.tipo]
+            ids = json.loads(job.ids)
+            db.session.remove()
+
+            if not _reservar_job(job_id):
+                return
+            filename = nome_arquivo_exportacao(modelo, len(ids), ids[0])
+            exportados = {'total': 0}
+
+            def ao_progredir(total):
+                exportados['total'] = total
+                _atualizar_job(job_id, processados=total)
+
+            filepath = exportar_ids_para_excel(modelo, ids, filename, ao_progredir=ao_progredir)
+            _atualizar_job(job_id, status='concluido', filepath=filepath,
+                           processados=exportados['total'], total=exportados['total'])
+            print(f"Exportação {job_id} concluída ({exportados['total']} itens). Caminho: {filepath}")
+        except Exception as e:
+            traceback.print_exc()
+            try:
+                _atualizar_job(job_id, status='erro', erro=str(e))
+            except Exception:
+                traceback.print_exc()
+        finally:
+            db.session.remove()
+
+
+def criar_job_exportacao(tipo, ids):
+    """
+    Registra um job de exportação e o envia ao pool de workers.
+
+    Args:
+        tipo: 'cotacao' ou 'pesquisa'
+        ids: Lista de ids selecionados
+
+    Returns:
+        Objeto Exportacao recém-criado
+    """
+    if tipo not in MODELOS_EXPORTACAO:
+        raise ValueError(f'Tipo de exportação inválido: {tipo}')
+    try:
+        ids = [int(id_) for id_ in ids]
+    except (TypeError, ValueError):
+        raise ValueError('Lista de ids inválida')
+
+    job = Exportacao(
+        id=uuid.uuid4().hex,
+        tipo=tipo,
+        ids=json.dumps(ids),
+        status='pendente',
+        total=len(ids),
+        processados=0
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    app = current_app._get_current_object()
+    _obter_executor().submit(_executar_job, app, job.id)
+    return job
+
+
+def obter_job_exportacao(job_id):
+    """
+    Retorna o job de exportação, marcando como erro os que pararam de
+    progredir (processo reiniciado no meio da geração) e os que ficaram
+    pendentes além de TEMPO_MAXIMO_NA_FILA (fila perdida em um restart).
+    """
+    job = db.session.get(Exportacao, job_id)
+    if job is None:
+        return None
+    agora = datetime.now()
+    if job.status == 'processando' and agora - job.data_atualizacao > TEMPO_MAXIMO_SEM_PROGRESSO:
+        erro = 'Exportação interrompida. Tente novamente.'
+    elif job.status == 'pendente' and agora - job.data_criacao > TEMPO_MAXIMO_NA_FILA:
+        erro = 'Exportação não foi iniciada. Tente novamente.'
+    else:
+        return job
+    # Condicional ao status lido: um worker pode ter avançado o job nesse meio tempo
+    tabela = Exportacao.__table__
+    db.session.execute(
+        update(tabela)
+        .where(tabela.c.id == job_id, tabela.c.status == job.status)
+        .values(status='erro', erro=erro, data_atualizacao=agora)
+    )
+    db.session.commit()
+    return job
@@ -0,0 +1,488 @@
+import csv
+import io
+from datetime import date, datetime
+from openpyxl import load_workbook
+from sqlalchemy import insert
+from models import db, Cotacao, ProdutoCotacao, PesquisaMercado
+from services.email_service import enfileirar_email, notificar_worker_email, obter_email_por_status
+from services.estatisticas import invalidar_estatisticas_dashboard
+from services.busca import indexar_registros
+from services.produtos import valores_produto
+from services.utils import (
+    normalizar_texto,
+    buscar_conta_por_matricula,
+    buscar_produto_por_codigo,
+    carregar_filiais_mesoregioes,
+    dados_mestres_disponiveis,
+    valores_normalizados
+)
+
+# ===== IMPORTAÇÃO EM LOTE (CSV/XLSX) =====
+# A planilha é lida linha a linha (módulo csv / openpyxl read-only),
+# cada linha é validada com as mesmas regras dos formulários e resolvida
+# contra os dados mestres em memória. As linhas válidas são gravadas em
+# blocos de TAMANHO_LOTE_IMPORTACAO, um commit por bloco: o lock de escrita
+# do banco fica preso só durante o INSERT do bloco, nunca durante a leitura
+# e validação do arquivo. Se o banco rejeitar um bloco, ele é regravado em
+# metades até isolar as linhas com erro; as demais são importadas. O cabeçalho segue o layout da exportação em
+# CSV/NDJSON (nomes das colunas do banco), então um arquivo exportado pode
+# ser reimportado.
+
+TAMANHO_LOTE_IMPORTACAO = 500
+
+# Máximo de linhas com erro detalhadas no relatório (o total é sempre informado)
+MAX_ERROS_RELATORIO = 1000
+
+EXTENSOES_IMPORTACAO = {'csv', 'xlsx'}
+
+STATUS_COTACAO_IMPORTACAO = ['Análise Comercial', 'Análise Suprimentos', 'Liberado para Venda', 'Cotação Perdida']
+STATUS_PESQUISA_IMPORTACAO = ['Análise Comercial', 'Liberado para Venda']
+
+# Valores que o formulário de cotação rejeita no nome do cooperado
+_NOMES_COOPERADO_INVALIDOS = {'cooperado não encontrado', 'erro na busca', 'undefined', 'null'}
+
+# Campos de produto de uma linha de cotação: o layout exportado usa o prefixo produto_
+_CAMPOS_PRODUTO = [
+    'sku_produto', 'nome_produto', 'volume', 'unidade_medida', 'preco_unitario', 'valor_total',
+    'fornecedor', 'preco_custo', 'valor_frete', 'prazo_entrega_fornecedor', 'valor_total_com_frete'
+]
+
+
+class ErroLinha(ValueError):
+    """Linha da planilha rejeitada; a mensagem vai para o relatório"""
+
+
+# ----- Leitura -----
+
+def _nome_coluna(cabecalho):
+    if cabecalho is None:
+        return ''
+    return normalizar_texto(str(cabecalho).replace('_', ' ')).replace(' ', '_')
+
+
+def _valor_celula(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, datetime):
+        return valor.strftime('%Y-%m-%d')
+    if isinstance(valor, date):
+        return valor.isoformat()
+    if isinstance(valor, str):
+        return valor.strip()
+    return valor
+
+
+def _linhas_csv(arquivo):
+    texto = io.TextIOWrapper(arquivo, encoding='utf-8-sig', newline='')
+    primeira = texto.readline()
+    delimitador = ';' if primeira.count(';') > primeira.count(',') else ','
+    cabecalho = [_nome_coluna(c) for c in next(csv.reader([primeira], delimiter=delimitador), [])]
+    for valores in csv.reader(texto, delimiter=delimitador):
+        if any(v.strip() for v in valores):
+            yield dict(zip(cabecalho, (_valor_celula(v) for v in valores)))
+    texto.detach()
+
+
+def _linhas_xlsx(arquivo):
+    workbook = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        linhas = workbook.active.iter_rows(values_only=True)
+        cabecalho = [_nome_coluna(c) for c in next(linhas, ())]
+        for valores in linhas:
+            if any(v not in (None, '') for v in valores):
+                yield dict(zip(cabecalho, (_valor_celula(v) for v in valores)))
+    finally:
+        workbook.close()
+
+
+def ler_planilha(arquivo, extensao):
+    """
+    Itera as linhas de um CSV (separado por ; ou ,) ou XLSX como dicts
+    {coluna normalizada: valor}, sem carregar o arquivo inteiro em memória.
+
+    Args:
+        arquivo: Arquivo binário aberto (upload ou disco)
+        extensao: 'csv' ou 'xlsx'
+    """
+    if extensao == 'csv':
+        return _linhas_csv(arquivo)
+    if extensao == 'xlsx':
+        return _linhas_xlsx(arquivo)
+    raise ValueError(f'Formato não suportado: {extensao}. Use CSV ou XLSX.')
+
+
+# ----- Conversão e validação -----
+
+def _texto(linha, campo):
+    valor = linha.get(campo, '')
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)  # matrícula/código lidos como número no Excel
+    return str(valor).strip() if valor not in (None, '') else ''
+
+
+def _numero(linha, campo, obrigatorio=False):
+    valor = linha.get(campo, '')
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    texto = str(valor).replace('R$', '').replace(' ', '')
+    if not texto or texto == 'null':
+        if obrigatorio:
+            raise ErroLinha(f'{campo} é obrigatório')
+        return None
+    if ',' in texto:
+        texto = texto.replace('.', '').replace(',', '.')
+    try:
+        return float(texto)
+    except ValueError:
+        raise ErroLinha(f'{campo} inválido: {valor}')
+
+
+def _data(linha, campo):
+    texto = _texto(linha, campo)
+    if not texto:
+        return None
+    for formato in ('%Y-%m-%d', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(texto[:10], formato).date()
+        except ValueError:
+            continue
+    raise ErroLinha(f'{campo} inválido: {texto}')
+
+
+class _Resolvedor:
+    """Resolve matrícula, código de produto e mesorregião contra os dados mestres"""
+
+    def __init__(self):
+        self.contas = dados_mestres_disponiveis('contas')
+        self.produtos = dados_mestres_disponiveis('produtos')
+        self.mesorregioes = {
+            normalizar_texto(opcao['FILIAL']): opcao['MESOREGIÃO GEOGRÁFICA']
+            for opcao in carregar_filiais_mesoregioes()
+        }
+
+    def cooperado(self, matricula, nome):
+        if not matricula:
+            raise ErroLinha('matricula_cooperado é obrigatório')
+        if not self.contas:
+            return nome
+        encontrado = buscar_conta_por_matricula(matricula)
+        if encontrado is None:
+            raise ErroLinha(f'Matrícula não encontrada no cadastro: {matricula}')
+        return nome or encontrado
+
+    def produto(self, codigo, nome):
+        if not codigo or not self.produtos:
+            return nome
+        encontrado = buscar_produto_por_codigo(codigo)
+        if encontrado is None:
+            raise ErroLinha(f'Código de produto não encontrado no cadastro: {codigo}')
+        return nome or encontrado
+
+    def mesorregiao(self, filial, numero):
+        return numero or self.mesorregioes.get(normalizar_texto(filial), '')
+
+
+def _status(linha, opcoes):
+    status = _texto(linha, 'status') or 'Análise Comercial'
+    if status not in opcoes:
+        raise ErroLinha(f'Status inválido: {status}')
+    return status
+
+
+def _opcional(linha, campo):
+    return _texto(linha, campo) or None
+
+
+def _pesquisa_da_linha(linha, resolvedor, agora):
+    """Valida a linha e devolve os valores das colunas de PesquisaMercado"""
+    erros = []
+
+    def campo(funcao, *args):
+        try:
+            return funcao(*args)
+        except ErroLinha as e:
+            erros.append(str(e))
+
+    nome_filial = _texto(linha, 'nome_filial')
+    valores = {
+        'data': campo(_data, linha, 'data') or agora.date(),
+        'nome_filial': nome_filial,
+        'numero_mesorregiao': resolvedor.mesorregiao(nome_filial, _texto(linha, 'numero_mesorregiao')),
+        'matricula_cooperado': _texto(linha, 'matricula_cooperado'),
+        'nome_cooperado': campo(resolvedor.cooperado, _texto(linha, 'matricula_cooperado'),
+                                _texto(linha, 'nome_cooperado')),
+        'codigo_produto': _texto(linha, 'codigo_produto'),
+        'nome_produto': campo(resolvedor.produto, _texto(linha, 'codigo_produto'), _texto(linha, 'nome_produto')),
+        'quantidade_cotada': campo(_numero, linha, 'quantidade_cotada', True),
+        'forma_pagamento': _texto(linha, 'forma_pagamento'),
+        'nome_concorrente': _texto(linha, 'nome_concorrente'),
+        'valor_concorrente': campo(_numero, linha, 'valor_concorrente', True),
+        'valor_cooxupe': campo(_numero, linha, 'valor_cooxupe'),
+        'analista_comercial': _texto(linha, 'analista_comercial'),
+        'observacoes': _texto(linha, 'observacoes'),
+        'status': campo(_status, linha, STATUS_PESQUISA_IMPORTACAO),
+        'data_entrada_status': agora,
+        'data_ultima_modificacao': agora,
+        'cultura': _opcional(linha, 'cultura'),
+        'nome_vendedor': _opcional(linha, 'nome_vendedor'),
+        'comprador': _opcional(linha, 'comprador'),
+        'prazo_entrega': campo(_data, linha, 'prazo_entrega')
+    }
+    # Mesmos obrigatórios de criar_pesquisa
+    for obrigatorio in ('nome_filial', 'numero_mesorregiao', 'nome_cooperado', 'nome_produto',
+                        'forma_pagamento', 'nome_concorrente'):
+        if valores[obrigatorio] == '':  # None: o campo já gerou erro próprio
+            erros.append(f'{obrigatorio} é obrigatório')
+    if erros:
+        raise ErroLinha('; '.join(erros))
+    return valores
+
+
+def _cabecalho_cotacao(linha, resolvedor, agora):
+    erros = []
+
+    def campo(funcao, *args):
+        try:
+            return funcao(*args)
+        except ErroLinha as e:
+            erros.append(str(e))
+
+    nome_filial = _texto(linha, 'nome_filial')
+    cultura = _texto(linha, 'cultura')
+    valores = {
+        'data': campo(_data, linha, 'data') or agora.date(),
+        'nome_filial': nome_filial,
+        'numero_mesorregiao': resolvedor.mesorregiao(nome_filial, _texto(linha, 'numero_mesorregiao')),
+        'matricula_cooperado': _texto(linha, 'matricula_cooperado'),
+        'nome_cooperado': campo(resolvedor.cooperado, _texto(linha, 'matricula_cooperado'),
+                                _texto(linha, 'nome_cooperado')),
+        'status': campo(_status, linha, STATUS_COTACAO_IMPORTACAO),
+        'data_entrada_status': agora,
+        'data_ultima_modificacao': agora,
+        'analista_comercial': _texto(linha, 'analista_comercial'),
+        'comprador': _texto(linha, 'comprador'),
+        'observacoes': _texto(linha, 'observacoes'),
+        'forma_pagamento': _texto(linha, 'forma_pagamento'),
+        'prazo_entrega': campo(_data, linha, 'prazo_entrega'),
+        'cultura': cultura,
+        'nome_vendedor': _texto(linha, 'nome_vendedor'),
+        'motivo_venda_perdida': _texto(linha, 'motivo_venda_perdida')
+    }
+    # Mesmos obrigatórios de criar_cotacao (filial dispensada para Soja/Milho)
+    obrigatorios = ['nome_cooperado', 'analista_comercial', 'nome_vendedor']
+    if cultura not in ('Soja', 'Milho'):
+        obrigatorios.append('nome_filial')
+    for obrigatorio in obrigatorios:
+        if valores[obrigatorio] == '':  # None: o campo já gerou erro próprio
+            erros.append(f'{obrigatorio} é obrigatório')
+    if str(valores['nome_cooperado'] or '').lower() in _NOMES_COOPERADO_INVALIDOS:
+        erros.append(f'nome_cooperado inválido: {valores["nome_cooperado"]}')
+    if erros:
+        raise ErroLinha('; '.join(erros))
+    return valores
+
+
+def _produto_da_linha(linha, resolvedor):
+    dados = {}
+    for campo in _CAMPOS_PRODUTO:
+        # valor_total sem prefixo é o total da cotação na exportação, não o do produto
+        chaves = [f'produto_{campo}'] if campo == 'valor_total' else [f'produto_{campo}', campo]
+        dados[campo] = next((linha[c] for c in chaves if linha.get(c) not in (None, '')), '')
+    if not any(dados[c] for c in ('sku_produto', 'nome_produto')):
+        return None  # cotação sem produtos
+    dados['volume'] = _numero({'volume': dados['volume']}, 'volume') or 0.0
+    for campo in ('preco_unitario', 'valor_total', 'preco_custo', 'valor_frete', 'valor_total_com_frete'):
+        dados[campo] = _numero({campo: dados[campo]}, campo) or 0.0
+    dados['sku_produto'] = _texto(dados, 'sku_produto')
+    dados['nome_produto'] = resolvedor.produto(dados['sku_produto'], str(dados['nome_produto']))
+    if not dados['nome_produto']:
+        raise ErroLinha('nome_produto é obrigatório')
+    return valores_produto(dados)
+
+
+# ----- Gravação -----
+
+class _Relatorio:
+    def __init__(self, tipo):
+        self.tipo = tipo
+        self.total_linhas = 0
+        self.importados = 0
+        self.total_erros = 0
+        self.erros = []
+        self.por_status = {}
+
+    def erro(self, linhas, mensagem):
+        for numero in linhas:
+            self.total_erros += 1
+            if len(self.erros) < MAX_ERROS_RELATORIO:
+                self.erros.append({'linha': numero, 'erro': mensagem})
+
+    def to_dict(self):
+        return {
+            'tipo': self.tipo,
+            'total_linhas': self.total_linhas,
+            'importados': self.importados,
+            'total_erros': self.total_erros,
+            'erros': self.erros
+        }
+
+
+def _gravar_pesquisas(valores):
+    """Pesquisas não têm filhos: um INSERT em lote que, com RETURNING, já devolve os ids"""
+    if db.engine.dialect.insert_executemany_returning:
+        ids = db.session.scalars(
+            insert(PesquisaMercado).returning(PesquisaMercado.id),
+            [valores_normalizados(PesquisaMercado, v) for v in valores]
+        ).all()
+        # INSERT em lote não passa pelo after_flush
+        indexar_registros('pesquisa', ids)
+    else:
+        db.session.add_all(PesquisaMercado(**v) for v in valores)
+
+
+def _gravar_cotacoes(cotacoes):
+    """
+    Cotação e produtos pelo ORM (o flush agrupa os INSERTs de cada tabela).
+    Os objetos são criados a cada tentativa: após um rollback, um bloco
+    pode ser regravado em partes.
+    """
+    for valores, valores_produtos in cotacoes:
+        produtos = [ProdutoCotacao(**produto) for produto in valores_produtos]
+        cotacao = Cotacao(produtos=produtos, **valores)
+        cotacao.atualizar_resumo_produtos(produtos)
+        db.session.add(cotacao)
+
+
+def _gravar_bloco(bloco, gravar, relatorio):
+    """
+    Grava um bloco de (linhas_da_planilha, status, registro) em uma transação
+    curta. Se o banco rejeitar o bloco (restrição, tamanho de coluna), ele é
+    dividido ao meio e cada metade é regravada, até sobrar só o registro com
+    erro, que vai para o relatório com a mensagem do banco.
+    """
+    if not bloco:
+        return
+    try:
+        gravar([registro for _, _, registro in bloco])
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        if len(bloco) > 1:
+            meio = len(bloco) // 2
+            _gravar_bloco(bloco[:meio], gravar, relatorio)
+            _gravar_bloco(bloco[meio:], gravar, relatorio)
+        else:
+            relatorio.erro(bloco[0][0], f'Falha ao gravar: {getattr(e, "orig", None) or e}')
+        return
+    for _, status, _ in bloco:
+        relatorio.por_status[status] = relatorio.por_status.get(status, 0) + 1
+    relatorio.importados += len(bloco)
+    # Registros gravados não precisam continuar na sessão
+    db.session.expunge_all()
+
+
+def _registros_pesquisa(linhas, resolvedor, relatorio, agora):
+    for numero, linha in linhas:
+        try:
+            valores = _pesquisa_da_linha(linha, resolvedor, agora)
+        except ErroLinha as e:
+            relatorio.erro([numero], str(e))
+            continue
+        yield [numero], valores['status'], valores
+
+
+def _registros_cotacao(linhas, resolvedor, relatorio, agora):
+    """
+    Agrupa linhas consecutivas com o mesmo valor na coluna id (layout da
+    exportação: uma linha por produto) em uma única cotação. Linhas sem id
+    são uma cotação cada.
+    """
+    grupo, chave_grupo = [], None
+
+    def montar(grupo):
+        numeros = [numero for numero, _ in grupo]
+        try:
+            valores = _cabecalho_cotacao(grupo[0][1], resolvedor, agora)
+            produtos = []
+            for numero, linha in grupo:
+                try:
+                    produto = _produto_da_linha(linha, resolvedor)
+                except ErroLinha as e:
+                    raise ErroLinha(f'linha {numero}: {e}')
+                if produto is not None:
+                    produtos.append(produto)
+        except ErroLinha as e:
+            relatorio.erro(numeros, str(e))
+            return None
+        return numeros, valores['status'], (valores, produtos)
+
+    for numero, linha in linhas:
+        chave = _texto(linha, 'id')
+        if grupo and (not chave or chave != chave_grupo):
+            resultado = montar(grupo)
+            if resultado:
+                yield resultado
+            grupo = []
+        grupo.append((numero, linha))
+        chave_grupo = chave
+    if grupo:
+        resultado = montar(grupo)
+        if resultado:
+            yield resultado
+
+
+def _notificar_importacao(relatorio):
+    """Um e-mail por departamento com o total importado, em vez de um por registro"""
+    nome = 'cotações' if relatorio.tipo == 'cotacao' else 'pesquisas'
+    for status, quantidade in relatorio.por_status.items():
+        enfileirar_email(
+            obter_email_por_status(status),
+            assunto=f'{quantidade} {nome} importadas',
+            corpo_html=f'<p>{quantidade} {nome} foram importadas por planilha com o status {status}.</p>'
+        )
+    db.session.commit()
+    notificar_worker_email()
+
+
+def importar_planilha(arquivo, extensao, tipo, tamanho_lote=TAMANHO_LOTE_IMPORTACAO):
+    """
+    Importa cotações ou pesquisas de uma planilha CSV/XLSX.
+
+    Args:
+        arquivo: Arquivo binário aberto
+        extensao: 'csv' ou 'xlsx'
+        tipo: 'cotacao' ou 'pesquisa'
+        tamanho_lote: Registros gravados por transação
+
+    Returns:
+        dict com total_linhas, importados, total_erros e erros
+        ([{'linha': n, 'erro': '...'}], numerados como na planilha)
+    """
+    if tipo not in ('cotacao', 'pesquisa'):
+        raise ValueError(f'Tipo de importação inválido: {tipo}')
+    relatorio = _Relatorio(tipo)
+    resolvedor = _Resolvedor()
+    agora = datetime.now()
+
+    def numeradas():
+        # Linha 1 é o cabeçalho
+        for numero, linha in enumerate(ler_planilha(arquivo, extensao), start=2):
+            relatorio.total_linhas += 1
+            yield numero, linha
+
+    if tipo == 'cotacao':
+        montar, gravar = _registros_cotacao, _gravar_cotacoes
+    else:
+        montar, gravar = _registros_pesquisa, _gravar_pesquisas
+    bloco = []
+    for item in montar(numeradas(), resolvedor, relatorio, agora):
+        bloco.append(item)
+        if len(bloco) >= tamanho_lote:
+            _gravar_bloco(bloco, gravar, relatorio)
+            bloco = []
+    _gravar_bloco(bloco, gravar, relatorio)
+
+    if relatorio.importados:
+        invalidar_estatisticas_dashboard()
+        _notificar_importacao(relatorio)
+    return relatorio.to_dict()
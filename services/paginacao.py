@@ -0,0 +1,142 @@
+import base64
+import json
+from datetime import date, datetime
+from sqlalchemy import and_, or_
+from sqlalchemy.types import Date, DateTime
+
+# Tamanho de página padrão e máximo aceito pelas rotas de listagem
+LIMITE_PADRAO = 50
+LIMITE_MAXIMO = 200
+
+# Colunas que podem ser usadas como chave de ordenação na paginação
+CHAVES_ORDENACAO = ['id', 'data', 'data_ultima_modificacao', 'data_entrada_status']
+# Cotações também podem ser ordenadas pelo resumo dos produtos
+CHAVES_ORDENACAO_COTACAO = CHAVES_ORDENACAO + ['valor_total']
+
+
+def _serializar_valor(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return valor
+
+
+def _desserializar_valor(coluna, valor):
+    if valor is None:
+        return None
+    try:
+        if isinstance(coluna.type, DateTime):
+            return datetime.fromisoformat(valor)
+        if isinstance(coluna.type, Date):
+            return date.fromisoformat(valor)
+    except (TypeError, ValueError):
+        raise ValueError('Cursor de paginação inválido')
+    return valor
+
+
+def codificar_cursor(ordenar_por, valor, ultimo_id):
+    """Gera o token opaco que aponta para a posição após o último registro da página"""
+    payload = json.dumps([ordenar_por, _serializar_valor(valor), ultimo_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor, ordenar_por):
+    """
+    Decodifica o token gerado por codificar_cursor.
+    Levanta ValueError se o token estiver malformado ou tiver sido gerado
+    para outra chave de ordenação.
+    """
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        payload = base64.urlsafe_b64decode((cursor + padding).encode('ascii'))
+        chave, valor, ultimo_id = json.loads(payload.decode('utf-8'))
+        ultimo_id = int(ultimo_id)
+    except Exception:
+        raise ValueError('Cursor de paginação inválido')
+    if chave != ordenar_por:
+        raise ValueError('Cursor de paginação gerado para outra ordenação')
+    return valor, ultimo_id
+
+
+def ler_parametros_paginacao(args, chaves_ordenacao=CHAVES_ORDENACAO):
+    """
+    Lê os parâmetros de paginação da query string.
+
+    Args:
+        args: request.args
+        chaves_ordenacao: Colunas aceitas em ordenar_por
+
+    Returns:
+        dict com limite, cursor, ordenar_por e ordem (sem parâmetros, a
+        primeira página com LIMITE_PADRAO registros)
+    """
+    try:
+        limite = int(args.get('limite', LIMITE_PADRAO))
+    except (TypeError, ValueError):
+        raise ValueError('Parâmetro limite inválido')
+    limite = max(1, min(limite, LIMITE_MAXIMO))
+
+    ordenar_por = args.get('ordenar_por', 'id')
+    if ordenar_por not in chaves_ordenacao:
+        raise ValueError(f'Não é possível ordenar por {ordenar_por}')
+
+    ordem = args.get('ordem', 'desc').lower()
+    if ordem not in ('asc', 'desc'):
+        raise ValueError('Parâmetro ordem deve ser asc ou desc')
+
+    return {
+        'limite': limite,
+        'cursor': args.get('cursor') or None,
+        'ordenar_por': ordenar_por,
+        'ordem': ordem
+    }
+
+
+def paginar_keyset(query, modelo, limite=LIMITE_PADRAO, cursor=None, ordenar_por='id', ordem='desc'):
+    """
+    Aplica paginação por cursor (keyset) a uma query.
+    Em vez de OFFSET, filtra pelos registros posteriores ao último da página
+    anterior, usando o id como desempate. O custo de cada página é constante,
+    independente de quantas páginas já foram percorridas.
+
+    Args:
+        query: Query SQLAlchemy já filtrada
+        modelo: Classe do modelo (Cotacao, PesquisaMercado)
+        limite: Quantidade máxima de registros na página
+        cursor: Token retornado na página anterior (opcional)
+        ordenar_por: Nome da coluna de ordenação
+        ordem: 'asc' ou 'desc'
+
+    Returns:
+        (registros, proximo_cursor) - proximo_cursor é None na última página
+    """
+    coluna = getattr(modelo, ordenar_por)
+    pk = modelo.id
+    desc = ordem == 'desc'
+    usa_pk = ordenar_por == 'id'
+
+    if cursor:
+        valor, ultimo_id = decodificar_cursor(cursor, ordenar_por)
+        if usa_pk:
+            query = query.filter(pk < ultimo_id if desc else pk > ultimo_id)
+        else:
+            valor = _desserializar_valor(coluna, valor)
+            if desc:
+                query = query.filter(or_(coluna < valor, and_(coluna == valor, pk < ultimo_id)))
+            else:
+                query = query.filter(or_(coluna > valor, and_(coluna == valor, pk > ultimo_id)))
+
+    if usa_pk:
+        ordenacao = [pk.desc() if desc else pk.asc()]
+    else:
+        ordenacao = [coluna.desc(), pk.desc()] if desc else [coluna.asc(), pk.asc()]
+
+    # Buscar um registro a mais para saber se existe próxima página
+    registros = query.order_by(*ordenacao).limit(limite + 1).all()
+
+    proximo_cursor = None
+    if len(registros) > limite:
+        registros = registros[:limite]
+        ultimo = registros[-1]
+        proximo_cursor = codificar_cursor(ordenar_por, getattr(ultimo, ordenar_por), ultimo.id)
+
+    return registros, proximo_cursor
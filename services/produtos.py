@@ -0,0 +1,166 @@
+import json
+import re
+from datetime import date, datetime
+from types import SimpleNamespace
+from sqlalchemy import insert
+from models import db, ProdutoCotacao
+from services.busca import indexar_registros
+from services.utils import valores_normalizados
+
+# ===== LINHAS DE PRODUTO DA COTAÇÃO =====
+# Conversão dos dados enviados pelo formulário (strings, moeda em R$) para os
+# valores das colunas de ProdutoCotacao, e sincronização dos produtos de uma
+# cotação existente gravando apenas as linhas que realmente mudaram.
+
+# Chaves do formulário no formato produtos[0][campo]
+_RE_CAMPO_PRODUTO = re.compile(r'produtos\[(\d+)\]\[(.+)\]')
+
+def parse_money(value):
+    """Converte 'R$ 1.234,56' em 1234.56 (0.0 para vazio ou inválido)"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not value or value == '':
+        return 0.0
+    try:
+        clean_value = str(value).replace('R$', '').replace(' ', '').replace('.', '').replace(',', '.')
+        return float(clean_value) if clean_value else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _parse_data(valor):
+    if valor in (None, '', 'null'):
+        return None
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d').date()
+    except (ValueError, TypeError):
+        return None
+
+
+def valores_produto(produto_data):
+    """
+    Converte uma linha de produto do formulário nos valores das colunas.
+
+    Args:
+        produto_data: dict com os campos enviados (strings)
+
+    Returns:
+        dict {coluna: valor} de ProdutoCotacao
+    """
+    return {
+        'sku_produto': produto_data.get('sku_produto', ''),
+        'nome_produto': produto_data.get('nome_produto', ''),
+        'volume': float(produto_data.get('volume', 0)) if produto_data.get('volume') else 0.0,
+        'unidade_medida': produto_data.get('unidade_medida', ''),
+        'preco_unitario': parse_money(produto_data.get('preco_unitario', '')),
+        'valor_total': parse_money(produto_data.get('valor_total', '')),
+        'fornecedor': produto_data.get('fornecedor', ''),
+        'preco_custo': parse_money(produto_data.get('preco_custo', '')),
+        'valor_frete': parse_money(produto_data.get('valor_frete', '')),
+        'prazo_entrega_fornecedor': _parse_data(produto_data.get('prazo_entrega_fornecedor', '')),
+        'valor_total_com_frete': parse_money(produto_data.get('valor_total_com_frete', ''))
+    }
+
+
+def ler_produtos_formulario(form):
+    """
+    Lê as linhas de produto enviadas no formulário, seja no campo
+    produtos_json ou nas chaves produtos[i][campo].
+
+    Returns:
+        Lista de dicts (um por linha, na ordem do índice)
+    """
+    produtos_json = form.get('produtos_json')
+    if produtos_json:
+        return json.loads(produtos_json)
+
+    produtos_dict = {}
+    for key in form.keys():
+        m = _RE_CAMPO_PRODUTO.match(key)
+        if m:
+            produtos_dict.setdefault(int(m.group(1)), {})[m.group(2)] = form[key]
+    return [produtos_dict[idx] for idx in sorted(produtos_dict)]
+
+
+def inserir_produtos(cotacao, produtos_data):
+    """
+    Grava os produtos de uma cotação recém-criada com um único INSERT em lote
+    (executemany), convertendo todas as linhas antes de escrever. Também
+    atualiza o resumo (valor_total/fornecedor) e o índice de busca da cotação.
+
+    Args:
+        cotacao: Cotação já com id (após flush)
+        produtos_data: Lista de dicts do formulário
+    """
+    linhas = [valores_produto(produto_data) for produto_data in produtos_data]
+    if linhas:
+        db.session.execute(insert(ProdutoCotacao), [
+            valores_normalizados(ProdutoCotacao, dict(valores, cotacao_id=cotacao.id))
+            for valores in linhas
+        ])
+        # Gravação fora do ORM: a coleção em memória e o índice de busca não a veem
+        db.session.expire(cotacao, ['produtos'])
+        indexar_registros('cotacao', [cotacao.id])
+    cotacao.atualizar_resumo_produtos([SimpleNamespace(**valores) for valores in linhas])
+
+
+def _id_produto(produto_data):
+    try:
+        return int(produto_data.get('id'))
+    except (TypeError, ValueError):
+        return None
+
+
+def sincronizar_produtos(cotacao, produtos_data):
+    """
+    Aplica a lista de produtos recebida a uma cotação existente.
+    Cada linha é associada a um produto atual pelo id ou, sem id, pelo SKU,
+    e só os campos alterados são gravados. Linhas sem correspondente viram
+    INSERT e produtos que não aparecem mais na lista viram DELETE. Linhas
+    iguais não geram escrita.
+
+    Args:
+        cotacao: Cotação com a coleção produtos carregada
+        produtos_data: Lista de dicts do formulário, na ordem da tela
+
+    Returns:
+        Lista dos produtos da cotação na ordem recebida
+    """
+    livres = sorted(cotacao.produtos, key=lambda produto: produto.id)
+    valores_linhas = [valores_produto(produto_data) for produto_data in produtos_data]
+    associados = [None] * len(produtos_data)
+
+    def reservar(indice, produto):
+        associados[indice] = produto
+        livres.remove(produto)
+
+    por_id = {produto.id: produto for produto in livres}
+    for indice, produto_data in enumerate(produtos_data):
+        produto = por_id.get(_id_produto(produto_data))
+        if produto is not None and produto in livres:
+            reservar(indice, produto)
+
+    for indice, valores in enumerate(valores_linhas):
+        if associados[indice] is None and valores['sku_produto']:
+            produto = next((p for p in livres if p.sku_produto == valores['sku_produto']), None)
+            if produto is not None:
+                reservar(indice, produto)
+
+    for produto in livres:
+        cotacao.produtos.remove(produto)  # delete-orphan: DELETE no flush
+
+    resultado = []
+    for produto, valores in zip(associados, valores_linhas):
+        if produto is None:
+            produto = ProdutoCotacao(**valores)
+            cotacao.produtos.append(produto)
+        else:
+            for campo, valor in valores.items():
+                if getattr(produto, campo) != valor:
+                    setattr(produto, campo, valor)
+        resultado.append(produto)
+    return resultado
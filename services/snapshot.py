@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import pandas as pd
+from config import Config
+
+# Versão do formato do snapshot; incrementar invalida todos os snapshots existentes
+VERSAO_SNAPSHOT = 1
+
+
+def _caminhos_snapshot(path_excel):
+    nome = os.path.splitext(os.path.basename(path_excel))[0]
+    base = os.path.join(Config.CACHE_FOLDER, nome)
+    return base + '.pkl', base + '.json'
+
+
+def _hash_arquivo(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+def _ler_metadados(path_meta):
+    try:
+        with open(path_meta, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def obter_metadados_snapshot(path_excel):
+    """Retorna os metadados (mtime, tamanho, sha256) do snapshot da planilha, ou None"""
+    return _ler_metadados(_caminhos_snapshot(path_excel)[1])
+
+
+def _gravar_atomico(path, escrever):
+    """Grava em arquivo temporário e renomeia, para nunca deixar um snapshot pela metade"""
+    tmp = f'{path}.{os.getpid()}.tmp'
+    try:
+        escrever(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _gravar_metadados(path_meta, metadados):
+    def escrever(tmp):
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(metadados, f)
+    _gravar_atomico(path_meta, escrever)
+
+
+def ler_planilha_com_snapshot(path_excel, preparar, forcar=False):
+    """
+    Lê uma planilha usando um snapshot binário (pickle do DataFrame já preparado).
+    O snapshot é válido enquanto mtime/tamanho da planilha não mudarem; se mudarem,
+    o SHA-256 do conteúdo decide se ela realmente foi alterada. Só então a
+    planilha é lida de novo com pd.read_excel e o snapshot é regravado.
+
+    Args:
+        path_excel: Caminho da planilha de origem
+        preparar: Função (df) -> (df, error) que normaliza as colunas lidas
+        forcar: Ignora o snapshot existente e relê a planilha
+
+    Returns:
+        df (pandas.DataFrame): DataFrame preparado
+        error (str): Mensagem de erro se houver
+    """
+    path_snapshot, path_meta = _caminhos_snapshot(path_excel)
+    stat = os.stat(path_excel)
+    metadados = None if forcar else _ler_metadados(path_meta)
+
+    if metadados and metadados.get('versao') == VERSAO_SNAPSHOT and os.path.exists(path_snapshot):
+        mesmo_arquivo = metadados.get('mtime') == stat.st_mtime and metadados.get('tamanho') == stat.st_size
+        if not mesmo_arquivo and metadados.get('sha256') == _hash_arquivo(path_excel):
+            # Arquivo regravado com o mesmo conteúdo: apenas atualizar a chave
+            metadados.update(mtime=stat.st_mtime, tamanho=stat.st_size)
+            try:
+                _gravar_metadados(path_meta, metadados)
+            except OSError:
+                pass
+            mesmo_arquivo = True
+        if mesmo_arquivo:
+            try:
+                return pd.read_pickle(path_snapshot), None
+            except Exception as e:
+                print(f"Aviso: snapshot {path_snapshot} inválido, relendo planilha: {e}")
+
+    sha256 = _hash_arquivo(path_excel)
+    df, error = preparar(pd.read_excel(path_excel))
+    if error:
+        return None, error
+
+    try:
+        os.makedirs(Config.CACHE_FOLDER, exist_ok=True)
+        _gravar_atomico(path_snapshot, df.to_pickle)
+        _gravar_metadados(path_meta, {
+            'versao': VERSAO_SNAPSHOT,
+            'origem': os.path.basename(path_excel),
+            'mtime': stat.st_mtime,
+            'tamanho': stat.st_size,
+            'sha256': sha256
+        })
+    except OSError as e:
+        # Sem permissão de escrita: segue com o DataFrame lido, sem snapshot
+        print(f"Aviso: não foi possível gravar o snapshot de {path_excel}: {e}")
+
+    return df, None
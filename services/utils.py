@@ -1,26 +1,51 @@
 import os
 import pandas as pd
 from datetime import datetime
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill
 from config import Config
-from models import PesquisaMercado
+from sqlalchemy import and_, event, false, func, or_
+from models import Cotacao, ProdutoCotacao, PesquisaMercado
+from services.exportacao import escrever_excel, nome_arquivo_exportacao
+from services.snapshot import ler_planilha_com_snapshot, obter_metadados_snapshot
 import unicodedata
 import re
+import heapq
+import hashlib
+import json
+import threading
+import time
 
 # ===== CACHE GLOBAL PARA PERFORMANCE =====
-# Os DataFrames são carregados uma única vez e reutilizados
+# Os DataFrames são carregados uma única vez e reutilizados.
+# Cada entrada guarda um pacote imutável com o DataFrame, os índices derivados
+# e a versão dos dados; a recarga monta um pacote novo e troca a referência
+# de uma vez, então uma busca em andamento nunca vê um cache pela metade.
 _cache = {
     'contas': None,
     'produtos': None,
     'filiais': None
 }
 
+# Planilhas de dados mestres
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+CONTAS_PATH = os.path.join(DATA_DIR, 'Contas.xlsx')
+PRODUTOS_PATH = os.path.join(DATA_DIR, 'Produtos.xlsx')
+FILIAIS_PATH = os.path.join(DATA_DIR, 'FILIAL - MESOREGIAO v1.xlsx')
+
+# Intervalo (segundos) entre verificações de alteração das planilhas
+INTERVALO_MONITOR_DADOS_MESTRES = 60
+
+_recarga_lock = threading.Lock()
+_monitor = {'thread': None}
+
+# Tamanho máximo dos prefixos indexados; termos maiores são conferidos na hora
+MAX_PREFIXO_INDICE = 8
+
 def exportar_para_excel(cotacoes, filename=None):
     """
     Exporta cotações ou pesquisas para um arquivo Excel
     Cada produto de cada cotação será exportado em uma linha separada.
     A coluna do produto (nome_produto) trará apenas o nome do produto.
+    As linhas são gravadas em streaming (workbook write-only), sem DataFrame.
     
     Args:
         cotacoes: Lista de objetos Cotacao/PesquisaMercado ou um único objeto
@@ -32,79 +57,16 @@ def exportar_para_excel(cotacoes, filename=None):
     if not isinstance(cotacoes, list):
         cotacoes = [cotacoes]
     
-    # Explodir produtos: cada linha será uma cotação-produto
-    rows = []
-    for cotacao in cotacoes:
-        cot_dict = cotacao.to_dict()
-        produtos = cot_dict.get('produtos', [])
-        if produtos:
-            for produto in produtos:
-                row = cot_dict.copy()
-                row.pop('produtos', None)
-                # 1) Fornecedor: garantir que o campo 'fornecedor' seja o do produto
-                row['fornecedor'] = produto.get('fornecedor', '')
-                # Adicionar campos do produto individualmente
-                for k, v in produto.items():
-                    row[f'produto_{k}'] = v
-                # 2) Excluir campo 'produto_fornecedor' se existir
-                if 'produto_fornecedor' in row:
-                    row.pop('produto_fornecedor')
-                # 3) Excluir campo 'nome_produto' duplicado (deixar só o do produto)
-                if 'nome_produto' in row:
-                    row.pop('nome_produto')
-                # Adicionar o nome do produto individualmente (coluna nome_produto)
-                row['nome_produto'] = produto.get('nome_produto', '')
-                rows.append(row)
-        else:
-            row = cot_dict.copy()
-            row['nome_produto'] = ''
-            rows.append(row)
-    
-    # Criar DataFrame
-    df = pd.DataFrame(rows)
-
-    # Remover coluna 'nome_produto' que não seja do produto individual (caso exista)
-    # Se houver mais de uma coluna 'nome_produto', manter apenas a última adicionada (produto)
-    if 'nome_produto' in df.columns:
-        # Se existir uma coluna 'produto_nome_produto', preferir ela
-        if 'produto_nome_produto' in df.columns:
-            df = df.drop(columns=['nome_produto'])
-            df = df.rename(columns={'produto_nome_produto': 'nome_produto'})
-
-    # Se for exportação de pesquisa, garantir coluna nome_produto
-    if all(isinstance(c, PesquisaMercado) for c in cotacoes):
-        if 'nome_produto' not in df.columns:
-            df['nome_produto'] = [c.nome_produto for c in cotacoes]
-        else:
-            # Preencher valores vazios
-            df['nome_produto'] = df['nome_produto'].fillna('')
-    
-    # Remover colunas de anexos se existirem (não é necessário na exportação)
-    colunas_anexos = ['anexo_filepath', 'anexos']
-    colunas_a_remover = [col for col in colunas_anexos if col in df.columns]
-    if colunas_a_remover:
-        df = df.drop(columns=colunas_a_remover)
+    modelo = PesquisaMercado if isinstance(cotacoes[0], PesquisaMercado) else Cotacao
     
     # Gerar nome do arquivo se não fornecido
     if not filename:
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        if len(cotacoes) == 1:
-            # Verificar se é uma pesquisa ou cotação
-            prefixo = "Pesquisa" if isinstance(cotacoes[0], PesquisaMercado) else "Cotacao"
-            filename = f"{prefixo}_{cotacoes[0].id}_{timestamp}.xlsx"
-        else:
-            # Verificar se é uma lista de pesquisas ou cotações
-            prefixo = "Pesquisas" if isinstance(cotacoes[0], PesquisaMercado) else "Cotacoes"
-            filename = f"{prefixo}_Multiplas_{timestamp}.xlsx"
+        filename = nome_arquivo_exportacao(modelo, len(cotacoes), cotacoes[0].id)
     
     # Caminho completo do arquivo
     filepath = os.path.join(Config.EXPORT_FOLDER, filename)
     
-    # Garantir que a pasta existe
-    os.makedirs(os.path.dirname(filepath), exist_ok=True)
-    
-    # Exportar para Excel
-    df.to_excel(filepath, index=False)
+    escrever_excel(cotacoes, modelo, filepath)
     
     return filepath
 
@@ -152,9 +114,56 @@ def texto_contem_busca(texto_original, termo_busca):
     # Verificar se o termo normalizado está contido no texto normalizado
     return termo_normalizado in texto_normalizado
 
+# ===== COLUNAS NORMALIZADAS PARA BUSCA =====
+# Cada coluna pesquisável tem uma coluna "sombra" <coluna>_busca com o
+# normalizar_texto do valor (sem acento, minúsculas), indexada. Ela é
+# preenchida antes de todo INSERT/UPDATE feito pelo ORM; inserções em lote
+# via Core devem usar valores_normalizados().
+CAMPOS_NORMALIZADOS = {
+    Cotacao: {'nome_cooperado': 'nome_cooperado_busca', 'nome_filial': 'nome_filial_busca'},
+    ProdutoCotacao: {'nome_produto': 'nome_produto_busca', 'fornecedor': 'fornecedor_busca'},
+    PesquisaMercado: {
+        'nome_cooperado': 'nome_cooperado_busca',
+        'nome_filial': 'nome_filial_busca',
+        'nome_produto': 'nome_produto_busca',
+        'nome_concorrente': 'nome_concorrente_busca'
+    }
+}
+
+def _normalizar_para_coluna(valor):
+    return normalizar_texto(valor)[:100] or None
+
+def valores_normalizados(modelo, valores):
+    """
+    Retorna uma cópia do dicionário de valores com as colunas *_busca preenchidas.
+    Use em inserções/atualizações em lote que não passam pelo ORM.
+    """
+    valores = dict(valores)
+    for campo, sombra in CAMPOS_NORMALIZADOS.get(modelo, {}).items():
+        if campo in valores:
+            valores[sombra] = _normalizar_para_coluna(valores[campo])
+    return valores
+
+def _preencher_campos_normalizados(mapper, connection, target):
+    for campo, sombra in CAMPOS_NORMALIZADOS[type(target)].items():
+        setattr(target, sombra, _normalizar_para_coluna(getattr(target, campo)))
+
+for _modelo in CAMPOS_NORMALIZADOS:
+    event.listen(_modelo, 'before_insert', _preencher_campos_normalizados)
+    event.listen(_modelo, 'before_update', _preencher_campos_normalizados)
+
+def _coluna_normalizada(coluna):
+    modelo = getattr(coluna, 'class_', None)
+    sombra = CAMPOS_NORMALIZADOS.get(modelo, {}).get(getattr(coluna, 'key', None))
+    return getattr(modelo, sombra) if sombra else None
+
 def criar_filtro_busca_flexivel(coluna, termo_busca):
     """
-    Cria um filtro SQLAlchemy para busca flexível em uma coluna
+    Cria um filtro SQLAlchemy para busca flexível em uma coluna.
+    Em colunas com sombra normalizada (CAMPOS_NORMALIZADOS) a busca ignora
+    acentos e maiúsculas e é um intervalo de prefixo (coluna >= 'termo' AND
+    coluna < 'termp'), que usa o índice em qualquer banco. Para encontrar
+    palavras no meio do texto use a busca global (services/busca.py).
     """
     if not termo_busca:
         return None
@@ -165,103 +174,420 @@ def criar_filtro_busca_flexivel(coluna, termo_busca):
     if termo_normalizado.isdigit():
         return coluna == termo_busca
     
-    # Para texto, usar busca flexível com normalização
-    # Usar func.lower() e func.replace() para simular normalização no banco
-    from sqlalchemy import func
+    sombra = _coluna_normalizada(coluna)
+    if sombra is None:
+        # Coluna sem forma normalizada: substring sem índice
+        return func.lower(coluna).contains(termo_normalizado)
+    if not termo_normalizado:
+        return None
     
-    # Busca flexível: converter para minúsculas e buscar substring
-    return func.lower(coluna).contains(termo_normalizado.lower())
+    # normalizar_texto só produz [a-z0-9 ], então o próximo caractere sempre existe
+    limite_superior = termo_normalizado[:-1] + chr(ord(termo_normalizado[-1]) + 1)
+    return and_(sombra >= termo_normalizado, sombra < limite_superior)
+
+def criar_filtro_busca_registro(modelo, termo_busca, campo=None):
+    """
+    Filtro do campo de busca das listagens (?busca=&busca_por=).
+    
+    Args:
+        modelo: Cotacao ou PesquisaMercado
+        termo_busca: Texto digitado
+        campo: 'id', 'matricula', 'nome' ou None/'todos' (termo numérico busca
+            o id ou a matrícula exata, senão o início do nome sem acentos)
+    
+    Returns:
+        Expressão para query.filter ou None sem termo
+    """
+    termo_busca = (termo_busca or '').strip()
+    if not termo_busca:
+        return None
+    numerico = normalizar_texto(termo_busca).isdigit()
+    if campo == 'id':
+        return modelo.id == int(termo_busca) if termo_busca.isdigit() else false()
+    if campo == 'matricula':
+        return criar_filtro_busca_flexivel(modelo.matricula_cooperado, termo_busca)
+    if campo == 'nome':
+        return criar_filtro_busca_flexivel(modelo.nome_cooperado, termo_busca)
+    if numerico:
+        filtro = criar_filtro_busca_flexivel(modelo.matricula_cooperado, termo_busca)
+        return or_(modelo.id == int(termo_busca), filtro) if termo_busca.isdigit() else filtro
+    return criar_filtro_busca_flexivel(modelo.nome_cooperado, termo_busca)
 
 def carregar_filiais_mesoregioes(path_excel=None):
     if path_excel is None:
-        # Calcular o caminho relativo à pasta do projeto
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        path_excel = os.path.join(base_dir, 'data', 'FILIAL - MESOREGIAO v1.xlsx')
-    df = pd.read_excel(path_excel)
+        # Usar o cache de dados mestres (planilha padrão lida uma única vez)
+        pacote = _obter_pacote('filiais')
+        return pacote['opcoes'] if pacote is not None else []
+    df, _ = _preparar_filiais(pd.read_excel(path_excel))
+    opcoes = df.to_dict('records')
+    return opcoes
+
+def obter_filiais_serializadas():
+    """
+    Retorna o JSON já serializado das filiais e seu ETag (hash do conteúdo).
+    Returns:
+        (json_bytes, etag) ou (None, None) se a planilha não pôde ser carregada
+    """
+    pacote = _obter_pacote('filiais')
+    if pacote is None:
+        return None, None
+    return pacote['json'], pacote['etag']
+
+def _construir_indice(df, coluna_chave, coluna_valor):
+    """
+    Monta um dicionário chave -> valor a partir de duas colunas do DataFrame.
+    Em caso de chave repetida prevalece a primeira linha, como no filtro original.
+    """
+    indice = {}
+    for chave, valor in zip(df[coluna_chave], df[coluna_valor]):
+        indice.setdefault(chave, valor)
+    return indice
+
+def _construir_indice_nomes(nomes, chaves):
+    """
+    Monta um índice invertido de prefixos de palavras sobre os nomes normalizados
+    com normalizar_texto. Cada prefixo (até MAX_PREFIXO_INDICE caracteres) aponta
+    para a lista ordenada das posições dos registros que têm uma palavra iniciada por ele.
+    """
+    entradas = []
+    prefixos = {}
+    for posicao, (nome, chave) in enumerate(zip(nomes, chaves)):
+        nome_normalizado = normalizar_texto(nome)
+        palavras = nome_normalizado.split()
+        entradas.append((nome, chave, nome_normalizado, palavras))
+        vistos = set()
+        for palavra in palavras:
+            for tamanho in range(1, min(len(palavra), MAX_PREFIXO_INDICE) + 1):
+                vistos.add(palavra[:tamanho])
+        for prefixo in vistos:
+            prefixos.setdefault(prefixo, []).append(posicao)
+    return {'entradas': entradas, 'prefixos': prefixos}
+
+def _buscar_no_indice_nomes(indice, termo, limite=10):
+    """
+    Retorna até `limite` pares (nome, chave) cujos nomes têm, para cada palavra
+    do termo, uma palavra começando por ela (sem acentos, case-insensitive).
+    Ranking: nome idêntico, nome que começa pelo termo, mais palavras exatas, nome mais curto.
+    """
+    palavras_busca = normalizar_texto(termo).split()
+    if not palavras_busca:
+        return []
+
+    # Começar pela lista de posições mais curta e intersectar com as demais
+    listas = []
+    for palavra in palavras_busca:
+        posicoes = indice['prefixos'].get(palavra[:MAX_PREFIXO_INDICE])
+        if not posicoes:
+            return []
+        listas.append(posicoes)
+    listas.sort(key=len)
+    candidatos = set(listas[0])
+    for posicoes in listas[1:]:
+        candidatos.intersection_update(posicoes)
+        if not candidatos:
+            return []
+
+    termo_normalizado = ' '.join(palavras_busca)
+    longas = [p for p in palavras_busca if len(p) > MAX_PREFIXO_INDICE]
+    ranqueados = []
+    for posicao in candidatos:
+        nome, chave, nome_normalizado, palavras = indice['entradas'][posicao]
+        # Prefixos maiores que o indexado precisam ser conferidos por completo
+        if longas and not all(any(p.startswith(l) for p in palavras) for l in longas):
+            continue
+        exatas = sum(1 for p in palavras_busca if p in palavras)
+        ranqueados.append((
+            nome_normalizado != termo_normalizado,
+            not nome_normalizado.startswith(termo_normalizado),
+            -exatas,
+            len(nome_normalizado),
+            posicao
+        ))
+
+    melhores = heapq.nsmallest(limite, ranqueados)
+    return [indice['entradas'][r[-1]][:2] for r in melhores]
+
+def buscar_contas_por_nome(nome, limite=10):
+    """
+    Autocomplete de cooperados pelo nome usando o índice invertido.
+    Returns:
+        lista de tuplas (nome, matricula) ordenada por relevância
+    """
+    dados = _obter_pacote('contas')
+    if dados is None:
+        return []
+    return _buscar_no_indice_nomes(dados['indice_nomes'], nome, limite)
+
+def buscar_produtos_por_nome(nome, limite=10):
+    """
+    Autocomplete de produtos pelo nome usando o índice invertido.
+    Returns:
+        lista de tuplas (nome, codigo) ordenada por relevância
+    """
+    dados = _obter_pacote('produtos')
+    if dados is None:
+        return []
+    return _buscar_no_indice_nomes(dados['indice_nomes'], nome, limite)
+
+def buscar_conta_por_matricula(matricula):
+    """
+    Busca exata do nome do cooperado pela matrícula, usando o índice em memória.
+    Returns:
+        nome (str) ou None se não encontrado
+    """
+    dados = _obter_pacote('contas')
+    if dados is None:
+        return None
+    return dados['indice_chaves'].get(str(matricula).strip())
+
+def buscar_produto_por_codigo(codigo):
+    """
+    Busca exata do nome do produto pelo código, usando o índice em memória.
+    Returns:
+        nome (str) ou None se não encontrado
+    """
+    dados = _obter_pacote('produtos')
+    if dados is None:
+        return None
+    return dados['indice_chaves'].get(str(codigo).strip())
+
+def dados_mestres_disponiveis(nome):
+    """
+    Indica se a planilha de dados mestres ('contas', 'produtos' ou 'filiais')
+    pôde ser carregada, para distinguir "não encontrado" de "sem cadastro".
+    """
+    return _obter_pacote(nome) is not None
+
+def _preparar_contas(df):
+    """Normaliza as colunas lidas de Contas.xlsx"""
+    # Normalizar nomes das colunas (remover espaços extras)
+    df.columns = df.columns.str.strip()
+    
+    # Verificar colunas esperadas
+    if 'Matricula' not in df.columns or 'Nome da conta' not in df.columns:
+        return None, "Colunas 'Matricula' e 'Nome da conta' não encontradas no arquivo Contas.xlsx"
+        
+    # Converter matricula para string e limpar
+    df['Matricula'] = df['Matricula'].astype(str).str.strip().str.replace(r'\.0$', '', regex=True)
+    df['Nome da conta'] = df['Nome da conta'].astype(str).str.strip()
+    return df, None
+
+def _preparar_produtos(df):
+    """Normaliza as colunas lidas de Produtos.xlsx"""
+    # Normalizar nomes das colunas
+    df.columns = df.columns.str.strip()
+    
+    # Verificar colunas esperadas
+    if 'Código do produto' not in df.columns or 'Nome do produto' not in df.columns:
+        return None, "Colunas 'Código do produto' e 'Nome do produto' não encontradas no arquivo Produtos.xlsx"
+        
+    # Converter código para string e limpar
+    df['Código do produto'] = df['Código do produto'].astype(str).str.strip().str.replace(r'\.0$', '', regex=True)
+    df['Nome do produto'] = df['Nome do produto'].astype(str).str.strip()
+    return df, None
+
+def _preparar_filiais(df):
+    """Seleciona e ordena as colunas lidas de FILIAL - MESOREGIAO v1.xlsx"""
     df = df[['FILIAL', 'MESOREGIÃO GEOGRÁFICA']].dropna().drop_duplicates()
     # Ordenar por FILIAL em ordem alfabética
     df = df.sort_values('FILIAL')
+    return df, None
+
+def _derivar_indices(coluna_chave, coluna_nome):
+    def derivar(df):
+        return {
+            'indice_chaves': _construir_indice(df, coluna_chave, coluna_nome),
+            'indice_nomes': _construir_indice_nomes(df[coluna_nome], df[coluna_chave])
+        }
+    return derivar
+
+def _derivar_filiais(df):
+    # Serializar uma única vez: as requisições devolvem os bytes prontos
     opcoes = df.to_dict('records')
-    return opcoes
+    conteudo = json.dumps(opcoes, ensure_ascii=False).encode('utf-8')
+    return {
+        'opcoes': opcoes,
+        'json': conteudo,
+        'etag': hashlib.sha256(conteudo).hexdigest()[:32]
+    }
 
-def carregar_contas_cache():
+# Planilhas de dados mestres: caminho, preparação e estruturas derivadas
+_FONTES_DADOS_MESTRES = {
+    'contas': {
+        'path': CONTAS_PATH,
+        'preparar': _preparar_contas,
+        'derivar': _derivar_indices('Matricula', 'Nome da conta')
+    },
+    'produtos': {
+        'path': PRODUTOS_PATH,
+        'preparar': _preparar_produtos,
+        'derivar': _derivar_indices('Código do produto', 'Nome do produto')
+    },
+    'filiais': {
+        'path': FILIAIS_PATH,
+        'preparar': _preparar_filiais,
+        'derivar': _derivar_filiais
+    }
+}
+
+def _assinatura_arquivo(path):
+    stat = os.stat(path)
+    return (stat.st_mtime, stat.st_size)
+
+def _montar_pacote(nome, forcar=False):
     """
-    Carrega o cache de cooperados do arquivo Excel.
-    Usa cache global para evitar recarregar o arquivo a cada busca.
+    Lê a planilha (via snapshot) e constrói o pacote com DataFrame e estruturas derivadas.
+    Nada é publicado no cache aqui; quem chama decide quando trocar a referência.
     Returns:
-        df (pandas.DataFrame): DataFrame com os dados
+        pacote (dict): DataFrame, índices e versão
         error (str): Mensagem de erro se houver
     """
+    fonte = _FONTES_DADOS_MESTRES[nome]
+    path = fonte['path']
+    if not os.path.exists(path):
+        return None, f"Arquivo {os.path.basename(path)} não encontrado"
+
+    assinatura = _assinatura_arquivo(path)
+    df, error = ler_planilha_com_snapshot(path, fonte['preparar'], forcar=forcar)
+    if error:
+        return None, error
+
+    metadados = obter_metadados_snapshot(path) or {}
+    pacote = {
+        'df': df,
+        'assinatura': assinatura,
+        'versao': (metadados.get('sha256') or f'{assinatura[0]:.0f}-{assinatura[1]}')[:12],
+        'carregado_em': datetime.now(),
+        'registros': len(df)
+    }
+    pacote.update(fonte['derivar'](df))
+    return pacote, None
+
+def _carregar_fonte_cache(nome):
     global _cache
     
     # Retornar do cache se já estiver carregado
-    if _cache['contas'] is not None:
-        return _cache['contas'], None
+    if _cache[nome] is not None:
+        return _cache[nome]['df'], None
     
-    try:
-        # Calcular o caminho relativo à pasta do projeto
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        contas_path = os.path.join(base_dir, 'data', 'Contas.xlsx')
-        
-        if not os.path.exists(contas_path):
-            return None, "Arquivo Contas.xlsx não encontrado"
-            
-        df = pd.read_excel(contas_path)
-        # Normalizar nomes das colunas (remover espaços extras)
-        df.columns = df.columns.str.strip()
-        
-        # Verificar colunas esperadas
-        if 'Matricula' not in df.columns or 'Nome da conta' not in df.columns:
-            return None, "Colunas 'Matricula' e 'Nome da conta' não encontradas no arquivo Contas.xlsx"
-            
-        # Converter matricula para string e limpar
-        df['Matricula'] = df['Matricula'].astype(str).str.strip().str.replace(r'\.0$', '', regex=True)
-        df['Nome da conta'] = df['Nome da conta'].astype(str).str.strip()
-        
-        # Salvar no cache
-        _cache['contas'] = df
-        
-        return df, None
-    except Exception as e:
-        return None, str(e)
+    with _recarga_lock:
+        if _cache[nome] is not None:
+            return _cache[nome]['df'], None
+        try:
+            pacote, error = _montar_pacote(nome)
+            if error:
+                return None, error
+            _cache[nome] = pacote
+            return pacote['df'], None
+        except Exception as e:
+            return None, str(e)
+
+def _obter_pacote(nome):
+    pacote = _cache[nome]
+    if pacote is None:
+        _carregar_fonte_cache(nome)
+        pacote = _cache[nome]
+    return pacote
+
+def carregar_contas_cache():
+    """
+    Carrega o cache de cooperados do arquivo Excel.
+    Usa cache global para evitar recarregar o arquivo a cada busca
+    e o snapshot binário para evitar reprocessar a planilha a cada boot.
+    Returns:
+        df (pandas.DataFrame): DataFrame com os dados
+        error (str): Mensagem de erro se houver
+    """
+    return _carregar_fonte_cache('contas')
 
 def carregar_produtos_cache():
     """
     Carrega o cache de produtos do arquivo Excel.
-    Usa cache global para evitar recarregar o arquivo a cada busca.
+    Usa cache global para evitar recarregar o arquivo a cada busca
+    e o snapshot binário para evitar reprocessar a planilha a cada boot.
     Returns:
         df (pandas.DataFrame): DataFrame com os dados
         error (str): Mensagem de erro se houver
     """
-    global _cache
-    
-    # Retornar do cache se já estiver carregado
-    if _cache['produtos'] is not None:
-        return _cache['produtos'], None
-    
-    try:
-        # Calcular o caminho relativo à pasta do projeto
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        produtos_path = os.path.join(base_dir, 'data', 'Produtos.xlsx')
-        
-        if not os.path.exists(produtos_path):
-            return None, "Arquivo Produtos.xlsx não encontrado"
-            
-        df = pd.read_excel(produtos_path)
-        # Normalizar nomes das colunas
-        df.columns = df.columns.str.strip()
-        
-        # Verificar colunas esperadas
-        if 'Código do produto' not in df.columns or 'Nome do produto' not in df.columns:
-            return None, "Colunas 'Código do produto' e 'Nome do produto' não encontradas no arquivo Produtos.xlsx"
-            
-        # Converter código para string e limpar
-        df['Código do produto'] = df['Código do produto'].astype(str).str.strip().str.replace(r'\.0$', '', regex=True)
-        df['Nome do produto'] = df['Nome do produto'].astype(str).str.strip()
-        
-        # Salvar no cache
-        _cache['produtos'] = df
-        
-        return df, None
-    except Exception as e:
-        return None, str(e)
\ No newline at end of file
+    return _carregar_fonte_cache('produtos')
+
+def recarregar_dados_mestres(forcar=False):
+    """
+    Recarrega as planilhas que mudaram desde a última carga (ou todas, com forcar).
+    O pacote novo é montado por completo antes de substituir o antigo.
+    Returns:
+        Lista com os nomes das fontes recarregadas
+    """
+    recarregadas = []
+    with _recarga_lock:
+        for nome, fonte in _FONTES_DADOS_MESTRES.items():
+            atual = _cache[nome]
+            try:
+                if not forcar and atual is not None and _assinatura_arquivo(fonte['path']) == atual['assinatura']:
+                    continue
+                pacote, error = _montar_pacote(nome, forcar=forcar)
+            except Exception as e:
+                error = str(e)
+            if error:
+                # Mantém os dados antigos em uso se a planilha nova estiver com problema
+                print(f"Aviso: não foi possível recarregar {nome}: {error}")
+                continue
+            _cache[nome] = pacote
+            recarregadas.append(nome)
+    return recarregadas
+
+def _loop_monitor_dados_mestres(intervalo):
+    while True:
+        time.sleep(intervalo)
+        try:
+            recarregadas = recarregar_dados_mestres()
+            if recarregadas:
+                print(f"Dados mestres recarregados: {', '.join(recarregadas)}")
+        except Exception as e:
+            print(f"Erro no monitor de dados mestres: {e}")
+
+def iniciar_monitor_dados_mestres(intervalo=INTERVALO_MONITOR_DADOS_MESTRES):
+    """
+    Inicia (uma única vez por processo) a thread que verifica periodicamente
+    o mtime das planilhas e recarrega o cache fora do caminho das requisições.
+    """
+    with _recarga_lock:
+        if _monitor['thread'] is not None:
+            return
+        _monitor['thread'] = threading.Thread(
+            target=_loop_monitor_dados_mestres, args=(intervalo,),
+            name='monitor-dados-mestres', daemon=True
+        )
+        _monitor['thread'].start()
+
+def obter_versao_dados_mestres():
+    """Retorna versão, data de carga e quantidade de registros de cada fonte em cache"""
+    versoes = {}
+    for nome in _FONTES_DADOS_MESTRES:
+        pacote = _cache[nome]
+        versoes[nome] = None if pacote is None else {
+            'versao': pacote['versao'],
+            'carregado_em': pacote['carregado_em'].strftime('%d/%m/%Y %H:%M:%S'),
+            'registros': pacote['registros']
+        }
+    return versoes
+
+def reconstruir_snapshots():
+    """
+    Relê as planilhas de dados mestres e regrava seus snapshots binários.
+    Returns:
+        Lista de tuplas (arquivo, erro) - erro é None em caso de sucesso
+    """
+    resultados = []
+    for fonte in _FONTES_DADOS_MESTRES.values():
+        path_excel = fonte['path']
+        nome = os.path.basename(path_excel)
+        if not os.path.exists(path_excel):
+            resultados.append((nome, 'arquivo não encontrado'))
+            continue
+        try:
+            _, error = ler_planilha_com_snapshot(path_excel, fonte['preparar'], forcar=True)
+            resultados.append((nome, error))
+        except Exception as e:
+            resultados.append((nome, str(e)))
+    return resultados
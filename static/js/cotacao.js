@@ -280,6 +280,10 @@ document.addEventListener('DOMContentLoaded', function () {
                 return formatMoney(value);
             }
 
+            // Id do produto já gravado: permite ao servidor atualizar só as linhas alteradas
+            if (produtoData.id) {
+                document.getElementById(`produto-${produtoIndex}`).dataset.produtoId = produtoData.id;
+            }
             document.getElementById(`sku_produto_${produtoIndex}`).value = safeValue(produtoData.sku_produto);
             document.getElementById(`nome_produto_${produtoIndex}`).value = safeValue(produtoData.nome_produto);
             document.getElementById(`volume_${produtoIndex}`).value = safeValue(produtoData.volume);
@@ -1334,6 +1338,7 @@ document.addEventListener('DOMContentLoaded', function () {
         const produtos = [];
         document.querySelectorAll('.produto-item').forEach(function (produtoDiv, idx) {
             const produto = {
+                id: produtoDiv.dataset.produtoId ? parseInt(produtoDiv.dataset.produtoId, 10) : null,
                 sku_produto: produtoDiv.querySelector(`[id^=sku_produto_]`).value,
                 nome_produto: produtoDiv.querySelector(`[id^=nome_produto_]`).value,
                 volume: produtoDiv.querySelector(`[id^=volume_]`).value,
@@ -1355,6 +1360,11 @@ document.addEventListener('DOMContentLoaded', function () {
         formData.delete('produtos[]'); // Remover se existir
         formData.append('produtos_json', JSON.stringify(produtos));
 
+        // Anexos grandes não cabem no corpo do formulário: vão em partes depois de salvar
+        const anexos = separarAnexos(document.getElementById('anexo').files);
+        formData.delete('anexos[]');
+        anexos.formulario.forEach(arquivo => formData.append('anexos[]', arquivo));
+
         // Garantir que o status selecionado seja enviado corretamente
         const statusSelecionado = document.getElementById('status').value;
         formData.set('status', statusSelecionado);
@@ -1400,9 +1410,15 @@ document.addEventListener('DOMContentLoaded', function () {
             body: formData
         })
             .then(response => response.json())
-            .then(data => {
+            .then(async data => {
                 if (data.success) {
-                    alert('Cotação salva com sucesso!');
+                    const falhas = await enviarAnexosEmPartes(anexos.emPartes, { cotacao_id: data.id },
+                        document.getElementById('anexoProgresso'));
+                    if (falhas.length) {
+                        alert('Cotação salva, mas alguns anexos não foram enviados:\n' + falhas.join('\n'));
+                    } else {
+                        alert('Cotação salva com sucesso!');
+                    }
                     window.location.href = '/';
                 } else {
                     alert('Erro ao salvar cotação: ' + (data.error || 'Erro desconhecido.'));
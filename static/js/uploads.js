@@ -0,0 +1,96 @@
+/**
+ * Envio de anexos grandes em partes (/api/uploads)
+ *
+ * O formulário continua levando os anexos pequenos junto com os dados do
+ * registro; os que passariam do limite do corpo da requisição (16 MB no
+ * servidor) são enviados em partes depois que o registro é salvo, com
+ * retomada a partir do que o servidor já recebeu.
+ */
+
+// Soma dos anexos que ainda vão no próprio formulário (folga para os demais campos)
+const LIMITE_ANEXOS_FORMULARIO = 8 * 1024 * 1024;
+const TENTATIVAS_PARTE_UPLOAD = 5;
+
+// Separa os arquivos selecionados entre os que vão no formulário e os enviados em partes
+function separarAnexos(arquivos) {
+    const separados = { formulario: [], emPartes: [] };
+    let totalFormulario = 0;
+    Array.from(arquivos || []).forEach(function (arquivo) {
+        if (totalFormulario + arquivo.size <= LIMITE_ANEXOS_FORMULARIO) {
+            totalFormulario += arquivo.size;
+            separados.formulario.push(arquivo);
+        } else {
+            separados.emPartes.push(arquivo);
+        }
+    });
+    return separados;
+}
+
+async function respostaUpload(response) {
+    const dados = await response.json().catch(() => ({}));
+    if (!response.ok) {
+        const erro = new Error(dados.error || `Erro ${response.status} no envio do anexo`);
+        erro.status = response.status;
+        erro.dados = dados;
+        throw erro;
+    }
+    return dados;
+}
+
+function esperar(ms) {
+    return new Promise(resolve => setTimeout(resolve, ms));
+}
+
+// Envia um arquivo em partes e cria o anexo do registro (dono = {cotacao_id} ou {pesquisa_id})
+async function enviarAnexoEmPartes(arquivo, dono, aoProgredir) {
+    const upload = await respostaUpload(await fetch('/api/uploads', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(Object.assign({ filename: arquivo.name, tamanho: arquivo.size }, dono))
+    }));
+    const urlUpload = '/api/uploads/' + upload.upload_id;
+    let recebido = upload.recebido;
+    let falhas = 0;
+    try {
+        while (recebido < arquivo.size) {
+            const parte = arquivo.slice(recebido, recebido + upload.tamanho_parte);
+            try {
+                const resposta = await respostaUpload(await fetch(`${urlUpload}?posicao=${recebido}`, {
+                    method: 'PUT',
+                    body: parte
+                }));
+                recebido = resposta.recebido;
+                falhas = 0;
+            } catch (erro) {
+                // Queda de conexão ou parte fora de ordem: perguntar ao servidor de onde continuar
+                if (erro.status && erro.status !== 409) throw erro;
+                if (++falhas > TENTATIVAS_PARTE_UPLOAD) throw erro;
+                await esperar(1000 * falhas);
+                recebido = (await respostaUpload(await fetch(urlUpload))).recebido;
+            }
+            if (aoProgredir) aoProgredir(recebido, arquivo.size);
+        }
+        return (await respostaUpload(await fetch(urlUpload + '/concluir', { method: 'POST' }))).anexo;
+    } catch (erro) {
+        fetch(urlUpload, { method: 'DELETE' }).catch(() => { });
+        throw erro;
+    }
+}
+
+// Envia os arquivos um por vez; devolve a lista de mensagens dos que falharam
+async function enviarAnexosEmPartes(arquivos, dono, elementoProgresso) {
+    const falhas = [];
+    for (const arquivo of arquivos) {
+        try {
+            await enviarAnexoEmPartes(arquivo, dono, function (recebido, total) {
+                if (elementoProgresso) {
+                    elementoProgresso.textContent = `Enviando ${arquivo.name}: ${Math.floor(100 * recebido / total)}%`;
+                }
+            });
+        } catch (erro) {
+            falhas.push(`${arquivo.name}: ${erro.message}`);
+        }
+    }
+    if (elementoProgresso) elementoProgresso.textContent = '';
+    return falhas;
+}
@@ -0,0 +1,59 @@
+import os
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+# O app cria as tabelas e inicia os workers ao ser importado: apontar para um
+# banco SQLite temporário e desativar o envio de e-mails antes do import
+_diretorio_banco = tempfile.mkdtemp(prefix='cotacoes-testes-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_diretorio_banco, 'testes.db')
+os.environ.pop('SMTP_USUARIO', None)
+os.environ.pop('SMTP_SENHA', None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app as aplicacao  # noqa: E402
+from models import db  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    with aplicacao.app_context():
+        yield aplicacao
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def contar_sql(app):
+    """
+    Registra os comandos SQL executados dentro do bloco pela thread do teste
+    (os workers em segundo plano usam a mesma engine).
+
+    Uso:
+        with contar_sql() as comandos:
+            ...
+        len(comandos)
+    """
+    @contextmanager
+    def contar():
+        comandos = []
+        thread = threading.get_ident()
+
+        def registrar(conn, cursor, statement, parameters, context, executemany):
+            if threading.get_ident() == thread:
+                comandos.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', registrar)
+        try:
+            yield comandos
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', registrar)
+    return contar
@@ -0,0 +1,82 @@
+import socketserver
+import threading
+from email import message_from_string
+
+import pytest
+
+from config import Config
+from services import email_service
+
+
+class ServidorSMTPLocal(socketserver.StreamRequestHandler):
+    """Servidor SMTP mínimo, sem STARTTLS nem AUTH (como o aiosmtpd em modo debug)"""
+
+    def responder(self, *linhas):
+        self.wfile.write(''.join(linha + '\r\n' for linha in linhas).encode())
+
+    def handle(self):
+        self.responder('220 localhost')
+        envelope = {'destinatarios': []}
+        while True:
+            linha = self.rfile.readline().decode().strip()
+            comando = linha.upper()
+            if not linha or comando == 'QUIT':
+                self.responder('221 tchau')
+                return
+            if comando.startswith('EHLO'):
+                self.responder('250-localhost', '250 8BITMIME')
+            elif comando.startswith('MAIL FROM:'):
+                envelope['remetente'] = linha[10:].strip(' <>')
+                self.responder('250 OK')
+            elif comando.startswith('RCPT TO:'):
+                envelope['destinatarios'].append(linha[8:].strip(' <>'))
+                self.responder('250 OK')
+            elif comando == 'DATA':
+                self.responder('354 fim com .')
+                corpo = []
+                while (linha := self.rfile.readline().decode()) not in ('.\r\n', ''):
+                    corpo.append(linha)
+                envelope['mensagem'] = ''.join(corpo)
+                self.server.recebidos.append(envelope)
+                envelope = {'destinatarios': []}
+                self.responder('250 OK')
+            else:
+                self.responder('502 comando não suportado')
+
+
+@pytest.fixture
+def servidor_smtp(monkeypatch):
+    servidor = socketserver.ThreadingTCPServer(('127.0.0.1', 0), ServidorSMTPLocal)
+    servidor.daemon_threads = True
+    servidor.recebidos = []
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    monkeypatch.setattr(Config, 'SMTP_SERVIDOR', '127.0.0.1')
+    monkeypatch.setattr(Config, 'SMTP_PORTA', servidor.server_address[1])
+    monkeypatch.setattr(Config, 'SMTP_STARTTLS', False)
+    monkeypatch.setattr(Config, 'SMTP_USUARIO', None)
+    monkeypatch.setattr(Config, 'SMTP_SENHA', None)
+    monkeypatch.setattr(Config, 'SMTP_REMETENTE', 'cotacoes@localhost')
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def test_envio_para_servidor_local_sem_autenticacao(servidor_smtp):
+    assert email_service.smtp_configurado()
+
+    email_service.enviar_email(['comercial@localhost', 'suprimentos@localhost'],
+                               'Cotacao atualizada', '<p>Status: Liberado para Venda</p>')
+
+    assert len(servidor_smtp.recebidos) == 1
+    recebido = servidor_smtp.recebidos[0]
+    assert recebido['remetente'] == 'cotacoes@localhost'
+    assert recebido['destinatarios'] == ['comercial@localhost', 'suprimentos@localhost']
+    mensagem = message_from_string(recebido['mensagem'])
+    assert mensagem['Subject'] == 'Cotacao atualizada'
+    assert 'Liberado para Venda' in mensagem.get_payload(decode=True).decode()
+
+
+def test_envio_desativado_sem_remetente(monkeypatch):
+    monkeypatch.setattr(Config, 'SMTP_REMETENTE', None)
+
+    assert not email_service.smtp_configurado()
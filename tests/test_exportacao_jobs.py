@@ -0,0 +1,31 @@
+from datetime import datetime, timedelta
+
+from models import db, Exportacao
+from services.exportacao_jobs import (TEMPO_MAXIMO_NA_FILA, TEMPO_MAXIMO_SEM_PROGRESSO,
+                                      _reservar_job, obter_job_exportacao)
+
+
+def criar_job(job_id, status, idade):
+    momento = datetime.now() - idade
+    db.session.add(Exportacao(id=job_id, tipo='cotacao', ids='[1]', status=status, total=1,
+                              processados=0, data_criacao=momento, data_atualizacao=momento))
+    db.session.commit()
+
+
+def test_job_pendente_expira_pela_data_de_criacao(app):
+    criar_job('pendente-recente', 'pendente', timedelta(minutes=1))
+    criar_job('pendente-antigo', 'pendente', TEMPO_MAXIMO_NA_FILA + timedelta(minutes=1))
+
+    assert obter_job_exportacao('pendente-recente').status == 'pendente'
+    assert obter_job_exportacao('pendente-antigo').status == 'erro'
+    # Se a fila ainda tiver o job expirado, o worker não o executa
+    assert _reservar_job('pendente-antigo') is False
+    assert _reservar_job('pendente-recente') is True
+
+
+def test_job_processando_expira_sem_progresso(app):
+    criar_job('processando-parado', 'processando', TEMPO_MAXIMO_SEM_PROGRESSO + timedelta(minutes=1))
+
+    job = obter_job_exportacao('processando-parado')
+    assert job.status == 'erro'
+    assert job.erro == 'Exportação interrompida. Tente novamente.'
@@ -0,0 +1,72 @@
+import io
+
+import pytest
+
+from models import db
+from services import importacao
+
+
+def planilha_csv(cabecalho, linhas):
+    texto = ';'.join(cabecalho) + '\n' + '\n'.join(';'.join(linha) for linha in linhas) + '\n'
+    return io.BytesIO(texto.encode('utf-8'))
+
+
+@pytest.fixture(autouse=True)
+def sem_dados_mestres(monkeypatch):
+    # Matrícula e produto aceitos como vieram: o teste não depende das planilhas de cadastro
+    monkeypatch.setattr(importacao, 'dados_mestres_disponiveis', lambda nome: False)
+
+
+def falhar_no_banco(monkeypatch, nome_gravar, nome_ruim):
+    """Faz o banco rejeitar (após gravar de fato no flush) o registro do cooperado nome_ruim"""
+    gravar_original = getattr(importacao, nome_gravar)
+
+    def gravar(registros):
+        gravar_original(registros)
+        db.session.flush()
+        nomes = [(r[0] if isinstance(r, tuple) else r)['nome_cooperado'] for r in registros]
+        if nome_ruim in nomes:
+            raise ValueError('valor grande demais para a coluna')
+
+    monkeypatch.setattr(importacao, nome_gravar, gravar)
+
+
+def test_lote_rejeitado_pelo_banco_reporta_so_a_linha_com_erro(app, monkeypatch):
+    falhar_no_banco(monkeypatch, '_gravar_pesquisas', 'Cooperado 3')
+    cabecalho = ['nome_filial', 'numero_mesorregiao', 'matricula_cooperado', 'nome_cooperado',
+                 'nome_produto', 'quantidade_cotada', 'forma_pagamento', 'nome_concorrente',
+                 'valor_concorrente']
+    linhas = [['Filial', '1', str(500 + i), f'Cooperado {i}', 'Produto', '1', 'À vista',
+               'Concorrente', '10'] for i in range(6)]
+
+    relatorio = importacao.importar_planilha(planilha_csv(cabecalho, linhas), 'csv', 'pesquisa',
+                                             tamanho_lote=6)
+
+    assert relatorio['importados'] == 5
+    assert relatorio['total_erros'] == 1
+    # Linha 1 é o cabeçalho: Cooperado 3 está na linha 5
+    assert [erro['linha'] for erro in relatorio['erros']] == [5]
+    assert 'valor grande demais' in relatorio['erros'][0]['erro']
+
+
+def test_cotacoes_do_lote_rejeitado_sao_regravadas_com_produtos(app, monkeypatch):
+    falhar_no_banco(monkeypatch, '_gravar_cotacoes', 'Cooperado B')
+    cabecalho = ['id', 'nome_filial', 'numero_mesorregiao', 'matricula_cooperado', 'nome_cooperado',
+                 'analista_comercial', 'nome_vendedor', 'produto_nome_produto', 'produto_valor_total_com_frete']
+    linhas = [
+        ['1', 'Filial', '1', '600', 'Cooperado A', 'Analista', 'Vendedor', 'Adubo', '10,00'],
+        ['1', 'Filial', '1', '600', 'Cooperado A', 'Analista', 'Vendedor', 'Calcário', '5,00'],
+        ['2', 'Filial', '1', '601', 'Cooperado B', 'Analista', 'Vendedor', 'Adubo', '7,00'],
+        ['3', 'Filial', '1', '602', 'Cooperado C', 'Analista', 'Vendedor', 'Adubo', '3,00'],
+    ]
+
+    relatorio = importacao.importar_planilha(planilha_csv(cabecalho, linhas), 'csv', 'cotacao')
+
+    assert relatorio['importados'] == 2
+    assert [erro['linha'] for erro in relatorio['erros']] == [4]
+    cotacoes = db.session.scalars(
+        db.select(importacao.Cotacao).filter(importacao.Cotacao.matricula_cooperado.in_(['600', '601', '602']))
+        .order_by(importacao.Cotacao.matricula_cooperado)
+    ).all()
+    assert [(c.nome_cooperado, len(c.produtos), c.valor_total) for c in cotacoes] == [
+        ('Cooperado A', 2, 15.0), ('Cooperado C', 1, 3.0)]
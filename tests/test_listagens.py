@@ -0,0 +1,78 @@
+from datetime import datetime
+
+import pytest
+
+from models import db, Anexo, Cotacao, PesquisaMercado, ProdutoCotacao
+
+# Tamanho de página acima do total de registros criados: a listagem devolve todos
+LIMITE = 200
+N = 15
+
+
+def criar_registros(n):
+    """Cria n cotações (com produtos e anexo) e n pesquisas (com anexo)"""
+    agora = datetime.now()
+    for i in range(n):
+        cotacao = Cotacao(
+            data=agora.date(), nome_filial='Filial', numero_mesorregiao='1',
+            matricula_cooperado=str(1000 + i), nome_cooperado=f'Cooperado {i}',
+            status='Análise Comercial', analista_comercial='Analista',
+            nome_vendedor='Vendedor', data_entrada_status=agora,
+            data_ultima_modificacao=agora
+        )
+        cotacao.produtos = [
+            ProdutoCotacao(nome_produto=f'Produto {j}', volume=1, unidade_medida='L',
+                           preco_unitario=10, valor_total=10, fornecedor='Fornecedor',
+                           valor_total_com_frete=10)
+            for j in range(2)
+        ]
+        cotacao.anexos = [Anexo(filename='cotacao.pdf', filepath='uploads/cotacao.pdf')]
+        pesquisa = PesquisaMercado(
+            data=agora.date(), nome_filial='Filial', numero_mesorregiao='1',
+            matricula_cooperado=str(1000 + i), nome_cooperado=f'Cooperado {i}',
+            nome_produto='Produto', quantidade_cotada=1, forma_pagamento='À vista',
+            nome_concorrente='Concorrente', valor_concorrente=10,
+            nome_vendedor='Vendedor', analista_comercial='Analista'
+        )
+        pesquisa.anexos = [Anexo(filename='pesquisa.pdf', filepath='uploads/pesquisa.pdf')]
+        db.session.add_all([cotacao, pesquisa])
+    db.session.commit()
+
+
+def contar_consultas(client, contar_sql, url):
+    db.session.expunge_all()
+    with contar_sql() as comandos:
+        resposta = client.get(url)
+    assert resposta.status_code == 200
+    return len(comandos), len(resposta.get_json()['itens'])
+
+
+@pytest.mark.parametrize('url', [
+    f'/api/cotacoes?tipo=andamento&limite={LIMITE}',
+    f'/api/cotacoes?tipo=andamento&produtos=0&limite={LIMITE}',
+    f'/api/pesquisas/pesquisa?limite={LIMITE}',
+])
+def test_listagem_com_numero_fixo_de_consultas(client, contar_sql, url):
+    criar_registros(N)
+    consultas_n, itens_n = contar_consultas(client, contar_sql, url)
+
+    criar_registros(N)
+    consultas_2n, itens_2n = contar_consultas(client, contar_sql, url)
+
+    assert itens_2n == itens_n + N
+    assert consultas_2n == consultas_n
+
+
+
+def test_busca_no_servidor_encontra_registro_fora_da_primeira_pagina(client):
+    criar_registros(60)
+    primeira = db.session.scalars(
+        db.select(Cotacao).filter_by(matricula_cooperado='1000').order_by(Cotacao.id)
+    ).first()
+
+    for busca_por, termo in [('todos', '1000'), ('matricula', '1000'),
+                             ('nome', 'cooperado 0'), ('id', str(primeira.id))]:
+        resposta = client.get('/api/cotacoes', query_string={
+            'tipo': 'andamento', 'produtos': '0', 'busca': termo, 'busca_por': busca_por})
+        ids = [item['id'] for item in resposta.get_json()['itens']]
+        assert primeira.id in ids, busca_por
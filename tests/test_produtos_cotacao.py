@@ -0,0 +1,66 @@
+import json
+import re
+from datetime import datetime
+
+import pytest
+
+from models import db, Cotacao, ProdutoCotacao
+from services.produtos import valores_produto
+
+RE_ESCRITA_PRODUTOS = re.compile(r'^\s*(INSERT INTO|UPDATE|DELETE FROM) produtos_cotacao\b', re.IGNORECASE)
+
+
+def linhas_formulario():
+    """Linhas de produto no formato enviado pela tela (moeda em R$)"""
+    return [
+        {'sku_produto': f'SKU{i}', 'nome_produto': f'Produto {i}', 'volume': '2',
+         'unidade_medida': 'L', 'preco_unitario': 'R$ 10,50', 'valor_total': 'R$ 21,00',
+         'fornecedor': 'Fornecedor', 'preco_custo': 'R$ 8,00', 'valor_frete': 'R$ 0,00',
+         'prazo_entrega_fornecedor': '2024-05-10', 'valor_total_com_frete': 'R$ 21,00'}
+        for i in range(3)
+    ]
+
+
+@pytest.fixture
+def cotacao_com_produtos(app):
+    agora = datetime.now()
+    cotacao = Cotacao(
+        data=agora.date(), nome_filial='Filial', numero_mesorregiao='1',
+        matricula_cooperado='2000', nome_cooperado='Cooperado', status='Análise Comercial',
+        analista_comercial='Analista', nome_vendedor='Vendedor',
+        data_entrada_status=agora, data_ultima_modificacao=agora
+    )
+    cotacao.produtos = [ProdutoCotacao(**valores_produto(linha)) for linha in linhas_formulario()]
+    db.session.add(cotacao)
+    db.session.commit()
+    linhas = [dict(linha, id=str(produto.id)) for linha, produto in zip(linhas_formulario(), cotacao.produtos)]
+    cotacao_id = cotacao.id
+    db.session.expunge_all()
+    return cotacao_id, linhas
+
+
+def escritas_produtos(client, contar_sql, cotacao_id, linhas):
+    with contar_sql() as comandos:
+        resposta = client.post(f'/api/cotacao/{cotacao_id}', data={'produtos_json': json.dumps(linhas)})
+    assert resposta.get_json()['success'] is True
+    escritas = [RE_ESCRITA_PRODUTOS.match(comando) for comando in comandos]
+    return [escrita.group(1).upper() for escrita in escritas if escrita]
+
+
+def test_salvar_sem_alteracao_nao_grava_produtos(client, contar_sql, cotacao_com_produtos):
+    cotacao_id, linhas = cotacao_com_produtos
+
+    assert escritas_produtos(client, contar_sql, cotacao_id, linhas) == []
+
+
+def test_editar_uma_linha_gera_um_update(client, contar_sql, cotacao_com_produtos):
+    cotacao_id, linhas = cotacao_com_produtos
+    linhas[1]['volume'] = '5'
+    linhas[1]['valor_total'] = 'R$ 52,50'
+
+    assert escritas_produtos(client, contar_sql, cotacao_id, linhas) == ['UPDATE']
+    produtos = db.session.scalars(
+        db.select(ProdutoCotacao).filter_by(cotacao_id=cotacao_id).order_by(ProdutoCotacao.id)
+    ).all()
+    assert [produto.volume for produto in produtos] == [2.0, 5.0, 2.0]
+    assert produtos[1].valor_total == 52.5
@@ -0,0 +1,70 @@
+import io
+import os
+import threading
+from datetime import datetime
+
+import pytest
+
+from models import db, Cotacao
+from services.anexos import ErroUpload, bytes_recebidos, iniciar_upload, receber_parte
+
+TAMANHO_PARTE = 1024
+
+
+class CorpoLento(io.RawIOBase):
+    """Corpo de requisição que para no meio da parte até ser liberado"""
+
+    def __init__(self, dados):
+        self.dados = io.BytesIO(dados)
+        self.lendo = threading.Event()
+        self.liberar = threading.Event()
+
+    def read(self, tamanho=-1):
+        if self.dados.tell() > 0 and not self.liberar.is_set():
+            self.lendo.set()
+            self.liberar.wait(5)
+        return self.dados.read(min(tamanho, 100))
+
+
+@pytest.fixture
+def upload(app, tmp_path, monkeypatch):
+    # Os diretórios de upload são relativos ao diretório de trabalho
+    monkeypatch.chdir(tmp_path)
+    agora = datetime.now()
+    cotacao = Cotacao(
+        data=agora.date(), nome_filial='Filial', numero_mesorregiao='1',
+        matricula_cooperado='3000', nome_cooperado='Cooperado', status='Análise Comercial',
+        analista_comercial='Analista', nome_vendedor='Vendedor',
+        data_entrada_status=agora, data_ultima_modificacao=agora
+    )
+    db.session.add(cotacao)
+    db.session.commit()
+    return iniciar_upload('contrato.pdf', 2 * TAMANHO_PARTE, cotacao_id=cotacao.id)
+
+
+def test_nova_tentativa_durante_gravacao_nao_duplica_parte(app, upload):
+    db.session.refresh(upload)  # A thread da requisição original não recarrega atributos
+    corpo = CorpoLento(b'a' * TAMANHO_PARTE)
+
+    def requisicao_original():
+        with app.app_context():
+            receber_parte(upload, 0, corpo, TAMANHO_PARTE)
+
+    original = threading.Thread(target=requisicao_original)
+    original.start()
+    assert corpo.lendo.wait(5)
+
+    # Nova tentativa da mesma parte enquanto a original ainda grava
+    with pytest.raises(ErroUpload) as erro:
+        receber_parte(upload, 0, io.BytesIO(b'a' * TAMANHO_PARTE), TAMANHO_PARTE)
+    assert erro.value.status == 409
+
+    corpo.liberar.set()
+    original.join(5)
+    assert bytes_recebidos(upload) == TAMANHO_PARTE
+
+    # Depois da gravação a repetição é reconhecida e a próxima parte continua dali
+    assert receber_parte(upload, 0, io.BytesIO(b'a' * TAMANHO_PARTE), TAMANHO_PARTE) == TAMANHO_PARTE
+    assert receber_parte(upload, TAMANHO_PARTE, io.BytesIO(b'b' * TAMANHO_PARTE),
+                         TAMANHO_PARTE) == 2 * TAMANHO_PARTE
+    assert os.path.getsize(os.path.join('uploads', 'parciais', upload.id)) == 2 * TAMANHO_PARTE